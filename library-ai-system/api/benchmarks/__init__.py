@@ -0,0 +1 @@
+# Benchmarks - Medições de desempenho do backend (executar a partir de api/)
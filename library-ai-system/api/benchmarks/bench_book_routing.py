@@ -0,0 +1,157 @@
+"""
+Benchmark: busca em duas etapas (centróides dos livros -> chunks) x busca plana.
+
+Monta uma biblioteca sintética (cada livro com alguns assuntos, parte deles
+compartilhada entre livros), grava os chunks em uma collection temporária e os
+centróides de routing_centroids() na collection lateral, e mede para cada
+QDRANT_ROUTING_TOP_BOOKS pedido o recall@k em relação à busca exata (NumPy) e a
+latência p50/p95 das duas etapas somadas, comparando com a busca plana.
+
+Com --url :memory: roda no modo local do qdrant-client (busca exata, sem HNSW):
+o recall vale, mas a latência não representa um servidor.
+
+Uso (a partir de api/):
+    python -m benchmarks.bench_book_routing --url http://library-qdrant:6333
+    python -m benchmarks.bench_book_routing --url :memory: --books 200 --chunks-per-book 100 --dimensions 256
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchAny, PointStruct
+
+from library_backend.services.book_routing import (
+    route_contents, routing_centroids, routing_collection_name, routing_point_id
+)
+from library_backend.services.qdrant_service import (
+    QDRANT_URL, collection_config, create_async_qdrant_client, ensure_collection_async, search_params
+)
+
+COLLECTION = "bench_book_routing"
+
+def synthetic_library(rng, books: int, chunks_per_book: int, dimensions: int, topics_per_book: int):
+    """Assuntos por livro tirados de um conjunto comum (livros parecidos dividem assuntos)"""
+    shared_topics = rng.standard_normal((books * topics_per_book // 2, dimensions), dtype=np.float32)
+    owners = np.repeat(np.arange(books), chunks_per_book)
+    vectors = np.empty((len(owners), dimensions), dtype=np.float32)
+    for book in range(books):
+        topics = shared_topics[rng.choice(len(shared_topics), topics_per_book, replace=False)]
+        style = rng.standard_normal(dimensions, dtype=np.float32)
+        rows = slice(book * chunks_per_book, (book + 1) * chunks_per_book)
+        vectors[rows] = (
+            topics[rng.integers(0, topics_per_book, chunks_per_book)] + 0.5 * style
+            + 0.7 * rng.standard_normal((chunks_per_book, dimensions), dtype=np.float32)
+        )
+    return owners, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+async def upsert_all(client, collection: str, points, batch_size: int = 512):
+    for start in range(0, len(points), batch_size):
+        await client.upsert(collection_name=collection, points=points[start:start + batch_size], wait=True)
+
+async def measure(search, queries, exact, positions):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, exact):
+        started = time.perf_counter()
+        points = await search(query.tolist())
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({positions[str(point.id)] for point in points} & set(expected))
+    return statistics.median(latencies), statistics.quantiles(latencies, n=20)[-1], hits / (len(queries) * len(exact[0]))
+
+async def run(args):
+    rng = np.random.default_rng(42)
+    owners, vectors = synthetic_library(rng, args.books, args.chunks_per_book, args.dimensions, args.topics_per_book)
+    hashes = [f"bench-{book:05d}" for book in range(args.books)]
+    point_ids = [str(uuid.uuid4()) for _ in range(len(owners))]
+    positions = {point_id: index for index, point_id in enumerate(point_ids)}
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(args.dimensions)
+    exact = [row.tolist() for row in np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]]
+
+    client = AsyncQdrantClient(":memory:") if args.url == ":memory:" else create_async_qdrant_client(args.url)
+    routing = routing_collection_name(COLLECTION)
+    for name in (COLLECTION, routing):
+        if await client.collection_exists(name):
+            await client.delete_collection(name)
+    await ensure_collection_async(client, COLLECTION, args.dimensions)
+    await ensure_collection_async(
+        client, routing, args.dimensions,
+        config=collection_config(args.dimensions, quantization="none", on_disk=False)
+    )
+
+    try:
+        await upsert_all(client, COLLECTION, [
+            PointStruct(id=point_id, vector=vector.tolist(), payload={"book_id": int(owner), "content_hash": hashes[owner]})
+            for point_id, vector, owner in zip(point_ids, vectors, owners)
+        ])
+
+        started = time.perf_counter()
+        centroid_points = []
+        for book in range(args.books):
+            centroids = routing_centroids(vectors[owners == book])
+            centroid_points.extend(
+                PointStruct(
+                    id=routing_point_id(hashes[book], cluster), vector=centroid.tolist(),
+                    payload={"book_id": [book], "content_hash": hashes[book]}
+                )
+                for cluster, centroid in enumerate(centroids)
+            )
+        build_seconds = time.perf_counter() - started
+        await upsert_all(client, routing, centroid_points)
+
+        print(
+            f"{len(owners)} chunks de {args.dimensions} dimensões em {args.books} livros; "
+            f"{len(centroid_points)} centróides em {build_seconds:.2f} s; recall@{args.k}"
+        )
+        print(f"{'busca':>14} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7}")
+
+        async def flat(query):
+            result = await client.query_points(
+                collection_name=COLLECTION, query=query, search_params=search_params(),
+                limit=args.k, with_payload=False
+            )
+            return result.points
+
+        def routed(top_books: int):
+            async def search(query):
+                content_hashes = await route_contents(client, COLLECTION, query, top_books)
+                query_filter = Filter(must=[
+                    FieldCondition(key="content_hash", match=MatchAny(any=content_hashes))
+                ]) if content_hashes else None
+                result = await client.query_points(
+                    collection_name=COLLECTION, query=query, query_filter=query_filter,
+                    search_params=search_params(), limit=args.k, with_payload=False
+                )
+                return result.points
+            return search
+
+        searches = {"plana": flat}
+        searches.update({f"top {top} livros": routed(top) for top in args.top_books})
+        for name, search in searches.items():
+            await measure(search, queries[:10], exact[:10], positions)  # aquecimento
+            p50, p95, recall = await measure(search, queries, exact, positions)
+            print(f"{name:>14} {p50:>7.2f} {p95:>7.2f} {recall:>7.3f}")
+    finally:
+        for name in (COLLECTION, routing):
+            await client.delete_collection(name)
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=QDRANT_URL)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--books", type=int, default=500)
+    parser.add_argument("--chunks-per-book", type=int, default=200)
+    parser.add_argument("--topics-per-book", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--top-books", type=int, nargs="+", default=[5, 10, 20, 50])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
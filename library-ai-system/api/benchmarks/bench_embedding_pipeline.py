@@ -0,0 +1,83 @@
+"""
+Benchmark: vazão do EmbeddingPipeline conforme a concorrência.
+
+Roda contra o servidor falso (benchmarks/fake_embeddings_server.py), qualquer
+endpoint compatível ou o provedor local por hashing, gravando em um Qdrant em
+memória.
+
+Uso (a partir de api/):
+    python -m benchmarks.fake_embeddings_server --latency-ms 300 &
+    python -m benchmarks.bench_embedding_pipeline --base-url http://localhost:8089/v1 --concurrency 1 2 4 8
+    python -m benchmarks.bench_embedding_pipeline --provider hashing --concurrency 1 4
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from openai import AsyncOpenAI
+from qdrant_client import AsyncQdrantClient
+
+from library_backend.services.embedding_cache import embedding_cache
+from library_backend.services.embedding_pipeline import EmbeddingPipeline
+from library_backend.services.embedding_providers import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from library_backend.services.qdrant_service import QdrantService
+from .pdf_fixtures import WORDS
+
+def synthetic_chunks(count: int, words_per_chunk: int, seed: int = 42):
+    rng = random.Random(seed)
+    for chunk_index in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(words_per_chunk))
+        yield {
+            "chunk_index": chunk_index,
+            "text": text,
+            "page_number": chunk_index // 3 + 1,
+            "token_count": max(1, len(text) // 4)
+        }
+
+async def _run(args, concurrency: int) -> float:
+    if args.provider == "hashing":
+        provider = HashingEmbeddingProvider(args.dimensions)
+    else:
+        provider = OpenAIEmbeddingProvider(client=AsyncOpenAI(api_key="fake", base_url=args.base_url))
+
+    store = QdrantService(collection_name="bench", client=AsyncQdrantClient(":memory:"), vector_size=args.dimensions)
+    await store.initialize()
+    pipeline = EmbeddingPipeline(
+        provider, store,
+        concurrency=concurrency, max_inputs=args.batch_inputs
+    )
+
+    started = time.perf_counter()
+    stored = await pipeline.run(synthetic_chunks(args.chunks, args.words), "bench", [1])
+    elapsed = time.perf_counter() - started
+
+    await provider.close()
+    await store.close()
+    if stored != args.chunks:
+        print(f"  aviso: {stored}/{args.chunks} chunks gravados")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["openai", "hashing"], default="openai")
+    parser.add_argument("--base-url", default="http://localhost:8089/v1")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--batch-inputs", type=int, default=64)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--cache", action="store_true", help="manter o cache de embeddings ligado")
+    args = parser.parse_args()
+
+    # Sem cache cada rodada refaz todas as requisições
+    embedding_cache.enabled = args.cache
+
+    print(f"{'concorrência':>12} {'tempo (s)':>10} {'chunks/s':>9}")
+    for concurrency in args.concurrency:
+        elapsed = asyncio.run(_run(args, concurrency))
+        print(f"{concurrency:>12} {elapsed:>10.2f} {args.chunks / elapsed:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark: extração serial x paralela de páginas no PDFService.
+
+Uso (a partir de api/):
+    python -m benchmarks.bench_pdf_extraction --pages 50 200 800 1500 --workers 4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import PyPDF2
+
+from library_backend.services.pdf_service import PDFService
+from .pdf_fixtures import write_synthetic_pdf
+
+def _time_extraction(pdf_service: PDFService, file_path: str, parallel: bool, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with open(file_path, "rb") as pdf_file:
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            started = time.perf_counter()
+            pdf_service.extract_page_texts(pdf_reader, file_path, parallel=parallel)
+            best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[16, 64, 256, 1024, 1500])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_service = PDFService()
+    pdf_service.extraction_workers = args.workers
+
+    print(f"{'páginas':>8} {'serial (s)':>11} {'paralelo (s)':>13} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pages in args.pages:
+            file_path = write_synthetic_pdf(os.path.join(tmp_dir, f"bench_{pages}.pdf"), pages)
+            serial = _time_extraction(pdf_service, file_path, parallel=False, repeat=args.repeat)
+            parallel = _time_extraction(pdf_service, file_path, parallel=True, repeat=args.repeat)
+            print(f"{pages:>8} {serial:>11.3f} {parallel:>13.3f} {serial / parallel:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
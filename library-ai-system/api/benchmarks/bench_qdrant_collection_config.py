@@ -0,0 +1,129 @@
+"""
+Benchmark: recall x latência x memória das configurações de collection do Qdrant.
+
+Para cada quantização (none, scalar, product) e cada HNSW m, cria uma collection
+temporária com collection_config(), insere vetores sintéticos agrupados (como
+embeddings de livros, que formam grupos por assunto) e mede, para cada
+combinação de hnsw_ef e oversampling, o recall@k em relação à busca exata
+(NumPy) e a latência p50/p95. A RAM estimada soma vetores em memória,
+vetores quantizados e ligações do grafo HNSW.
+
+O modo local do qdrant-client ignora HNSW e quantização: é preciso um Qdrant no ar.
+
+Uso (a partir de api/):
+    python -m benchmarks.bench_qdrant_collection_config --url http://library-qdrant:6333
+    python -m benchmarks.bench_qdrant_collection_config --points 50000 --hnsw-m 16 32 --oversampling 1 2 4
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+from qdrant_client.models import CollectionStatus, PointStruct
+
+from library_backend.services.qdrant_service import (
+    QDRANT_URL, collection_config, create_qdrant_client, search_params
+)
+
+COLLECTION = "bench_collection_config"
+
+def clustered_vectors(rng, count: int, dimensions: int, clusters: int) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimensions), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def estimated_ram_mb(points: int, dimensions: int, quantization: str, on_disk: bool, hnsw_m: int, pq_ratio: int) -> float:
+    """Vetores originais (se em RAM) + quantizados + ligações do nível 0 do HNSW (2m ids de 4 bytes)"""
+    original = 0 if on_disk else points * dimensions * 4
+    if quantization == "product":
+        quantized = points * dimensions * 4 / pq_ratio
+    elif quantization == "scalar":
+        quantized = points * dimensions  # int8
+    else:
+        quantized = 0
+    links = points * hnsw_m * 2 * 4
+    return (original + quantized + links) / 1024 / 1024
+
+def wait_indexed(client, timeout: float = 600):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if client.get_collection(COLLECTION).status == CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    raise TimeoutError("Indexação da collection não terminou")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=QDRANT_URL)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "product"])
+    parser.add_argument("--pq-ratio", type=int, default=16, help="compressão do product quantization (x4..x64)")
+    parser.add_argument("--hnsw-m", type=int, nargs="+", default=[16])
+    parser.add_argument("--hnsw-ef", type=int, nargs="+", default=[64, 128])
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = clustered_vectors(rng, args.points, args.dimensions, args.clusters)
+    # Consultas próximas de pontos existentes, como perguntas sobre trechos dos livros
+    queries = vectors[rng.integers(0, args.points, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(args.dimensions)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    ids = [str(uuid.uuid4()) for _ in range(args.points)]
+    positions = {point_id: index for index, point_id in enumerate(ids)}
+    client = create_qdrant_client(args.url)
+
+    print(f"{args.points} vetores de {args.dimensions} dimensões, recall@{args.k}")
+    print(f"{'quantização':>11} {'m':>3} {'ef':>4} {'overs.':>6} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} {'RAM MB':>8}")
+    for quantization in args.quantization:
+        on_disk = quantization != "none"
+        for hnsw_m in args.hnsw_m:
+            config = collection_config(
+                args.dimensions, quantization=quantization, on_disk=on_disk,
+                hnsw_m=hnsw_m, pq_compression=f"x{args.pq_ratio}"
+            )
+            if client.collection_exists(COLLECTION):
+                client.delete_collection(COLLECTION)
+            client.create_collection(collection_name=COLLECTION, **config)
+            for start in range(0, args.points, 512):
+                client.upsert(
+                    collection_name=COLLECTION,
+                    points=[
+                        PointStruct(id=point_id, vector=vector.tolist())
+                        for point_id, vector in zip(ids[start:start + 512], vectors[start:start + 512])
+                    ]
+                )
+            wait_indexed(client)
+            ram = estimated_ram_mb(args.points, args.dimensions, quantization, on_disk, hnsw_m, args.pq_ratio)
+
+            for hnsw_ef in args.hnsw_ef:
+                for oversampling in args.oversampling if quantization != "none" else [1.0]:
+                    params = search_params(hnsw_ef=hnsw_ef, oversampling=oversampling)
+                    latencies, hits = [], 0
+                    for query, expected in zip(queries, exact):
+                        started = time.perf_counter()
+                        result = client.query_points(
+                            collection_name=COLLECTION, query=query.tolist(),
+                            search_params=params, limit=args.k, with_payload=False
+                        )
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        hits += len({positions[str(point.id)] for point in result.points} & set(expected.tolist()))
+                    recall = hits / (args.queries * args.k)
+                    p95 = statistics.quantiles(latencies, n=20)[-1]
+                    print(
+                        f"{quantization:>11} {hnsw_m:>3} {hnsw_ef:>4} {oversampling:>6.1f} {recall:>7.3f} "
+                        f"{statistics.median(latencies):>7.2f} {p95:>7.2f} {ram:>8.1f}"
+                    )
+
+    client.delete_collection(COLLECTION)
+    client.close()
+
+if __name__ == "__main__":
+    main()
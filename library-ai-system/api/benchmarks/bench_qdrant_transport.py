@@ -0,0 +1,113 @@
+"""
+Benchmark: transporte REST x gRPC do Qdrant.
+
+Mede a vazão de upsert (pontos/s) para diferentes tamanhos de lote e a latência
+de busca (p50/p95) para lotes de consultas, em uma collection temporária do
+Qdrant apontado por --url. O mesmo servidor é usado pelos dois transportes:
+REST na porta da URL e gRPC em QDRANT_GRPC_PORT (6334).
+
+Uso (a partir de api/, com o Qdrant no ar):
+    python -m benchmarks.bench_qdrant_transport --url http://library-qdrant:6333
+    python -m benchmarks.bench_qdrant_transport --dimensions 384 --upsert-batches 64 256 --search-batches 1 16
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+from qdrant_client.models import Distance, PointStruct, QueryRequest, VectorParams
+
+from library_backend.services.qdrant_service import QDRANT_URL, create_qdrant_client
+from .pdf_fixtures import WORDS
+
+COLLECTION = "bench_transport"
+
+def _points(vectors: np.ndarray, payload_words: int):
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(payload_words))
+    return [
+        PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector.tolist(),
+            payload={"text": text, "book_id": index % 50, "chunk_index": index}
+        )
+        for index, vector in enumerate(vectors)
+    ]
+
+def bench_upsert(client, vectors: np.ndarray, batch_size: int, payload_words: int) -> float:
+    """Pontos por segundo inserindo todos os vetores em lotes de batch_size (wait=True)"""
+    points = _points(vectors, payload_words)
+    started = time.perf_counter()
+    for start in range(0, len(points), batch_size):
+        client.upsert(collection_name=COLLECTION, points=points[start:start + batch_size], wait=True)
+    return len(points) / (time.perf_counter() - started)
+
+def bench_search(client, queries: np.ndarray, batch_size: int, limit: int):
+    """Latências (ms) de query_batch_points com batch_size consultas por requisição"""
+    latencies = []
+    for start in range(0, len(queries) - batch_size + 1, batch_size):
+        requests = [
+            QueryRequest(query=query.tolist(), limit=limit, with_payload=True)
+            for query in queries[start:start + batch_size]
+        ]
+        started = time.perf_counter()
+        client.query_batch_points(collection_name=COLLECTION, requests=requests)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def _reset_collection(client, dimensions: int):
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(
+        collection_name=COLLECTION,
+        vectors_config=VectorParams(size=dimensions, distance=Distance.COSINE)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=QDRANT_URL)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--payload-words", type=int, default=600, help="palavras no texto de cada ponto")
+    parser.add_argument("--upsert-batches", type=int, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--search-batches", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.points, args.dimensions), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+
+    transports = {
+        "REST": create_qdrant_client(args.url, prefer_grpc=False),
+        "gRPC": create_qdrant_client(args.url, prefer_grpc=True),
+    }
+
+    print(f"Upsert de {args.points} pontos ({args.dimensions} dimensões)")
+    print(f"{'lote':>6} " + " ".join(f"{name + ' pts/s':>12}" for name in transports))
+    for batch_size in args.upsert_batches:
+        row = []
+        for client in transports.values():
+            _reset_collection(client, args.dimensions)
+            row.append(bench_upsert(client, vectors, batch_size, args.payload_words))
+        print(f"{batch_size:>6} " + " ".join(f"{value:>12.0f}" for value in row))
+
+    print(f"\nBusca (limit={args.limit}, com payload), latência por requisição em ms")
+    print(f"{'lote':>6} " + " ".join(f"{name + ' p50':>10} {name + ' p95':>10}" for name in transports))
+    for batch_size in args.search_batches:
+        row = []
+        for client in transports.values():
+            bench_search(client, queries[:batch_size], batch_size, args.limit)  # aquecimento
+            latencies = bench_search(client, queries, batch_size, args.limit)
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            row.append(f"{statistics.median(latencies):>10.2f} {p95:>10.2f}")
+        print(f"{batch_size:>6} " + " ".join(row))
+
+    transports["REST"].delete_collection(COLLECTION)
+    for client in transports.values():
+        client.close()
+
+if __name__ == "__main__":
+    main()
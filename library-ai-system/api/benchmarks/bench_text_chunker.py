@@ -0,0 +1,239 @@
+"""
+Benchmark: chunker de texto por caracteres usado antes do TextChunker.
+
+A ingestão divide o texto por tokens (services/text_chunker.py); o chunker por
+caracteres que o PDFService tinha fica aqui como referência. Compara a versão
+otimizada (última quebra da janela achada com str.rfind) com a original (busca
+regressiva caractere a caractere), verificando que a saída é idêntica e medindo
+a vazão em textos sintéticos de 1M a 50M caracteres.
+
+Uso (a partir de api/):
+    python -m benchmarks.bench_text_chunker --sizes 1 10 50
+    python -m benchmarks.bench_text_chunker --sizes 1 5 --no-boundaries
+"""
+
+import argparse
+import bisect
+import random
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+
+from .pdf_fixtures import WORDS
+
+def legacy_create_text_chunks(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+    """Implementação original de PDFService.create_text_chunks (busca regressiva)"""
+    if not text or not text.strip():
+        return []
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            for i in range(end, max(start + chunk_size - 200, start), -1):
+                if text[i] in ['\n', '.', '!', '?']:
+                    end = i + 1
+                    break
+                elif text[i] == ' ':
+                    end = i
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = max(start + 1, end - overlap)
+        if start >= len(text):
+            break
+    return chunks
+
+def _last_chunk_boundary(text: str, low: int, high: int) -> int:
+    """Posição da última quebra ('\\n', '.', '!', '?' ou espaço) em text[low:high], ou -1
+
+    Uma busca em C (str.rfind) por caractere; as pontuações só são procuradas
+    depois do último espaço, o que mantém as buscas curtas em prosa.
+    """
+    boundary = text.rfind(' ', low, high)
+    after = boundary + 1 if boundary >= 0 else low
+    if after < high:
+        boundary = max(
+            boundary, text.rfind('\n', after, high), text.rfind('.', after, high),
+            text.rfind('!', after, high), text.rfind('?', after, high)
+        )
+    return boundary
+
+def iter_text_chunks(
+    pages: Iterable[Dict[str, Any]],
+    chunk_size: int = 1000,
+    overlap: int = 100,
+    boundary_window: int = 200
+) -> Iterator[Dict[str, Any]]:
+    """Criar chunks a partir de um fluxo de páginas, sem montar o texto completo do livro
+
+    Cada chunk termina na última quebra ('\\n', '.', '!', '?' ou espaço) dentro
+    dos boundary_window caracteres finais (_last_chunk_boundary), sem a busca
+    regressiva caractere a caractere. A saída é a mesma de
+    legacy_create_text_chunks; só em um texto
+    sem quebras com overlap >= chunk_size (em que o início andaria um caractere
+    por chunk) o avanço tem um mínimo. Em memória fica apenas uma janela de
+    ~chunk_size caracteres além da página corrente. Cada chunk traz a página
+    onde começa.
+    """
+    pages = iter(pages)
+    buffer = ""            # texto ainda não consumido
+    buffer_offset = 0      # posição (no texto completo) de buffer[0]
+    content_end = 0        # posição após o último caractere não branco lido
+    page_starts = []       # posições onde cada página começa
+    page_numbers = []
+    start = 0
+    exhausted = False
+    at_beginning = True    # o texto completo sofre strip(): espaços iniciais são descartados
+    # Avanço de chunks sem quebra quando overlap >= chunk_size (o início
+    # avançaria um caractere por chunk); não muda a saída nos demais casos
+    min_step = max(1, chunk_size // 2)
+
+    while True:
+        # Garantir texto além de start + chunk_size (ou o fim do texto)
+        while not exhausted and content_end <= start + chunk_size:
+            page = next(pages, None)
+            if page is None:
+                exhausted = True
+                buffer = buffer[:content_end - buffer_offset]  # strip() final
+                break
+
+            page_text = page["text"] + "\n"
+            if at_beginning:
+                page_text = page_text.lstrip()
+                if not page_text:
+                    continue
+                at_beginning = False
+
+            page_start = buffer_offset + len(buffer)
+            page_starts.append(page_start)
+            page_numbers.append(page["page_number"])
+            stripped_length = len(page_text.rstrip())
+            if stripped_length:
+                content_end = page_start + stripped_length
+            buffer += page_text
+
+        if start >= content_end:
+            break
+
+        # Texto inteiro menor que o chunk_size: um único chunk
+        if exhausted and start == 0 and content_end <= chunk_size:
+            yield {"text": buffer, "page_number": page_numbers[0]}
+            break
+
+        end = start + chunk_size
+        at_boundary = False
+
+        # Se não é o último chunk, quebrar na última fronteira dentro da janela
+        if end < content_end:
+            boundary = _last_chunk_boundary(
+                buffer, max(end - boundary_window, start) + 1 - buffer_offset, end + 1 - buffer_offset
+            )
+            if boundary >= 0:
+                end = boundary + buffer_offset + (buffer[boundary] != ' ')
+                at_boundary = True
+
+        chunk = buffer[start - buffer_offset:end - buffer_offset].strip()
+        if chunk:
+            page_index = bisect.bisect_right(page_starts, start) - 1
+            yield {"text": chunk, "page_number": page_numbers[max(page_index, 0)]}
+
+        # Calcular próximo início com overlap
+        if at_boundary or end - overlap > start:
+            start = max(start + 1, end - overlap)
+        else:
+            start += min_step
+
+        # Descartar o texto já consumido quando ele passa de metade da janela
+        # (amortizado: cada caractere é copiado um número constante de vezes)
+        consumed = start - buffer_offset
+        if consumed > chunk_size and consumed * 2 > len(buffer):
+            buffer = buffer[consumed:]
+            buffer_offset = start
+            first_page = max(bisect.bisect_right(page_starts, start) - 1, 0)
+            del page_starts[:first_page]
+            del page_numbers[:first_page]
+
+def create_text_chunks(text: str, chunk_size: int = 1000, overlap: int = 100, boundary_window: int = 200) -> List[str]:
+    """Criar chunks de texto para processamento de embeddings
+
+    Mesmos cortes de iter_text_chunks, em um laço direto sobre o texto já em
+    memória (sem janela de páginas nem dicts por chunk).
+    """
+    if not text or not text.strip():
+        return []
+    text = text.strip()
+    length = len(text)
+    if length <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    min_step = max(1, chunk_size // 2)
+    while start < length:
+        end = start + chunk_size
+        at_boundary = False
+        if end < length:
+            boundary = _last_chunk_boundary(text, max(end - boundary_window, start) + 1, end + 1)
+            if boundary >= 0:
+                end = boundary + (text[boundary] != ' ')
+                at_boundary = True
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        if at_boundary or end - overlap > start:
+            start = max(start + 1, end - overlap)
+        else:
+            start += min_step
+
+    return chunks
+
+def synthetic_text(size: int, with_boundaries: bool = True, seed: int = 7) -> str:
+    """Texto de `size` caracteres; sem fronteiras é uma única sequência sem espaços"""
+    if not with_boundaries:
+        return "x" * size
+
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(2000):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20)))
+        sentences.append(sentence.capitalize() + rng.choice([". ", "! ", "? ", ".\n"]))
+    block = "".join(sentences)
+    return (block * (size // len(block) + 1))[:size]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50], help="tamanhos em milhões de caracteres")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--no-boundaries", action="store_true", help="texto sem espaços nem pontuação")
+    parser.add_argument("--skip-legacy", action="store_true", help="não executar a implementação anterior")
+    args = parser.parse_args()
+
+    print(f"{'Mchars':>7} {'chunks':>9} {'atual (s)':>10} {'MB/s':>8} {'anterior (s)':>13} {'MB/s':>8} {'saída':>7}")
+    for size_millions in args.sizes:
+        text = synthetic_text(size_millions * 1_000_000, with_boundaries=not args.no_boundaries)
+
+        started = time.perf_counter()
+        chunks = create_text_chunks(text, args.chunk_size, args.overlap)
+        current = time.perf_counter() - started
+        line = f"{size_millions:>7} {len(chunks):>9} {current:>10.3f} {size_millions / current:>8.1f}"
+
+        if args.skip_legacy:
+            print(line)
+            continue
+
+        started = time.perf_counter()
+        legacy_chunks = legacy_create_text_chunks(text, args.chunk_size, args.overlap)
+        legacy = time.perf_counter() - started
+        same_output = "igual" if legacy_chunks == chunks else "DIFERE"
+        print(f"{line} {legacy:>13.3f} {size_millions / legacy:>8.1f} {same_output:>7}")
+
+if __name__ == "__main__":
+    main()
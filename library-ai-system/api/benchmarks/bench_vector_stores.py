@@ -0,0 +1,183 @@
+"""
+Benchmark: Qdrant + hidratação no PostgreSQL x pgvector em book_chunks.
+
+Grava os mesmos chunks sintéticos (vetores agrupados por livro) nos dois
+armazenamentos pela interface VectorStore e mede latência p50/p95 e recall@k
+(em relação à busca exata com NumPy) de search_similar_chunks sem filtro,
+filtrando por alguns livros e filtrando por gênero. No Qdrant a latência
+inclui a consulta ao PostgreSQL que preenche o texto dos chunks; no pgvector
+busca, filtro e texto saem de uma única consulta.
+
+Os livros e chunks do benchmark são gravados nas tabelas reais (título
+"bench-vector-stores") e removidos no fim; o pgvector usa uma cópia de
+book_chunks (bench_book_chunks), sem tocar na coluna embedding da tabela real.
+Precisa do PostgreSQL com a extensão vector e de um Qdrant no ar.
+
+Uso (a partir de api/):
+    python -m benchmarks.bench_vector_stores --url http://library-qdrant:6333
+    python -m benchmarks.bench_vector_stores --books 100 --chunks-per-book 400 --dimensions 384
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import delete, insert, text
+
+from library_backend.database import engine
+from library_backend.models import Book, BookChunk
+from library_backend.services.pgvector_store import PgVectorStore
+from library_backend.services.qdrant_service import QDRANT_URL, QdrantService, create_async_qdrant_client
+from .pdf_fixtures import WORDS
+
+COLLECTION = "bench_vector_stores"
+PG_TABLE = "bench_book_chunks"
+TITLE = "bench-vector-stores"
+GENRES = ["Romance", "Ciência", "História", "Poesia", "Técnico"]
+
+def synthetic_library(rng, books: int, chunks_per_book: int, dimensions: int):
+    """Um centro por livro (os trechos de um livro são parecidos entre si)"""
+    centers = rng.standard_normal((books, dimensions), dtype=np.float32)
+    owners = np.repeat(np.arange(books), chunks_per_book)
+    vectors = centers[owners] + 0.8 * rng.standard_normal((len(owners), dimensions), dtype=np.float32)
+    return owners, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def insert_rows(book_count: int, owners: np.ndarray, point_ids, dimensions: int):
+    """Livros e chunks do benchmark nas tabelas reais; devolve os ids dos livros
+
+    A cópia para o pgvector ganha a sua coluna embedding com a dimensão do
+    benchmark (a da tabela real vem de init-scripts/05).
+    """
+    with engine.begin() as conn:
+        book_ids = [
+            conn.execute(insert(Book).values(
+                title=f"{TITLE} {index}", genre=GENRES[index % len(GENRES)],
+                language="Portuguese", processed=True
+            ).returning(Book.id)).scalar_one()
+            for index in range(book_count)
+        ]
+        conn.execute(insert(BookChunk), [
+            {
+                "book_id": book_ids[owner],
+                "chunk_text": " ".join(WORDS[(position + offset) % len(WORDS)] for offset in range(120)),
+                "chunk_index": position,
+                "page_number": position // 3 + 1,
+                "qdrant_point_id": uuid.UUID(point_id),
+            }
+            for position, (owner, point_id) in enumerate(zip(owners.tolist(), point_ids))
+        ])
+        conn.execute(text(f"DROP TABLE IF EXISTS {PG_TABLE}"))
+        conn.execute(text(f"CREATE TABLE {PG_TABLE} (LIKE book_chunks INCLUDING DEFAULTS)"))
+        conn.execute(text(
+            f"INSERT INTO {PG_TABLE} SELECT * FROM book_chunks WHERE book_id = ANY(:book_ids)"
+        ), {"book_ids": book_ids})
+        conn.execute(text(f"ALTER TABLE {PG_TABLE} DROP COLUMN IF EXISTS embedding"))
+        conn.execute(text(f"ALTER TABLE {PG_TABLE} ADD COLUMN embedding vector({dimensions})"))
+        conn.execute(text(
+            f"CREATE INDEX ON {PG_TABLE} USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64)"
+        ))
+        conn.execute(text(f"CREATE INDEX ON {PG_TABLE} (qdrant_point_id)"))
+    return book_ids
+
+def cleanup(book_ids):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {PG_TABLE}"))
+        conn.execute(delete(Book).where(Book.id.in_(book_ids)))
+
+async def fill(store, point_ids, vectors, payloads, batch_size: int = 512) -> float:
+    started = time.perf_counter()
+    for start in range(0, len(point_ids), batch_size):
+        stored = await store.add_book_chunks(
+            point_ids[start:start + batch_size],
+            vectors[start:start + batch_size].tolist(),
+            payloads[start:start + batch_size]
+        )
+        if not stored:
+            raise RuntimeError(f"{type(store).__name__} não gravou o lote {start}")
+    return time.perf_counter() - started
+
+async def measure(store, queries, expected, positions, k: int, **filters):
+    latencies, hits = [], 0
+    for query, exact in zip(queries, expected):
+        started = time.perf_counter()
+        results = await store.search_similar_chunks(query.tolist(), limit=k, **filters)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({positions[str(result["id"])] for result in results} & set(exact))
+    recall = hits / (len(queries) * k)
+    return statistics.median(latencies), statistics.quantiles(latencies, n=20)[-1], recall
+
+def exact_top_k(queries, vectors, mask, k: int):
+    scores = queries @ vectors.T
+    scores[:, ~mask] = -np.inf
+    return [row.tolist() for row in np.argsort(-scores, axis=1)[:, :k]]
+
+async def run(args):
+    rng = np.random.default_rng(42)
+    owners, vectors = synthetic_library(rng, args.books, args.chunks_per_book, args.dimensions)
+    point_ids = [str(uuid.uuid4()) for _ in range(len(owners))]
+    positions = {point_id: index for index, point_id in enumerate(point_ids)}
+    # Perguntas próximas de trechos existentes
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(args.dimensions)
+
+    book_ids = insert_rows(args.books, owners, point_ids, args.dimensions)
+    payloads = [
+        {
+            "book_id": book_ids[owner], "content_hash": f"bench-{owner}", "chunk_index": position,
+            "page_number": position // 3 + 1, "genre": GENRES[owner % len(GENRES)], "language": "Portuguese"
+        }
+        for position, owner in enumerate(owners.tolist())
+    ]
+
+    qdrant = QdrantService(
+        COLLECTION, client=create_async_qdrant_client(args.url), vector_size=args.dimensions
+    )
+    pgvector = PgVectorStore(table=PG_TABLE, dimensions=args.dimensions)
+    stores = {"qdrant": qdrant, "pgvector": pgvector}
+
+    filtered_books = list(range(0, args.books, max(1, args.books // 3)))[:3]
+    scenarios = {
+        "sem filtro": ({}, np.ones(len(owners), dtype=bool)),
+        f"{len(filtered_books)} livros": (
+            {"book_ids": [book_ids[owner] for owner in filtered_books]}, np.isin(owners, filtered_books)
+        ),
+        f"gênero {GENRES[0]}": ({"genre": GENRES[0]}, owners % len(GENRES) == 0),
+    }
+
+    try:
+        print(f"{len(owners)} chunks de {args.dimensions} dimensões em {args.books} livros, recall@{args.k}")
+        for name, store in stores.items():
+            await store.initialize()
+            elapsed = await fill(store, point_ids, vectors, payloads)
+            print(f"  {name}: gravação {len(owners) / elapsed:.0f} vetores/s")
+
+        print(f"\n{'cenário':>16} {'armazenamento':>13} {'p50 ms':>7} {'p95 ms':>7} {'recall':>7}")
+        for scenario, (filters, mask) in scenarios.items():
+            expected = exact_top_k(queries, vectors, mask, args.k)
+            for name, store in stores.items():
+                await measure(store, queries[:10], expected[:10], positions, args.k, **filters)  # aquecimento
+                p50, p95, recall = await measure(store, queries, expected, positions, args.k, **filters)
+                print(f"{scenario:>16} {name:>13} {p50:>7.2f} {p95:>7.2f} {recall:>7.3f}")
+    finally:
+        await qdrant.client.delete_collection(COLLECTION)
+        for store in stores.values():
+            await store.close()
+        cleanup(book_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=QDRANT_URL)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--books", type=int, default=50)
+    parser.add_argument("--chunks-per-book", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Servidor local compatível com POST /v1/embeddings da OpenAI, para testes e benchmarks.
+
+Devolve vetores determinísticos (derivados do hash do texto) após uma latência
+fixa e simula os limites por minuto, com os headers x-ratelimit-* e 429 +
+retry-after-ms quando estourados.
+
+Uso (a partir de api/):
+    python -m benchmarks.fake_embeddings_server --port 8089 --latency-ms 300 --rpm 3000 --tpm 1000000
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=fake ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+class _MinuteLimit:
+    """Balde reposto linearmente ao longo de um minuto, como o da OpenAI"""
+
+    def __init__(self, per_minute: int):
+        self.limit = per_minute
+        self.available = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.available = min(self.limit, self.available + (now - self.updated_at) * self.limit / 60)
+        self.updated_at = now
+
+    def seconds_until(self, amount: int) -> float:
+        return max(amount - self.available, 0) * 60 / self.limit
+
+    def reset_header(self) -> str:
+        return f"{(self.limit - self.available) * 60 / self.limit:.3f}s"
+
+def _embedding(text: str, dimensions: int) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+def create_app(latency_ms: int, rpm: int, tpm: int, dimensions: int) -> FastAPI:
+    app = FastAPI()
+    requests_limit = _MinuteLimit(rpm)
+    tokens_limit = _MinuteLimit(tpm)
+
+    def rate_limit_headers() -> dict:
+        return {
+            "x-ratelimit-limit-requests": str(requests_limit.limit),
+            "x-ratelimit-remaining-requests": str(int(requests_limit.available)),
+            "x-ratelimit-reset-requests": requests_limit.reset_header(),
+            "x-ratelimit-limit-tokens": str(tokens_limit.limit),
+            "x-ratelimit-remaining-tokens": str(int(tokens_limit.available)),
+            "x-ratelimit-reset-tokens": tokens_limit.reset_header(),
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        tokens = sum(max(1, len(text) // 4) for text in inputs)
+
+        requests_limit.refill()
+        tokens_limit.refill()
+        if requests_limit.available < 1 or tokens_limit.available < tokens:
+            retry_after = max(requests_limit.seconds_until(1), tokens_limit.seconds_until(tokens))
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={**rate_limit_headers(), "retry-after-ms": str(int(retry_after * 1000) + 1)}
+            )
+        requests_limit.available -= 1
+        tokens_limit.available -= tokens
+
+        await asyncio.sleep(latency_ms / 1000)
+
+        return JSONResponse(
+            content={
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": index, "embedding": _embedding(text, dimensions)}
+                    for index, text in enumerate(inputs)
+                ],
+                "model": body.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+            },
+            headers=rate_limit_headers()
+        )
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=int, default=300)
+    parser.add_argument("--rpm", type=int, default=3000)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.rpm, args.tpm, args.dimensions)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Geração de PDFs sintéticos para os benchmarks.
+
+Escreve PDFs mínimos (fonte Type1 padrão, uma stream de conteúdo por página)
+sem depender de bibliotecas externas, para que o PyPDF2 tenha texto real a extrair.
+"""
+
+import random
+from typing import List
+
+WORDS = (
+    "biblioteca livro capítulo leitura autor história memória tempo cidade "
+    "personagem narrativa conhecimento página palavra silêncio viagem ciência "
+    "literatura romance poesia ensaio crítica sociedade linguagem destino"
+).split()
+
+def _page_lines(rng: random.Random, lines_per_page: int) -> List[str]:
+    lines = []
+    for _ in range(lines_per_page):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12)))
+        lines.append(sentence.capitalize() + ".")
+    return lines
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 42) -> str:
+    """Gravar um PDF com `pages` páginas de texto pseudo-aleatório em `path`"""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # preenchido depois que as páginas existirem
+    kids = []
+
+    for _ in range(pages):
+        lines = _page_lines(rng, lines_per_page)
+        content = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = content.encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+
+    with open(path, "wb") as pdf_file:
+        pdf_file.write(output)
+    return path
@@ -3,6 +3,8 @@ import os
 
 # Configuração do Celery
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Intervalo (s) da reconciliação dos vetores com book_chunks (celery beat); 0 desliga
+VECTOR_RECONCILE_INTERVAL = int(os.getenv("VECTOR_RECONCILE_INTERVAL", str(24 * 60 * 60)))
 
 # Criar instância do Celery
 celery_app = Celery(
@@ -11,15 +13,21 @@ celery_app = Celery(
     backend=redis_url,
     include=[
         "library_backend.tasks.embeddings_tasks",
+        "library_backend.tasks.ingestion_tasks",
+        "library_backend.tasks.collection_tasks",
         "library_backend.tasks.demo_tasks"
     ]
 )
 
 # Configurações do Celery
+# Mensagens e resultados em msgpack (binário) comprimidos com zlib; as tasks de
+# ingestão carregam apenas referências (book_id + content_hash), não o texto
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],
+    result_serializer="msgpack",
+    task_compression="zlib",
+    result_compression="zlib",
     timezone="America/Sao_Paulo",
     enable_utc=True,
     task_track_started=True,
@@ -27,4 +35,18 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutos soft limit
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-)
\ No newline at end of file
+    # Extração de PDF em uma fila própria: o worker dela roda com --pool threads
+    # (processo não daemon), o que permite o pool de processos da extração paralela
+    task_routes={
+        "library_backend.tasks.ingestion_tasks.ingest_book": {"queue": "ingestion"},
+    },
+)
+
+# Tarefas periódicas (processo celery beat)
+if VECTOR_RECONCILE_INTERVAL > 0:
+    celery_app.conf.beat_schedule = {
+        "reconcile-vector-orphans": {
+            "task": "library_backend.tasks.collection_tasks.reconcile_vector_orphans",
+            "schedule": float(VECTOR_RECONCILE_INTERVAL),
+        },
+    }
@@ -4,6 +4,7 @@ from datetime import datetime
 
 class MessageCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=2000)
+    book_ids: Optional[List[int]] = Field(default=None, description="Restringir a busca a estes livros")
 
 class MessageResponse(BaseModel):
     id: int
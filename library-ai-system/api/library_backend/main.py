@@ -4,12 +4,17 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from .database import get_db, create_tables
 from .routes import books, chat, auth, users, tasks
 from .services.qdrant_service import QdrantService
+from .services.vector_store import VECTOR_STORE, get_vector_store
+from .tasks.embeddings_tasks import backfill_book_payloads, build_book_routing
+from .services.embedding_cache import embedding_cache
+from .services.book_vector_index import listen_invalidations
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -27,10 +32,33 @@ async def lifespan(app: FastAPI):
     create_tables()
     logger.info("✅ Tabelas do banco de dados criadas/verificadas")
     
-    # Inicializar Qdrant
-    qdrant_service = QdrantService()
-    await qdrant_service.initialize()
-    logger.info("✅ Qdrant inicializado")
+    # Inicializar o armazenamento de vetores (Qdrant ou pgvector)
+    vector_store = get_vector_store()
+    await vector_store.initialize()
+    logger.info(f"✅ Armazenamento de vetores inicializado ({VECTOR_STORE})")
+    
+    # Pontos gravados antes de genre/language irem para o payload
+    if isinstance(vector_store, QdrantService) and await vector_store.needs_payload_backfill():
+        try:
+            backfill_book_payloads.delay()
+            logger.info("🔄 Atualização de payloads do Qdrant enviada ao worker")
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar a atualização de payloads: {e}")
+    
+    # Centróides dos livros processados antes do roteamento existir
+    if isinstance(vector_store, QdrantService) and await vector_store.needs_routing_backfill():
+        try:
+            build_book_routing.delay()
+            logger.info("🔄 Cálculo dos centróides dos livros enviado ao worker")
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar o cálculo dos centróides: {e}")
+    
+    # Livros mais citados no chat vão para o índice em memória em segundo plano;
+    # os workers avisam pelo Redis quando regravam ou removem vetores
+    background = []
+    if isinstance(vector_store, QdrantService):
+        background.append(asyncio.create_task(listen_invalidations()))
+        background.append(asyncio.create_task(vector_store.warm_book_index()))
     
     # Criar diretórios necessários
     os.makedirs(os.getenv("UPLOAD_DIR", "/app/uploads"), exist_ok=True)
@@ -42,6 +70,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🔄 Encerrando sistema...")
+    for task in background:
+        if not task.done():
+            task.cancel()
+    await vector_store.close()
 
 # Criar aplicação FastAPI
 app = FastAPI(
@@ -66,6 +98,11 @@ async def health_check():
     """Endpoint de verificação de saúde do sistema"""
     return {"status": "healthy", "service": "Library AI System"}
 
+@app.get("/health/embedding-cache")
+async def embedding_cache_stats():
+    """Acertos, faltas e ocupação do cache de embeddings"""
+    return await embedding_cache.stats()
+
 # Incluir rotas
 app.include_router(auth.router, prefix="/auth", tags=["Autenticação"])
 app.include_router(users.router, prefix="/users", tags=["Usuários"])
@@ -51,6 +51,7 @@ class Book(Base):
     description = Column(Text)
     file_path = Column(String(500))
     file_size = Column(BigInteger)
+    content_hash = Column(String(64))  # SHA-256 do PDF, chave do cache de extração
     processed = Column(Boolean, default=False)
     task_id = Column(String(255))  # ID da task do Celery para tracking
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -141,4 +142,19 @@ class BookRecommendation(Base):
     
     # Relacionamentos
     user = relationship("User", back_populates="recommendations")
-    book = relationship("Book", back_populates="recommendations")
\ No newline at end of file
+    book = relationship("Book", back_populates="recommendations")
+
+
+class EmbeddingCollection(Base):
+    __tablename__ = "embedding_collections"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)  # Collection no Qdrant
+    provider = Column(String(50), nullable=False)  # 'openai', 'hashing'
+    model = Column(String(255), nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="building")  # 'building', 'ready', 'active', 'retired', 'failed'
+    points_count = Column(Integer)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Query
 from fastapi.responses import JSONResponse
+from sqlalchemy import insert, literal, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
@@ -13,9 +14,13 @@ from ..models import Book, Author, BookAuthor, BookChunk, User
 from ..dto.book_dto import BookCreate, BookResponse, BookList, BookUploadResponse
 from ..services.pdf_service import PDFService
 from ..services.openai_service import OpenAIService
-from ..services.qdrant_service import QdrantService
+from ..services.qdrant_service import QdrantService, book_payload_fields
+from ..services.vector_store import get_vector_store
+from ..services.book_vector_index import book_vector_index
+from ..services.storage_service import StorageService, UploadTooLargeError
 from ..core.auth import get_current_user
-from ..tasks.embeddings_tasks import process_pdf_embeddings, search_similar_documents
+from ..tasks.embeddings_tasks import cleanup_book_embeddings, search_similar_documents
+from ..tasks.ingestion_tasks import ingest_book
 from ..tasks.demo_tasks import demo_process_embeddings
 from ..celery_app import celery_app
 from celery.result import AsyncResult
@@ -25,10 +30,11 @@ router = APIRouter()
 
 # Instanciar serviços
 pdf_service = PDFService()
+storage_service = StorageService()
 openai_service = OpenAIService()
-qdrant_service = QdrantService()  # Reativado para uso com Celery
+vector_store = get_vector_store()
 
-@router.post("/upload", response_model=BookUploadResponse)
+@router.post("/upload", response_model=BookUploadResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_book(
     file: UploadFile = File(...),
     title: str = Query(...),
@@ -51,36 +57,53 @@ async def upload_book(
             detail="Apenas arquivos PDF são permitidos"
         )
     
+    # Limitar quantos uploads são gravados e processados simultaneamente
+    async with storage_service.upload_slots:
+        return await _store_uploaded_book(
+            file=file,
+            title=title,
+            isbn=isbn,
+            publication_year=publication_year,
+            publisher=publisher,
+            language=language,
+            genre=genre,
+            description=description,
+            author_names=author_names,
+            db=db
+        )
+
+async def _store_uploaded_book(
+    file: UploadFile,
+    title: str,
+    isbn: Optional[str],
+    publication_year: Optional[int],
+    publisher: Optional[str],
+    language: str,
+    genre: Optional[str],
+    description: Optional[str],
+    author_names: str,
+    db: Session
+) -> BookUploadResponse:
+    """Gravar o PDF em disco (streaming), registrar o livro e enfileirar a ingestão"""
     try:
-        # Ler conteúdo do arquivo
-        file_content = await file.read()
-        
-        # Validar se é um PDF válido
-        if not pdf_service.validate_pdf_file(file_content):
+        # Gravar arquivo em disco em blocos, sem manter o PDF inteiro em memória
+        try:
+            stored_file = await storage_service.save_upload(file)
+        except UploadTooLargeError as e:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Arquivo PDF inválido ou corrompido"
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
             )
         
-        # Gerar nome único para o arquivo
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        upload_dir = os.getenv("UPLOAD_DIR", "/app/uploads")
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # Salvar arquivo
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        file_path = stored_file["file_path"]
         
-        # Extrair texto do PDF
-        extraction_result = pdf_service.extract_text_from_upload(file_content)
-        
-        if not extraction_result["success"]:
-            # Remover arquivo se extração falhou
-            os.unlink(file_path)
+        # Validação barata (assinatura do PDF); extração fica para a task de ingestão
+        if not pdf_service.validate_pdf_file(file_path):
+            if not stored_file["already_stored"]:
+                os.unlink(file_path)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Erro ao processar PDF: {extraction_result['error']}"
+                detail="Arquivo PDF inválido ou corrompido"
             )
         
         # Criar registro do livro no banco
@@ -93,8 +116,8 @@ async def upload_book(
             genre=genre,
             description=description,
             file_path=file_path,
-            file_size=len(file_content),
-            pages=extraction_result["total_pages"],
+            file_size=stored_file["file_size"],
+            content_hash=stored_file["sha256"],
             processed=False
         )
         
@@ -123,25 +146,33 @@ async def upload_book(
         
         db.commit()
         
-        # Processar embeddings usando Celery (assíncrono)
-        try:
-            # Criar chunks do texto
-            chunks = pdf_service.create_text_chunks(extraction_result["text"])
+        # Conteúdo idêntico já processado: reaproveitar chunks e pontos, sem novos embeddings
+        source_book = _find_processed_duplicate(db, book)
+        if source_book and await _reuse_processed_content(db, book, source_book):
+            logger.info(f"Livro {book.id} reaproveitou os embeddings do livro {source_book.id}")
             
-            # Enviar task para Celery
-            task = process_pdf_embeddings.delay(book.id, chunks)
+            return BookUploadResponse(
+                success=True,
+                message="Livro enviado com sucesso! Conteúdo já processado anteriormente, embeddings reaproveitados.",
+                book_id=book.id,
+                processing_status="completed"
+            )
+        
+        # Extração, chunking e embeddings rodam no worker Celery, fora do event loop
+        try:
+            task = ingest_book.delay(book.id)
             
             # Salvar task ID no banco para tracking
             book.task_id = task.id
             db.commit()
             
-            logger.info(f"Task de embeddings iniciada para livro {book.id}: {task.id}")
+            logger.info(f"Task de ingestão iniciada para livro {book.id}: {task.id}")
             
             return BookUploadResponse(
                 success=True,
-                message="Livro enviado com sucesso! Processamento de embeddings iniciado.",
+                message="Livro enviado com sucesso! Processamento iniciado.",
                 book_id=book.id,
-                processing_status="processing",
+                processing_status="queued",
                 task_id=task.id
             )
             
@@ -167,6 +198,52 @@ async def upload_book(
             detail="Erro interno do servidor"
         )
 
+def _find_processed_duplicate(db: Session, book: Book) -> Optional[Book]:
+    """Buscar outro livro já processado com o mesmo hash de conteúdo"""
+    return db.query(Book).filter(
+        Book.content_hash == book.content_hash,
+        Book.id != book.id,
+        Book.processed == True,
+        Book.chunks.any()
+    ).order_by(Book.id).first()
+
+async def _reuse_processed_content(db: Session, book: Book, source_book: Book) -> bool:
+    """Copiar os chunks do livro de origem e associar o novo livro aos mesmos vetores"""
+    try:
+        db.execute(
+            insert(BookChunk).from_select(
+                ["book_id", "chunk_text", "chunk_index", "page_number", "qdrant_point_id"],
+                select(
+                    literal(book.id),
+                    BookChunk.chunk_text,
+                    BookChunk.chunk_index,
+                    BookChunk.page_number,
+                    BookChunk.qdrant_point_id
+                ).where(BookChunk.book_id == source_book.id)
+            )
+        )
+        
+        # As linhas precisam estar gravadas antes dos vetores (pgvector copia para elas)
+        db.commit()
+        
+        book_ids = [
+            row.id for row in db.query(Book.id).filter(Book.content_hash == book.content_hash).all()
+        ]
+        if not await vector_store.set_content_book_ids(book.content_hash, book_ids):
+            db.query(BookChunk).filter(BookChunk.book_id == book.id).delete(synchronize_session=False)
+            db.commit()
+            return False
+        
+        book.pages = source_book.pages
+        book.processed = True
+        db.commit()
+        return True
+        
+    except Exception as e:
+        logger.warning(f"Não foi possível reaproveitar o conteúdo do livro {source_book.id}: {e}")
+        db.rollback()
+        return False
+
 async def process_book_embeddings(book_id: int, extraction_result: dict):
     """Processar embeddings do livro em background - versão segura"""
     try:
@@ -207,7 +284,7 @@ async def process_book_embeddings(book_id: int, extraction_result: dict):
             logger.info(f"Gerados {len([e for e in embeddings if e])} embeddings válidos")
             
             # Salvar chunks e embeddings
-            chunks_salvos = 0
+            point_ids, vectors, payloads = [], [], []
             for idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
                 if embedding:  # Verificar se embedding foi gerado com sucesso
                     # Gerar UUID para o ponto no Qdrant
@@ -222,23 +299,24 @@ async def process_book_embeddings(book_id: int, extraction_result: dict):
                     )
                     db.add(book_chunk)
                     
-                    # Salvar no Qdrant
-                    try:
-                        await qdrant_service.add_book_chunk(
-                            chunk_id=qdrant_point_id,
-                            text=chunk_text,
-                            embedding=embedding,
-                            metadata={
-                                "book_id": book.id,
-                                "book_title": book.title,
-                                "chunk_index": idx,
-                                "page_number": None
-                            }
-                        )
-                        chunks_salvos += 1
-                    except Exception as e:
-                        logger.error(f"Erro ao salvar chunk {idx} no Qdrant: {e}")
-                        # Continue processando outros chunks
+                    point_ids.append(qdrant_point_id)
+                    vectors.append(embedding)
+                    payloads.append({
+                        "book_id": book.id,
+                        "content_hash": book.content_hash,
+                        "chunk_index": idx,
+                        "page_number": None,
+                        **book_payload_fields(book)
+                    })
+            
+            # Gravar os chunks antes dos vetores e depois salvar os vetores em lotes
+            db.commit()
+            chunks_salvos = 0
+            if await vector_store.add_book_chunks(point_ids, vectors, payloads):
+                chunks_salvos = len(point_ids)
+                # Centróides do livro para o roteamento das buscas
+                if isinstance(vector_store, QdrantService) and book.content_hash:
+                    await vector_store.refresh_content_routing(book.content_hash, [book.id])
             
             # Marcar livro como processado
             book.processed = True
@@ -302,43 +380,21 @@ async def process_embeddings_manual(
                 detail="Arquivo PDF não encontrado"
             )
         
-        # Extrair texto do PDF novamente
-        with open(book.file_path, 'rb') as f:
-            file_content = f.read()
-        
-        extraction_result = pdf_service.extract_text_from_upload(file_content)
-        
-        if not extraction_result["success"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Erro ao processar PDF: {extraction_result['error']}"
-            )
-        
-        # Criar chunks do texto
-        chunks = pdf_service.create_text_chunks(extraction_result["text"])
-        
-        if not chunks:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Não foi possível extrair texto válido do PDF"
-            )
-        
-        # Enviar task para Celery
-        task = process_pdf_embeddings.delay(book_id, chunks)
+        # Enviar task de ingestão para Celery (extração usa o cache pelo hash do arquivo)
+        task = ingest_book.delay(book_id)
         
         # Atualizar task ID no banco
         book.task_id = task.id
         book.processed = False  # Marcar como não processado até completar
         db.commit()
         
-        logger.info(f"Task de embeddings iniciada manualmente para livro {book_id}: {task.id}")
+        logger.info(f"Task de ingestão iniciada manualmente para livro {book_id}: {task.id}")
         
         return {
             "message": "Processamento de embeddings iniciado com sucesso via Celery",
             "book_id": book_id,
             "task_id": task.id,
             "status": "processing_started",
-            "chunks_count": len(chunks),
             "note": f"Use GET /tasks/task/{task.id} para acompanhar o progresso"
         }
         
@@ -504,21 +560,31 @@ async def delete_book(
         )
     
     try:
-        # TODO: Deletar chunks do Qdrant (DESABILITADO - causa travamento)
-        # try:
-        #     await qdrant_service.delete_book_chunks(book_id)
-        #     logger.info(f"Chunks do Qdrant deletados para livro {book_id}")
-        # except Exception as e:
-        #     logger.warning(f"Erro ao deletar chunks do Qdrant: {e}")
-        
-        # Deletar arquivo físico
-        if book.file_path and os.path.exists(book.file_path):
+        content_hash = book.content_hash
+        
+        # Deletar arquivo físico, a menos que outro livro com o mesmo conteúdo o utilize
+        file_shared = db.query(Book).filter(
+            Book.file_path == book.file_path,
+            Book.id != book.id
+        ).first() is not None
+        if book.file_path and os.path.exists(book.file_path) and not file_shared:
             os.unlink(book.file_path)
         
         # Deletar do banco (cascata deleta chunks, book_authors, etc.)
         db.delete(book)
         db.commit()
         
+        # Vetores removidos pelo worker, depois da linha (a task confere quem
+        # ainda compartilha o conteúdo); se a fila falhar, o reconciliador os remove
+        if isinstance(vector_store, QdrantService):
+            book_vector_index.invalidate(vector_store.collection_name, [book_id])
+            if content_hash:
+                book_vector_index.invalidate_content(vector_store.collection_name, content_hash)
+        try:
+            cleanup_book_embeddings.delay(book_id, content_hash=content_hash)
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar a limpeza dos vetores do livro {book_id}: {e}")
+        
         return {"message": "Livro deletado com sucesso"}
         
     except Exception as e:
@@ -11,7 +11,7 @@ from ..dto.chat_dto import (
     SimpleChatRequest, SimpleChatResponse
 )
 from ..services.openai_service import OpenAIService
-from ..services.qdrant_service import QdrantService
+from ..services.vector_store import get_vector_store
 from ..core.auth import get_current_user
 
 logger = logging.getLogger(__name__)
@@ -19,7 +19,7 @@ router = APIRouter()
 
 # Instanciar serviços
 openai_service = OpenAIService()
-qdrant_service = QdrantService()
+vector_store = get_vector_store()
 
 @router.post("/conversations", response_model=ConversationResponse)
 async def create_conversation(
@@ -131,9 +131,10 @@ async def send_message(
                 detail="Erro ao processar pergunta"
             )
         
-        # Buscar chunks relevantes no Qdrant
-        relevant_chunks = await qdrant_service.search_similar_chunks(
+        # Buscar chunks relevantes (só nos livros escolhidos, se houver)
+        relevant_chunks = await vector_store.search_similar_chunks(
             query_embedding=query_embedding,
+            book_ids=message_data.book_ids,
             limit=5
         )
         
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from celery.result import AsyncResult
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from ..database import get_db
-from ..models import Book, User
+from ..models import Book, EmbeddingCollection, User
 from ..core.auth import get_current_user
 from ..celery_app import celery_app
 from ..tasks.embeddings_tasks import search_similar_documents
+from ..tasks.collection_tasks import activate_embedding_collection, reconcile_vector_orphans, reembed_collection
+from ..services.embedding_collections import QDRANT_COLLECTION_ALIAS, active_target, ensure_collections_table
 
 router = APIRouter()
 
@@ -127,4 +129,105 @@ async def search_with_embeddings(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao iniciar busca: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/embedding-collections")
+async def list_embedding_collections(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Collections de embeddings registradas e a que atende as buscas"""
+    try:
+        ensure_collections_table()
+        records = db.query(EmbeddingCollection).order_by(EmbeddingCollection.created_at.desc()).all()
+        
+        return {
+            'alias': QDRANT_COLLECTION_ALIAS,
+            'active': active_target(db).collection_name,
+            'collections': [
+                {
+                    'name': record.name,
+                    'provider': record.provider,
+                    'model': record.model,
+                    'dimensions': record.dimensions,
+                    'status': record.status,
+                    'points_count': record.points_count,
+                    'error': record.error,
+                    'created_at': record.created_at,
+                    'activated_at': record.activated_at
+                }
+                for record in records
+            ]
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao listar collections: {str(e)}"
+        )
+
+@router.post("/embedding-collections/reembed")
+async def start_reembed(
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    dimensions: Optional[int] = None,
+    activate: bool = True,
+    current_user: User = Depends(get_current_user)
+):
+    """Gerar os vetores de todos os livros em uma collection nova (troca o alias ao terminar)"""
+    try:
+        task = reembed_collection.delay(provider, model, dimensions, activate)
+        
+        return {
+            'message': 'Migração de embeddings iniciada',
+            'task_id': task.id,
+            'provider': provider,
+            'model': model,
+            'dimensions': dimensions
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao iniciar migração: {str(e)}"
+        )
+
+@router.post("/embedding-collections/{collection_name}/activate")
+async def start_activation(
+    collection_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Ativar uma collection registrada (ex.: voltar para a anterior)"""
+    try:
+        task = activate_embedding_collection.delay(collection_name)
+        
+        return {
+            'message': 'Ativação da collection iniciada',
+            'task_id': task.id,
+            'collection': collection_name
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao iniciar ativação: {str(e)}"
+        )
+
+@router.post("/vector-store/reconcile")
+async def start_reconcile(
+    current_user: User = Depends(get_current_user)
+):
+    """Remover da collection ativa os pontos sem linha em book_chunks (também roda pelo beat)"""
+    try:
+        task = reconcile_vector_orphans.delay()
+        
+        return {
+            'message': 'Reconciliação dos vetores iniciada',
+            'task_id': task.id
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao iniciar reconciliação: {str(e)}"
+        )
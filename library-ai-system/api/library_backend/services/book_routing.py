@@ -0,0 +1,88 @@
+import logging
+import math
+import os
+import uuid
+from typing import List, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+# Conteúdos (livros) escolhidos na primeira etapa das buscas sem filtro; 0 desliga
+QDRANT_ROUTING_TOP_BOOKS = int(os.getenv("QDRANT_ROUTING_TOP_BOOKS", "20"))
+# Um centróide a cada ROUTING_CHUNKS_PER_CLUSTER chunks, até ROUTING_MAX_CLUSTERS por livro
+ROUTING_CHUNKS_PER_CLUSTER = int(os.getenv("ROUTING_CHUNKS_PER_CLUSTER", "64"))
+ROUTING_MAX_CLUSTERS = int(os.getenv("ROUTING_MAX_CLUSTERS", "16"))
+ROUTING_KMEANS_ITERATIONS = int(os.getenv("ROUTING_KMEANS_ITERATIONS", "30"))
+ROUTING_KMEANS_BATCH_SIZE = int(os.getenv("ROUTING_KMEANS_BATCH_SIZE", "256"))
+
+# Namespace fixo para os IDs dos centróides (um conjunto por conteúdo)
+ROUTING_POINT_NAMESPACE = uuid.UUID("3c9e2a71-5b84-4d0f-8e6a-7f1b2c3d4e5f")
+
+def routing_collection_name(collection_name: str) -> str:
+    """Collection lateral com os centróides dos livros de uma collection de chunks"""
+    return f"{collection_name}__routing"
+
+def routing_point_id(content_hash: str, cluster: int) -> str:
+    return str(uuid.uuid5(ROUTING_POINT_NAMESPACE, f"{content_hash}:{cluster}"))
+
+def routing_centroids(
+    vectors: np.ndarray,
+    max_clusters: int = ROUTING_MAX_CLUSTERS,
+    chunks_per_cluster: int = ROUTING_CHUNKS_PER_CLUSTER,
+    iterations: int = ROUTING_KMEANS_ITERATIONS,
+    batch_size: int = ROUTING_KMEANS_BATCH_SIZE,
+    seed: int = 0
+) -> np.ndarray:
+    """Centróides (normalizados) dos chunks de um livro por k-means esférico em mini-lotes
+
+    Livros pequenos ficam com um único centróide (a média); os maiores ganham um
+    por assunto, para que a rota não dependa da média de capítulos diferentes.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    count = len(vectors)
+    clusters = max(1, min(max_clusters, math.ceil(count / chunks_per_cluster), count))
+    if clusters == 1:
+        centroid = vectors.mean(axis=0, keepdims=True)
+        return centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(count, clusters, replace=False)].copy()
+    seen = np.zeros(clusters, dtype=np.float32)
+    for _ in range(iterations):
+        batch = vectors[rng.choice(count, min(batch_size, count), replace=False)]
+        assignment = np.argmax(batch @ centroids.T, axis=1)
+        for cluster in np.unique(assignment):
+            members = batch[assignment == cluster]
+            # Passo 1/n por centróide (Sculley): cada um converge para a média dos seus pontos
+            seen[cluster] += len(members)
+            centroids[cluster] += (members.sum(axis=0) - len(members) * centroids[cluster]) / seen[cluster]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+async def route_contents(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    query_embedding: List[float],
+    top_contents: int = QDRANT_ROUTING_TOP_BOOKS
+) -> Optional[List[str]]:
+    """content_hash dos top_contents conteúdos com os centróides mais próximos da query
+
+    None quando a biblioteca não tem mais conteúdos que isso: a busca filtrada
+    cobriria tudo e a busca plana é equivalente (e mais barata).
+    """
+    groups = await client.query_points_groups(
+        collection_name=routing_collection_name(collection_name),
+        query=query_embedding,
+        group_by="content_hash",
+        limit=top_contents + 1,
+        group_size=1,
+        with_payload=False
+    )
+    content_hashes = [str(group.id) for group in groups.groups]
+    if len(content_hashes) <= top_contents:
+        return None
+    return content_hashes[:top_contents]
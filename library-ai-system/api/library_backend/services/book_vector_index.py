@@ -0,0 +1,326 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Book, UserBookInteraction
+from .redis_client import REDIS_SOCKET_TIMEOUT, REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+BOOK_INDEX_MEMORY_MB = float(os.getenv("BOOK_INDEX_MEMORY_MB", "256"))  # 0 desliga o índice
+BOOK_INDEX_DTYPE = os.getenv("BOOK_INDEX_DTYPE", "float32").lower()  # float32 ou float16
+BOOK_INDEX_TTL = int(os.getenv("BOOK_INDEX_TTL", "900"))
+BOOK_INDEX_MAX_BOOKS = int(os.getenv("BOOK_INDEX_MAX_BOOKS", "8"))  # livros por consulta
+BOOK_INDEX_WARMUP_BOOKS = int(os.getenv("BOOK_INDEX_WARMUP_BOOKS", "20"))
+# Canal (Redis pub/sub) em que os workers avisam a API dos vetores regravados ou removidos
+BOOK_INDEX_CHANNEL = os.getenv("BOOK_INDEX_CHANNEL", "book-index:invalidate")
+BOOK_INDEX_REDIS_RETRY_INTERVAL = 30
+
+# Linhas convertidas para float32 por vez quando a matriz está em float16
+_FLOAT16_BLOCK_ROWS = 2048
+
+@dataclass
+class BookVectors:
+    """Vetores (normalizados) de todos os chunks de um livro, em uma matriz contígua"""
+    point_ids: List[str]
+    vectors: np.ndarray
+    chunk_indexes: List[Optional[int]]
+    page_numbers: List[Optional[int]]
+    point_book_ids: List[List[int]]
+    content_hashes: Set[str]
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes
+
+class BookVectorIndex:
+    """Índice exato em memória para buscas restritas a poucos livros
+
+    Cada livro carregado vira uma matriz NumPy (float32 ou float16); a busca é
+    um produto matriz-vetor por livro, sem ida ao Qdrant. Um LRU limitado por
+    memória decide quais livros ficam residentes, e entradas mais velhas que
+    BOOK_INDEX_TTL são descartadas (os workers gravam vetores em outro processo).
+    As chaves incluem a collection, já que cada provedor tem os seus vetores.
+    """
+
+    def __init__(
+        self,
+        memory_mb: float = BOOK_INDEX_MEMORY_MB,
+        dtype: str = BOOK_INDEX_DTYPE,
+        ttl: int = BOOK_INDEX_TTL
+    ):
+        self.max_bytes = int(memory_mb * 1024 * 1024)
+        self.dtype = np.float16 if dtype == "float16" else np.float32
+        self.ttl = ttl
+        self._books: "OrderedDict[Tuple[Hashable, int], BookVectors]" = OrderedDict()
+        self._bytes = 0
+        # Contadores de invalidação: um carregamento iniciado antes de uma
+        # invalidação não guarda os vetores lidos (podem ser os antigos)
+        self._generations: Dict[Tuple[Hashable, int], int] = {}
+        self._content_generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _get(self, key) -> Optional[BookVectors]:
+        entry = self._books.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.loaded_at > self.ttl:
+            self._drop(key)
+            return None
+        self._books.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        entry = self._books.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def load_token(self, collection: str, book_id: int) -> Tuple[int, int]:
+        """Estado de invalidação a conferir em put() ao fim de um carregamento"""
+        with self._lock:
+            return self._generations.get((collection, book_id), 0), self._content_generation
+
+    def missing(self, collection: str, book_ids: List[int]) -> List[int]:
+        """Livros que ainda não estão (ou não estão mais) em memória"""
+        with self._lock:
+            return [book_id for book_id in book_ids if self._get((collection, book_id)) is None]
+
+    def put(
+        self,
+        collection: str,
+        book_id: int,
+        point_ids: List[str],
+        vectors: np.ndarray,
+        chunk_indexes: List[Optional[int]],
+        page_numbers: List[Optional[int]],
+        point_book_ids: List[List[int]],
+        content_hashes: Set[str],
+        token: Optional[Tuple[int, int]] = None
+    ) -> bool:
+        """Guardar os vetores de um livro, removendo os menos usados até caber
+
+        Com token (de load_token), nada é guardado se o livro foi invalidado
+        durante o carregamento.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms), dtype=self.dtype)
+        entry = BookVectors(point_ids, matrix, chunk_indexes, page_numbers, point_book_ids, content_hashes)
+        if entry.nbytes > self.max_bytes:
+            logger.info(f"Livro {book_id} ({entry.nbytes / 1024 / 1024:.1f} MB) não cabe no índice em memória")
+            return False
+
+        key = (collection, book_id)
+        with self._lock:
+            if token is not None and token != (self._generations.get(key, 0), self._content_generation):
+                logger.debug(f"Livro {book_id} invalidado durante o carregamento; descartado")
+                return False
+            self._drop(key)
+            while self._books and self._bytes + entry.nbytes > self.max_bytes:
+                evicted, _ = next(iter(self._books.items()))
+                self._drop(evicted)
+                logger.debug(f"Livro {evicted[1]} removido do índice em memória (LRU)")
+            self._books[key] = entry
+            self._bytes += entry.nbytes
+        return True
+
+    def invalidate(self, collection: str, book_ids: Iterable[int]):
+        with self._lock:
+            for book_id in book_ids:
+                key = (collection, book_id)
+                self._drop(key)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate_content(self, collection: str, content_hash: str):
+        """Descartar os livros que contêm pontos de um conteúdo (a lista de book_ids mudou)"""
+        with self._lock:
+            self._content_generation += 1
+            for key in [key for key, entry in self._books.items()
+                        if key[0] == collection and content_hash in entry.content_hashes]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._books):
+                self._drop(key)
+            self._content_generation += 1
+
+    def search(
+        self,
+        collection: str,
+        query_embedding: List[float],
+        book_ids: List[int],
+        limit: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Top-k exato (cosseno) entre os chunks dos livros, ou None se algum não estiver em memória
+
+        O formato dos resultados é o de QdrantService.search_similar_chunks, ainda
+        sem texto e título. Pontos compartilhados por livros idênticos aparecem uma
+        vez, com os book_ids pedidos que os contêm.
+        """
+        with self._lock:
+            entries = [(book_id, self._get((collection, book_id))) for book_id in book_ids]
+            if any(entry is None for _, entry in entries):
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+
+        candidates: Dict[str, Dict[str, Any]] = {}
+        for book_id, entry in entries:
+            scores = self._scores(entry.vectors, query)
+            top = min(limit, len(scores))
+            if top == 0:
+                continue
+            best = np.argpartition(-scores, top - 1)[:top]
+            for position in best.tolist():
+                point_id = entry.point_ids[position]
+                if point_id in candidates:
+                    candidates[point_id]["book_ids"].append(book_id)
+                    continue
+                candidates[point_id] = {
+                    "id": point_id,
+                    "score": float(scores[position]),
+                    "text": None,
+                    "book_id": book_id,
+                    "book_ids": [book_id],
+                    "book_title": None,
+                    "chunk_index": entry.chunk_indexes[position],
+                    "page_number": entry.page_numbers[position],
+                }
+
+        return sorted(candidates.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
+
+    def _scores(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # NumPy não usa BLAS em float16: converter em blocos limita a memória temporária
+        return np.concatenate([
+            vectors[start:start + _FLOAT16_BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, len(vectors), _FLOAT16_BLOCK_ROWS)
+        ]) if len(vectors) else np.empty(0, dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "books": len(self._books),
+                "memory_mb": round(self._bytes / 1024 / 1024, 2),
+                "max_memory_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "dtype": np.dtype(self.dtype).name,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+_publish_failed_at = 0.0
+
+async def publish_invalidation(collection: str, book_ids: Iterable[int] = (), content_hash: Optional[str] = None):
+    """Invalidar no processo corrente e avisar os demais (API) pelo BOOK_INDEX_CHANNEL"""
+    global _publish_failed_at
+    book_ids = sorted(set(book_ids))
+    book_vector_index.invalidate(collection, book_ids)
+    if content_hash:
+        book_vector_index.invalidate_content(collection, content_hash)
+
+    # Sem Redis, os avisos ficam suspensos por um intervalo (a TTL cobre a API)
+    if time.monotonic() - _publish_failed_at < BOOK_INDEX_REDIS_RETRY_INTERVAL:
+        return
+    message = {"collection": collection, "book_ids": book_ids, "content_hash": content_hash}
+    try:
+        await get_async_redis(REDIS_URL).publish(BOOK_INDEX_CHANNEL, json.dumps(message))
+    except Exception as e:
+        _publish_failed_at = time.monotonic()
+        logger.warning(f"Não foi possível avisar a invalidação do índice em memória: {e}")
+
+def apply_invalidation(message: Dict[str, Any]):
+    collection = message["collection"]
+    book_vector_index.invalidate(collection, message.get("book_ids") or [])
+    if message.get("content_hash"):
+        book_vector_index.invalidate_content(collection, message["content_hash"])
+
+async def listen_invalidations():
+    """Aplicar no índice da API as invalidações publicadas pelos workers (roda até ser cancelada)
+
+    Depois de uma falha o índice é esvaziado: avisos publicados enquanto a
+    assinatura estava fora do ar se perderam.
+    """
+    interrupted = False
+    while True:
+        # Conexão própria, sem timeout de leitura: a assinatura fica parada até chegar um aviso
+        client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(BOOK_INDEX_CHANNEL)
+            if interrupted:
+                book_vector_index.clear()
+                interrupted = False
+            async for message in pubsub.listen():
+                try:
+                    apply_invalidation(json.loads(message["data"]))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Aviso inválido em {BOOK_INDEX_CHANNEL}: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Assinatura de {BOOK_INDEX_CHANNEL} interrompida: {e}")
+            interrupted = True
+            await asyncio.sleep(BOOK_INDEX_REDIS_RETRY_INTERVAL)
+        finally:
+            try:
+                await pubsub.aclose()
+                await client.aclose()
+            except Exception:
+                pass
+
+def most_referenced_books(limit: int = BOOK_INDEX_WARMUP_BOOKS, db: Optional[Session] = None) -> List[int]:
+    """Livros processados mais citados nas respostas do chat, do mais para o menos citado"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = db.query(UserBookInteraction.book_id).join(
+            Book, Book.id == UserBookInteraction.book_id
+        ).filter(
+            UserBookInteraction.interaction_type == "chat_reference",
+            Book.processed.is_(True)
+        ).group_by(UserBookInteraction.book_id).order_by(
+            func.count(UserBookInteraction.id).desc()
+        ).limit(limit).all()
+        return [row.book_id for row in rows]
+    finally:
+        if own_session:
+            db.close()
+
+def processed_book_ids(book_ids: List[int], db: Optional[Session] = None) -> List[int]:
+    """Só livros com o processamento concluído podem ser carregados (senão faltariam chunks)"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = db.query(Book.id).filter(Book.id.in_(book_ids), Book.processed.is_(True)).all()
+        return [row.id for row in rows]
+    finally:
+        if own_session:
+            db.close()
+
+# Instância compartilhada pelo processo
+book_vector_index = BookVectorIndex()
@@ -0,0 +1,49 @@
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Book, BookChunk
+
+logger = logging.getLogger(__name__)
+
+def hydrate_chunks(hits: List[Dict[str, Any]], db: Optional[Session] = None) -> List[Dict[str, Any]]:
+    """Preencher text e book_title dos resultados do Qdrant com uma consulta ao PostgreSQL
+
+    O payload no Qdrant guarda só ids e campos de filtro; o texto de cada chunk
+    fica em book_chunks, localizado pelo qdrant_point_id (indexado). Pontos
+    compartilhados por livros idênticos têm uma linha por livro: usa-se a do
+    book_id escolhido no resultado.
+    """
+    if not hits:
+        return hits
+
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        rows = db.query(
+            BookChunk.qdrant_point_id, BookChunk.book_id, BookChunk.chunk_text, Book.title
+        ).join(Book, Book.id == BookChunk.book_id).filter(
+            BookChunk.qdrant_point_id.in_({uuid.UUID(str(hit["id"])) for hit in hits})
+        ).all()
+    finally:
+        if own_session:
+            db.close()
+
+    by_point, by_point_book = {}, {}
+    for row in rows:
+        point_id = str(row.qdrant_point_id)
+        by_point.setdefault(point_id, row)
+        by_point_book[(point_id, row.book_id)] = row
+
+    for hit in hits:
+        point_id = str(hit["id"])
+        row = by_point_book.get((point_id, hit.get("book_id"))) or by_point.get(point_id)
+        if row is None:
+            logger.warning(f"Ponto {point_id} do Qdrant sem chunk correspondente no PostgreSQL")
+            continue
+        hit["text"] = row.chunk_text
+        hit["book_title"] = row.title
+    return hits
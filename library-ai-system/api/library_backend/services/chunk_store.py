@@ -0,0 +1,93 @@
+import gzip
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Armazenamento compartilhado (volume de uploads) entre a API e os workers Celery
+CHUNK_STORE_DIR = os.getenv(
+    "CHUNK_STORE_DIR",
+    os.path.join(os.getenv("UPLOAD_DIR", "/app/uploads"), ".cache", "chunks")
+)
+
+# Namespace fixo para derivar IDs determinísticos dos pontos no Qdrant
+CHUNK_POINT_NAMESPACE = uuid.UUID("6f1b7c3e-2d4a-4f5e-9a8b-1c2d3e4f5a6b")
+
+def chunk_point_id(content_hash: str, chunk_index: int) -> str:
+    """ID do ponto no Qdrant para um chunk: o mesmo conteúdo gera sempre o mesmo ID"""
+    return str(uuid.uuid5(CHUNK_POINT_NAMESPACE, f"{content_hash}:{chunk_index}"))
+
+class ChunkStore:
+    """Chunks de texto de um livro gravados em disco, indexados pelo hash do PDF
+
+    As tasks Celery recebem apenas o content_hash e leem os chunks daqui, em vez
+    de trafegar o texto do livro inteiro pelo broker.
+    """
+
+    def __init__(self):
+        self.store_dir = CHUNK_STORE_DIR
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.store_dir, f"{content_hash}.jsonl.gz")
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self._path(content_hash))
+
+    def delete(self, content_hash: str) -> bool:
+        """Remover os chunks de um conteúdo que nenhum livro usa mais"""
+        try:
+            os.unlink(self._path(content_hash))
+        except FileNotFoundError:
+            return False
+        logger.info(f"Chunks removidos para o hash {content_hash}")
+        return True
+
+    def write_chunks(self, content_hash: str, chunks: Iterable[Dict[str, Any]]) -> int:
+        """Gravar os chunks (um JSON por linha, gzip) de forma atômica, à medida que chegam
+
+        Cada chunk é um dict com "text", "page_number" e "token_count"; retorna a
+        quantidade gravada.
+        """
+        path = self._path(content_hash)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        count = 0
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        try:
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as store_file:
+                for chunk_index, chunk in enumerate(chunks):
+                    record = {
+                        "i": chunk_index,
+                        "t": chunk["text"],
+                        "p": chunk.get("page_number"),
+                        "n": chunk.get("token_count")
+                    }
+                    store_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        logger.info(f"{count} chunks gravados em {path}")
+        return count
+
+    def iter_chunks(self, content_hash: str) -> Iterator[Dict[str, Any]]:
+        """Ler os chunks de um livro em ordem, sem carregar o arquivo inteiro"""
+        path = self._path(content_hash)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Chunks não encontrados para o hash {content_hash}")
+
+        with gzip.open(path, 'rt', encoding='utf-8') as store_file:
+            for line in store_file:
+                record = json.loads(line)
+                yield {
+                    "chunk_index": record["i"],
+                    "text": record["t"],
+                    "page_number": record.get("p"),
+                    "token_count": record.get("n")
+                }
@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as redis
+
+from .redis_client import REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+EMBEDDING_CACHE_REDIS_URL = os.getenv("EMBEDDING_CACHE_REDIS_URL", REDIS_URL)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+# Tamanho máximo de cada camada; ao passar do limite os menos usados recentemente saem
+EMBEDDING_CACHE_MEMORY_BYTES = int(os.getenv("EMBEDDING_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_REDIS_BYTES = int(os.getenv("EMBEDDING_CACHE_REDIS_BYTES", str(1024 * 1024 * 1024)))
+# float32 (exato) ou float16 (metade do espaço, erro ~1e-3 por componente)
+EMBEDDING_CACHE_DTYPE = np.dtype(os.getenv("EMBEDDING_CACHE_DTYPE", "float32"))
+EMBEDDING_CACHE_REDIS_TIMEOUT = float(os.getenv("EMBEDDING_CACHE_REDIS_TIMEOUT", "1.0"))
+# Após uma falha do Redis, segundos até tentar usá-lo de novo
+EMBEDDING_CACHE_REDIS_RETRY_INTERVAL = 30
+
+REDIS_KEY_PREFIX = "emb:"
+REDIS_LRU_KEY = "emb-cache:lru"      # ZSET chave -> último acesso
+REDIS_BYTES_KEY = "emb-cache:bytes"  # total de bytes armazenados
+REDIS_STATS_KEY = "emb-cache:stats"  # contadores somados de todos os processos
+
+# Grava uma entrada e remove as menos usadas até caber em ARGV[3] bytes
+REDIS_SET_SCRIPT = """
+local size = string.len(ARGV[1])
+local previous = redis.call('STRLEN', KEYS[1])
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], KEYS[1])
+local total = redis.call('INCRBY', KEYS[3], size - previous)
+local evicted = 0
+while total > tonumber(ARGV[3]) do
+    local oldest = redis.call('ZPOPMIN', KEYS[2])
+    if #oldest == 0 then break end
+    total = redis.call('DECRBY', KEYS[3], redis.call('STRLEN', oldest[1]))
+    redis.call('DEL', oldest[1])
+    evicted = evicted + 1
+end
+return evicted
+"""
+
+def normalize_text(text: str) -> str:
+    """Forma canônica usada na chave: NFC e espaços colapsados"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def embedding_cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+class EmbeddingCache:
+    """Cache de embeddings em duas camadas: LRU em memória e Redis
+
+    A chave é (modelo, sha256 do texto normalizado) e os vetores são guardados
+    como blobs float32/float16, com remoção por tamanho em ambas as camadas.
+    Pedidos simultâneos da mesma chave compartilham uma única chamada.
+    """
+
+    def __init__(self):
+        self.enabled = EMBEDDING_CACHE_ENABLED
+        self.memory_limit = EMBEDDING_CACHE_MEMORY_BYTES
+        self.redis_limit = EMBEDDING_CACHE_REDIS_BYTES
+        self.dtype = EMBEDDING_CACHE_DTYPE
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._stats = {
+            "memory_hits": 0, "redis_hits": 0, "misses": 0, "shared": 0,
+            "memory_evictions": 0, "redis_evictions": 0
+        }
+
+        # Cliente Redis e chamadas em voo pertencem ao event loop corrente (o worker
+        # Celery cria um loop por task)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._redis: Optional[redis.Redis] = None
+        self._set_script = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis_counted: Dict[str, int] = {}
+        self._redis_down_until = 0.0
+
+    async def get_or_create_many(
+        self,
+        model: str,
+        texts: List[str],
+        create: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        """Embeddings dos textos, chamando create apenas para os que faltam no cache"""
+        if not self.enabled:
+            return await create(texts)
+
+        self._bind_loop()
+        keys = [embedding_cache_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        # 1) memória
+        pending: Dict[str, List[int]] = {}
+        for index, key in enumerate(keys):
+            vector = self._memory_get(key)
+            if vector is not None:
+                results[index] = vector
+                self._stats["memory_hits"] += 1
+            else:
+                pending.setdefault(key, []).append(index)
+
+        # 2) chamadas já em voo para a mesma chave; as demais passam a ser deste chamador
+        shared = {key: self._inflight[key] for key in pending if key in self._inflight}
+        self._stats["shared"] += len(shared)
+        lookup = [key for key in pending if key not in shared]
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in lookup}
+        self._inflight.update(futures)
+
+        try:
+            # 3) Redis
+            missing = []
+            for key, vector in zip(lookup, await self._redis_get_many(lookup)):
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._memory_put(key, vector)
+                futures[key].set_result(vector)
+                for index in pending[key]:
+                    results[index] = vector
+                self._stats["redis_hits"] += len(pending[key])
+
+            # 4) create para o restante
+            if missing:
+                self._stats["misses"] += len(missing)
+                vectors = await create([texts[pending[key][0]] for key in missing])
+                for key, vector in zip(missing, vectors):
+                    self._memory_put(key, vector)
+                    futures[key].set_result(vector)
+                    for index in pending[key]:
+                        results[index] = vector
+                await self._redis_set_many(dict(zip(missing, vectors)))
+        except BaseException as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # evita "exception was never retrieved"
+            raise
+        finally:
+            for key in lookup:
+                self._inflight.pop(key, None)
+
+        for key, future in shared.items():
+            vector = await future
+            for index in pending[key]:
+                results[index] = vector
+
+        await self._redis_count()
+        return results
+
+    async def get_or_create(
+        self,
+        model: str,
+        text: str,
+        create: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[float]:
+        return (await self.get_or_create_many(model, [text], create))[0]
+
+    async def stats(self) -> Dict[str, Any]:
+        """Contadores deste processo e os agregados de todos os processos (Redis)"""
+        local = dict(self._stats)
+        local["memory_items"] = len(self._memory)
+        local["memory_bytes"] = self._memory_bytes
+
+        result: Dict[str, Any] = {"enabled": self.enabled, "process": local}
+        try:
+            client = self._bind_loop()
+            shared = await client.hgetall(REDIS_STATS_KEY)
+            result["global"] = {key.decode(): int(value) for key, value in shared.items()}
+            result["global"]["redis_items"] = await client.zcard(REDIS_LRU_KEY)
+            result["global"]["redis_bytes"] = int(await client.get(REDIS_BYTES_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"Estatísticas do cache de embeddings no Redis indisponíveis: {e}")
+        return result
+
+    def _bind_loop(self) -> redis.Redis:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._redis = get_async_redis(EMBEDDING_CACHE_REDIS_URL, EMBEDDING_CACHE_REDIS_TIMEOUT)
+            self._set_script = self._redis.register_script(REDIS_SET_SCRIPT)
+            self._inflight = {}
+        return self._redis
+
+    def _redis_ready(self) -> bool:
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        """Redis fora do ar: seguir só com a camada em memória por um intervalo"""
+        logger.warning(f"Cache de embeddings no Redis indisponível: {error}")
+        self._redis_down_until = time.monotonic() + EMBEDDING_CACHE_REDIS_RETRY_INTERVAL
+
+    def _memory_get(self, key: str) -> Optional[List[float]]:
+        vector = self._memory.get(key)
+        if vector is None:
+            return None
+        self._memory.move_to_end(key)
+        return vector.astype(np.float32).tolist()
+
+    def _memory_put(self, key: str, vector: List[float]):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        array = np.asarray(vector, dtype=self.dtype)
+        self._memory[key] = array
+        self._memory_bytes += array.nbytes
+        while self._memory_bytes > self.memory_limit and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self._stats["memory_evictions"] += 1
+
+    async def _redis_get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if not keys or not self._redis_ready():
+            return [None] * len(keys)
+        try:
+            redis_keys = [REDIS_KEY_PREFIX + key for key in keys]
+            blobs = await self._redis.mget(redis_keys)
+            hits = {redis_key: time.time() for redis_key, blob in zip(redis_keys, blobs) if blob}
+            if hits:
+                await self._redis.zadd(REDIS_LRU_KEY, hits, xx=True)
+            return [
+                np.frombuffer(blob, dtype=self.dtype).astype(np.float32).tolist() if blob else None
+                for blob in blobs
+            ]
+        except Exception as e:
+            self._redis_failed(e)
+            return [None] * len(keys)
+
+    async def _redis_set_many(self, vectors: Dict[str, List[float]]):
+        if not self._redis_ready():
+            return
+        try:
+            now = time.time()
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key, vector in vectors.items():
+                    blob = np.asarray(vector, dtype=self.dtype).tobytes()
+                    await self._set_script(
+                        keys=[REDIS_KEY_PREFIX + key, REDIS_LRU_KEY, REDIS_BYTES_KEY],
+                        args=[blob, now, self.redis_limit],
+                        client=pipe
+                    )
+                evicted = await pipe.execute()
+            self._stats["redis_evictions"] += sum(evicted)
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def _redis_count(self):
+        """Somar nos contadores globais o que mudou desde a última publicação"""
+        deltas = {
+            name: value - self._redis_counted.get(name, 0)
+            for name, value in self._stats.items()
+            if value != self._redis_counted.get(name, 0)
+        }
+        if not deltas or not self._redis_ready():
+            return
+        # Marcar como publicado antes do await: chamadas concorrentes não repetem o delta
+        self._redis_counted = dict(self._stats)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for name, delta in deltas.items():
+                    pipe.hincrby(REDIS_STATS_KEY, name, delta)
+                await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Contadores do cache não publicados no Redis: {e}")
+
+# Instância compartilhada pelo processo: a camada em memória e as chamadas em voo
+# só servem se todos os chamadores usarem o mesmo cache
+embedding_cache = EmbeddingCache()
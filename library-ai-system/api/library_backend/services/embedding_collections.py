@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, engine
+from ..models import EmbeddingCollection
+from .embedding_providers import (
+    EMBEDDING_PROVIDER, QDRANT_COLLECTION, EmbeddingProvider, create_embedding_provider, get_embedding_provider
+)
+from .rate_limit import BULK_LANE
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+# Alias do Qdrant apontando para a collection ativa, para consultas feitas direto
+# no Qdrant (painel web, scripts); a API e os workers seguem o registro em
+# embedding_collections, que traz também o modelo dos vetores
+QDRANT_COLLECTION_ALIAS = os.getenv("QDRANT_COLLECTION_ALIAS", f"{QDRANT_COLLECTION}_active")
+# Intervalo (s) para reler a collection ativa, trocada pela migração em outro processo
+EMBEDDING_COLLECTION_REFRESH = float(os.getenv("EMBEDDING_COLLECTION_REFRESH", "15"))
+
+@dataclass(frozen=True)
+class EmbeddingTarget:
+    """Collection e o provedor (modelo e dimensão) que gerou os seus vetores"""
+    collection_name: str
+    provider: str
+    model: str
+    dimensions: int
+
+    def create_provider(self, lane: str = BULK_LANE) -> EmbeddingProvider:
+        return create_embedding_provider(self.provider, self.model, self.dimensions, lane)
+
+def provider_model(provider: EmbeddingProvider) -> str:
+    return getattr(provider, "model", provider.name)
+
+def configured_target() -> EmbeddingTarget:
+    """Provedor de EMBEDDING_PROVIDER e a sua collection (antes de qualquer migração)"""
+    provider = get_embedding_provider()
+    return EmbeddingTarget(provider.collection_name, EMBEDDING_PROVIDER, provider_model(provider), provider.dimensions)
+
+def record_target(record: EmbeddingCollection) -> EmbeddingTarget:
+    return EmbeddingTarget(record.name, record.provider, record.model, record.dimensions)
+
+_active_target: Optional[EmbeddingTarget] = None
+_checked_at = 0.0
+_refreshing = False
+
+def active_target(db: Optional[Session] = None) -> EmbeddingTarget:
+    """Collection que atende buscas e ingestão, com o provedor dos seus vetores
+
+    É a última ativada por uma migração (embedding_collections) ou, se nenhuma
+    foi feita, a do provedor configurado. Relida a cada EMBEDDING_COLLECTION_REFRESH
+    segundos: API e workers passam a usar a nova collection e o novo modelo juntos.
+    """
+    global _active_target, _checked_at
+    now = time.monotonic()
+    if _active_target is not None and now - _checked_at < EMBEDDING_COLLECTION_REFRESH:
+        return _active_target
+
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        record = db.query(EmbeddingCollection).filter(
+            EmbeddingCollection.status == "active"
+        ).order_by(EmbeddingCollection.activated_at.desc()).first()
+        _active_target = record_target(record) if record else configured_target()
+    except Exception as e:
+        # Tabela ainda não criada (nenhuma migração): provedor configurado
+        logger.debug(f"Collection ativa não encontrada em embedding_collections: {e}")
+        db.rollback()
+        _active_target = _active_target or configured_target()
+    finally:
+        if own_session:
+            db.close()
+    _checked_at = now
+    return _active_target
+
+def cached_active_target() -> EmbeddingTarget:
+    """active_target() para o event loop: lê o cache, sem consultar o banco
+
+    Vencido o intervalo, a releitura roda em uma thread e a chamada devolve o
+    valor anterior. Só a primeira leitura do processo (o startup, na API) ou uma
+    chamada fora de um event loop consulta o banco aqui.
+    """
+    global _refreshing
+    target = _active_target
+    if target is None:
+        return active_target()
+    if not _refreshing and time.monotonic() - _checked_at >= EMBEDDING_COLLECTION_REFRESH:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return active_target()
+        _refreshing = True
+        loop.run_in_executor(None, _refresh_active_target)
+    return target
+
+def _refresh_active_target():
+    global _refreshing
+    try:
+        active_target()
+    finally:
+        _refreshing = False
+
+def reset_active_target():
+    """Forçar a releitura da collection ativa na próxima chamada"""
+    global _checked_at
+    _checked_at = 0.0
+
+def ensure_collections_table():
+    EmbeddingCollection.__table__.create(engine, checkfirst=True)
+
+def versioned_collection_name(provider: EmbeddingProvider) -> str:
+    """Collection nova para uma migração: a do provedor com um sufixo de versão"""
+    return f"{provider.collection_name}__v{datetime.utcnow():%Y%m%d%H%M%S}"
+
+async def swap_alias(client: AsyncQdrantClient, collection_name: str, alias: str = QDRANT_COLLECTION_ALIAS):
+    """Apontar o alias para a collection em uma única operação (sem intervalo sem alias)"""
+    aliases = await client.get_aliases()
+    operations = [
+        DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias))
+        for existing in aliases.aliases if existing.alias_name == alias
+    ]
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+    await client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"Alias '{alias}' aponta para '{collection_name}'")
+
+def activate_record(db: Session, record: EmbeddingCollection):
+    """Marcar a collection como ativa e a anterior como aposentada (mantida para rollback)"""
+    db.query(EmbeddingCollection).filter(
+        EmbeddingCollection.status == "active",
+        EmbeddingCollection.id != record.id
+    ).update({"status": "retired"}, synchronize_session=False)
+    record.status = "active"
+    record.activated_at = datetime.utcnow()
+    db.commit()
+    reset_active_target()
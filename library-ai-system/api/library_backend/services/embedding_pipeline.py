@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .chunk_store import chunk_point_id
+from .embedding_cache import embedding_cache
+from .embedding_providers import EmbeddingProvider
+from .rate_limit import iter_request_batches
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+# Limites por requisição de embeddings (a API aceita até 2048 entradas / 300k tokens)
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+# Chamadas de embeddings em voo ao mesmo tempo, por livro
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+class EmbeddingPipeline:
+    """Gera embeddings de um fluxo de chunks e grava os vetores no VectorStore
+
+    Até `concurrency` chamadas ao provedor de embeddings ficam em voo; a gravação
+    de cada lote acontece enquanto os lotes seguintes ainda aguardam o provedor.
+    No máximo 2 x concurrency lotes ficam em memória.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        store: VectorStore,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+        max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS
+    ):
+        self.provider = provider
+        self.store = store
+        self.concurrency = max(1, concurrency)
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+
+    async def run(
+        self,
+        chunks: Iterable[Dict[str, Any]],
+        content_hash: str,
+        book_ids: List[int],
+        on_batch_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        book_payload: Optional[Dict[str, Any]] = None,
+        before_store: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ) -> int:
+        """Processar todos os chunks; retorna quantos vetores foram gravados
+
+        book_payload (genre, language...) é copiado para o payload de cada ponto.
+        before_store recebe os chunks do lote (com "point_id") antes da gravação
+        dos vetores (ex.: criar as linhas de book_chunks) e on_batch_stored depois
+        dela; ambos sempre no event loop, um lote por vez. Chunks que já trazem
+        "point_id" mantêm o ponto (e a linha de book_chunks) existente.
+
+        Um lote com erro (no provedor, em before_store ou na gravação) é
+        descartado e fica fora da contagem: quem chama compara o retorno com o
+        total de chunks.
+        """
+        request_slots = asyncio.Semaphore(self.concurrency)
+        batch_slots = asyncio.Semaphore(2 * self.concurrency)
+        pending = set()
+        stored = 0
+
+        async def process_batch(batch: List[Dict[str, Any]]):
+            nonlocal stored
+            try:
+                async with request_slots:
+                    embeddings = await self._create_embeddings(batch)
+                if embeddings is None:
+                    return
+
+                payloads = []
+                for chunk in batch:
+                    # Chunks já registrados (reprocessamento em outra collection) mantêm o ponto
+                    chunk.setdefault("point_id", chunk_point_id(content_hash, chunk["chunk_index"]))
+                    payloads.append({
+                        "book_id": book_ids,
+                        "content_hash": content_hash,
+                        "chunk_index": chunk["chunk_index"],
+                        "page_number": chunk["page_number"],
+                        **(book_payload or {})
+                    })
+
+                if before_store:
+                    try:
+                        before_store(batch)
+                    except Exception as e:
+                        # Sem as linhas de book_chunks os pontos não seriam hidratados
+                        logger.error(
+                            f"Chunks {batch[0]['chunk_index']}-{batch[-1]['chunk_index']} "
+                            f"descartados antes da gravação dos vetores: {str(e)}"
+                        )
+                        return
+                ids = [chunk["point_id"] for chunk in batch]
+                if not await self.store.add_book_chunks(ids, embeddings, payloads):
+                    return
+
+                stored += len(batch)
+                if on_batch_stored:
+                    on_batch_stored(batch)
+            finally:
+                batch_slots.release()
+
+        for batch in iter_request_batches(chunks, self.max_inputs, self.max_tokens):
+            await batch_slots.acquire()
+            task = asyncio.create_task(process_batch(batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+        return stored
+
+    async def _create_embeddings(self, batch: List[Dict[str, Any]]) -> Optional[List[List[float]]]:
+        """Embeddings do lote: do cache quando possível, senão em uma única chamada ao provedor
+
+        Erros descartam o lote (retorna None).
+        """
+        token_counts = {chunk["text"]: chunk["token_count"] for chunk in batch}
+
+        async def create(texts: List[str]) -> List[List[float]]:
+            return await self.provider.embed(texts, sum(token_counts[text] for text in texts))
+
+        try:
+            return await embedding_cache.get_or_create_many(
+                self.provider.name, [chunk["text"] for chunk in batch], create
+            )
+        except Exception as e:
+            logger.error(
+                f"Erro ao gerar embeddings dos chunks "
+                f"{batch[0]['chunk_index']}-{batch[-1]['chunk_index']}: {str(e)}"
+            )
+            return None
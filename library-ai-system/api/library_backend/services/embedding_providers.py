@@ -0,0 +1,199 @@
+import functools
+import logging
+import os
+import re
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+from openai import AsyncOpenAI, RateLimitError
+
+from .rate_limit import (
+    BULK_LANE, EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT,
+    RateLimitPacer, SharedRateLimiter
+)
+from .text_chunker import EMBEDDING_MODEL, ApproximateEncoding, TextChunker
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Permite apontar para outro endpoint compatível (ex.: benchmarks/fake_embeddings_server.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+# "openai" ou "hashing" (local, sem rede); sem OPENAI_API_KEY o padrão é o local
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER") or ("openai" if OPENAI_API_KEY else "hashing")
+HASHING_EMBEDDING_DIMENSIONS = int(os.getenv("HASHING_EMBEDDING_DIMENSIONS", "384"))
+# Vetores menores nos modelos text-embedding-3 (parâmetro dimensions da API); vazio = nativo
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS") or 0) or None
+# Collection base no Qdrant; provedores diferentes do original ganham um sufixo
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "library_books")
+
+# Dimensão dos modelos de embeddings da OpenAI
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+HASHING_TOKEN_PATTERN = re.compile(r"\w+")
+
+class EmbeddingProvider(ABC):
+    """Backend de embeddings: identifica o espaço vetorial (name/dimensions) e gera vetores"""
+
+    name: str
+    dimensions: int
+
+    @property
+    def collection_name(self) -> str:
+        """Collection do Qdrant com vetores deste provedor (e da mesma dimensão)"""
+        if self.name == "text-embedding-ada-002":
+            return QDRANT_COLLECTION  # collection original do sistema
+        slug = re.sub(r"[^a-z0-9]+", "_", self.name.lower()).strip("_")
+        return f"{QDRANT_COLLECTION}__{slug}"
+
+    @abstractmethod
+    async def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[List[float]]:
+        """Embeddings dos textos, na mesma ordem; tokens é o total já contado, se conhecido"""
+
+    async def close(self):
+        pass
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings da API da OpenAI (ou compatível), com orçamento global e retries em 429"""
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        lane: str = BULK_LANE,
+        client: Optional[AsyncOpenAI] = None,
+        dimensions: Optional[int] = None
+    ):
+        native_dimensions = OPENAI_EMBEDDING_DIMENSIONS.get(model, 1536)
+        self.model = model
+        self.dimensions = dimensions or native_dimensions
+        # Vetores reduzidos são outro espaço vetorial: outro nome (cache e collection)
+        self.name = model if self.dimensions == native_dimensions else f"{model}:{self.dimensions}"
+        self._request_dimensions = None if self.dimensions == native_dimensions else self.dimensions
+        if self._request_dimensions and not model.startswith("text-embedding-3"):
+            raise ValueError(f"O modelo {model} não aceita vetores de {self.dimensions} dimensões")
+        self.lane = lane
+        self.pacer = RateLimitPacer()
+        self.shared_limiter = SharedRateLimiter(model, EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT)
+        self._client = client
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        return self._client
+
+    async def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[List[float]]:
+        """Uma requisição de embeddings, respeitando o rate limit
+
+        Passa pelo orçamento global (na fila do provedor) e pelo controle local
+        de headers. Em 429 aguarda o tempo indicado pela API e tenta de novo,
+        até EMBEDDING_MAX_RETRIES vezes.
+        """
+        if tokens is None:
+            text_chunker = get_text_chunker(self)
+            tokens = sum(text_chunker.count_tokens(text) for text in texts)
+
+        for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+            await self.shared_limiter.acquire(tokens, self.lane)
+            await self.pacer.wait_async(tokens)
+            try:
+                options = {"dimensions": self._request_dimensions} if self._request_dimensions else {}
+                raw_response = await self.client.embeddings.with_raw_response.create(
+                    input=texts,
+                    model=self.model,
+                    **options
+                )
+                self.pacer.update(raw_response.headers)
+                await self.shared_limiter.observe(raw_response.headers)
+                response = raw_response.parse()
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except RateLimitError as e:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = self.pacer.backoff(e.response.headers, attempt)
+                await self.shared_limiter.penalize(delay)
+                logger.warning(f"Rate limit atingido (tentativa {attempt + 1}), nova tentativa em {delay:.2f}s")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Embeddings locais e determinísticos por feature hashing (palavras e bigramas)
+
+    Roda em CPU, sem rede nem modelo para baixar: cada palavra normalizada (e
+    cada par de palavras vizinhas) soma ±1 em uma posição escolhida por CRC32.
+    Captura sobreposição lexical, não semântica - serve para rodar o sistema
+    offline e em testes.
+    """
+
+    def __init__(self, dimensions: int = HASHING_EMBEDDING_DIMENSIONS):
+        self.name = f"hashing-{dimensions}"
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str], tokens: Optional[int] = None) -> List[List[float]]:
+        return self.embed_sync(texts).tolist()
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            words = HASHING_TOKEN_PATTERN.findall(_strip_accents(text.lower()))
+            features = words + [f"{first} {second}" for first, second in zip(words, words[1:])] or [text]
+            rows.extend([row] * len(features))
+            hashes.extend(zlib.crc32(feature.encode("utf-8")) for feature in features)
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if hashes:
+            hashes = np.asarray(hashes, dtype=np.uint32)
+            signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+            np.add.at(vectors, (np.asarray(rows), (hashes & 0x7FFFFFFF) % self.dimensions), signs)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+def _strip_accents(text: str) -> str:
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+def create_embedding_provider(
+    provider: str,
+    model: Optional[str] = None,
+    dimensions: Optional[int] = None,
+    lane: str = BULK_LANE
+) -> EmbeddingProvider:
+    """Provedor pelo nome ("openai" ou "hashing"), modelo e dimensão"""
+    if provider == "openai":
+        return OpenAIEmbeddingProvider(model or EMBEDDING_MODEL, lane, dimensions=dimensions)
+    if provider == "hashing":
+        return HashingEmbeddingProvider(dimensions or HASHING_EMBEDDING_DIMENSIONS)
+    raise ValueError(f"EMBEDDING_PROVIDER desconhecido: {provider}")
+
+def get_text_chunker(provider: Optional[EmbeddingProvider] = None) -> TextChunker:
+    """Chunker com o tokenizador do provedor (por padrão, o de EMBEDDING_PROVIDER)
+
+    Criado na primeira chamada: o tiktoken baixa o vocabulário do modelo, e o
+    provedor hashing conta por palavras, sem ele.
+    """
+    if provider is None:
+        return _text_chunker(EMBEDDING_MODEL if EMBEDDING_PROVIDER == "openai" else None)
+    return _text_chunker(provider.model if isinstance(provider, OpenAIEmbeddingProvider) else None)
+
+@functools.lru_cache(maxsize=None)
+def _text_chunker(model: Optional[str]) -> TextChunker:
+    if model is None:
+        return TextChunker(encoding=ApproximateEncoding())
+    return TextChunker(model)
+
+def get_embedding_provider(lane: str = BULK_LANE) -> EmbeddingProvider:
+    """Provedor configurado em EMBEDDING_PROVIDER; lane define a fila no orçamento da OpenAI"""
+    if EMBEDDING_PROVIDER == "openai":
+        return create_embedding_provider("openai", EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, lane)
+    return create_embedding_provider(EMBEDDING_PROVIDER, lane=lane)
@@ -1,8 +1,15 @@
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 import os
 import logging
 from typing import List, Dict, Any
 import tiktoken
+from .embedding_cache import embedding_cache
+from .embedding_collections import cached_active_target
+from .embedding_providers import EmbeddingProvider, get_text_chunker
+from .rate_limit import (
+    CHAT_RPM_LIMIT, CHAT_TPM_LIMIT, INTERACTIVE_LANE,
+    SharedRateLimiter, retry_after_seconds
+)
 
 logger = logging.getLogger(__name__)
 
@@ -12,31 +19,53 @@ class OpenAIService:
         self.embedding_model = "text-embedding-ada-002"
         self.chat_model = "gpt-4o"
         self.encoding = tiktoken.encoding_for_model("gpt-4")
+        # Embeddings de perguntas: provedor da collection ativa, na fila interativa do orçamento
+        self._embedding_target = None
+        self._embedding_provider = None
+        self.chat_limiter = SharedRateLimiter(self.chat_model, CHAT_RPM_LIMIT, CHAT_TPM_LIMIT)
         
+    @property
+    def embedding_provider(self) -> EmbeddingProvider:
+        """Recriado quando uma migração ativa outra collection (outro modelo ou dimensão)"""
+        target = cached_active_target()
+        if target != self._embedding_target:
+            self._embedding_provider = target.create_provider(INTERACTIVE_LANE)
+            self._embedding_target = target
+        return self._embedding_provider
+    
     async def generate_embedding(self, text: str) -> List[float]:
-        """Gerar embedding para texto usando OpenAI"""
+        """Gerar embedding para texto com o provedor da collection ativa (com cache)"""
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_model
-            )
-            return response.data[0].embedding
+            return await embedding_cache.get_or_create(self.embedding_provider.name, text, self.embedding_provider.embed)
         except Exception as e:
             logger.error(f"Erro ao gerar embedding: {e}")
             return []
     
     async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Gerar embeddings para múltiplos textos"""
+        """Gerar embeddings para múltiplos textos (com cache)"""
         try:
-            response = self.client.embeddings.create(
-                input=texts,
-                model=self.embedding_model
-            )
-            return [item.embedding for item in response.data]
+            return await embedding_cache.get_or_create_many(self.embedding_provider.name, texts, self.embedding_provider.embed)
         except Exception as e:
             logger.error(f"Erro ao gerar embeddings em lote: {e}")
             return []
     
+    async def _complete_chat(self, messages: List[Dict[str, str]], max_tokens: int = 1000) -> str:
+        """Resposta do chat pela fila interativa do orçamento global"""
+        tokens = sum(self.count_tokens(message["content"]) for message in messages) + max_tokens
+        await self.chat_limiter.acquire(tokens, INTERACTIVE_LANE)
+        try:
+            raw_response = self.client.chat.completions.with_raw_response.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens
+            )
+        except RateLimitError as e:
+            await self.chat_limiter.penalize(retry_after_seconds(e.response.headers) or 1.0)
+            raise
+        await self.chat_limiter.observe(raw_response.headers)
+        return raw_response.parse().choices[0].message.content
+    
     async def chat_with_context(self, messages: List[Dict[str, str]], context_chunks: List[Dict[str, Any]]) -> str:
         """Gerar resposta do chat usando contexto dos livros"""
         try:
@@ -83,14 +112,7 @@ LIVROS CONSULTADOS: {', '.join(filter(None, books_mentioned))}"""
             api_messages = [{"role": "system", "content": system_message}]
             api_messages.extend(messages)
             
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=api_messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            return response.choices[0].message.content
+            return await self._complete_chat(api_messages)
             
         except Exception as e:
             logger.error(f"Erro ao gerar resposta do chat: {e}")
@@ -99,16 +121,10 @@ LIVROS CONSULTADOS: {', '.join(filter(None, books_mentioned))}"""
     async def chat(self, message: str) -> str:
         """Chat simples sem contexto"""
         try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=[
-                    {"role": "system", "content": "Você é uma assistente virtual útil e amigável. Responda de forma concisa e clara."},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
+            return await self._complete_chat([
+                {"role": "system", "content": "Você é uma assistente virtual útil e amigável. Responda de forma concisa e clara."},
+                {"role": "user", "content": message}
+            ])
         except Exception as e:
             logger.error(f"Erro no chat simples: {e}")
             return "Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente."
@@ -116,8 +132,8 @@ LIVROS CONSULTADOS: {', '.join(filter(None, books_mentioned))}"""
     async def chat_with_search(self, message: str, user_id: int) -> str:
         """Chat com busca em livros"""
         try:
-            from .qdrant_service import QdrantService
-            qdrant_service = QdrantService()
+            from .vector_store import get_vector_store
+            vector_store = get_vector_store()
             
             # Gerar embedding da mensagem
             query_embedding = await self.generate_embedding(message)
@@ -125,7 +141,7 @@ LIVROS CONSULTADOS: {', '.join(filter(None, books_mentioned))}"""
                 return "Desculpe, não consegui processar sua pergunta."
             
             # Buscar chunks relevantes
-            relevant_chunks = await qdrant_service.search_similar_chunks(
+            relevant_chunks = await vector_store.search_similar_chunks(
                 query_embedding=query_embedding,
                 book_ids=None,  # Buscar em todos os livros do usuário
                 limit=5
@@ -146,20 +162,5 @@ LIVROS CONSULTADOS: {', '.join(filter(None, books_mentioned))}"""
         return len(self.encoding.encode(text))
     
     def split_text_by_tokens(self, text: str, max_tokens: int = 1000, overlap: int = 100) -> List[str]:
-        """Dividir texto em chunks baseado no número de tokens"""
-        tokens = self.encoding.encode(text)
-        chunks = []
-        
-        start = 0
-        while start < len(tokens):
-            end = min(start + max_tokens, len(tokens))
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.encoding.decode(chunk_tokens)
-            chunks.append(chunk_text)
-            
-            # Mover o início com overlap
-            start = end - overlap
-            if start >= len(tokens):
-                break
-                
-        return chunks
\ No newline at end of file
+        """Dividir texto em chunks baseado no número de tokens (mesmo chunker da ingestão)"""
+        return get_text_chunker().split_text(text, max_tokens=max_tokens, overlap=overlap)
@@ -1,160 +1,292 @@
 import PyPDF2
-import io
+import gzip
+import math
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, BinaryIO
 import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+# Cache em disco com o resultado da extração, indexado pelo SHA-256 do arquivo
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(os.getenv("UPLOAD_DIR", "/app/uploads"), ".cache", "extraction")
+)
+
+# Bytes inspecionados no início (cabeçalho %PDF-) e no fim (trailer %%EOF) do arquivo
+PDF_SIGNATURE_WINDOW = 1024
+
+# Extração paralela: documentos com pelo menos PDF_PARALLEL_MIN_PAGES páginas são
+# divididos em faixas de páginas processadas por um pool de processos
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+# Os processos do pool partem de um servidor limpo (forkserver), não de um fork do
+# worker com threads; a fila "ingestion" roda em um worker --pool threads, cujo
+# processo não é daemon e pode criar o pool
+PDF_EXTRACTION_START_METHOD = os.getenv("PDF_EXTRACTION_START_METHOD", "forkserver")
+
+# PdfReader aberto uma única vez em cada processo do pool (sobre o arquivo, não
+# sobre uma cópia em memória como acontece quando o PdfReader recebe o caminho)
+_worker_pdf_reader: Optional[PyPDF2.PdfReader] = None
+
+def _init_extraction_worker(file_path: str) -> None:
+    global _worker_pdf_reader
+    _worker_pdf_reader = PyPDF2.PdfReader(open(file_path, 'rb'))
+
+def _extract_page_range(start: int, end: int) -> List[str]:
+    """Extrair o texto das páginas [start, end) - executado nos processos do pool"""
+    return [_worker_pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
 class PDFService:
     def __init__(self):
-        pass
+        self.cache_dir = EXTRACTION_CACHE_DIR
+        self.extraction_workers = PDF_EXTRACTION_WORKERS
+        self.parallel_min_pages = PDF_PARALLEL_MIN_PAGES
+        self.pages_per_task = PDF_PAGES_PER_TASK
     
-    def extract_text_from_pdf(self, file_path: str) -> Dict[str, Any]:
-        """Extrair texto de um arquivo PDF"""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                text_content = ""
-                pages_content = []
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    text_content += page_text + "\n"
-                    pages_content.append({
-                        "page_number": page_num + 1,
-                        "text": page_text
-                    })
-                
-                metadata = {}
-                if pdf_reader.metadata:
-                    metadata = {
-                        "title": pdf_reader.metadata.get("/Title", ""),
-                        "author": pdf_reader.metadata.get("/Author", ""),
-                        "subject": pdf_reader.metadata.get("/Subject", ""),
-                        "creator": pdf_reader.metadata.get("/Creator", ""),
-                        "producer": pdf_reader.metadata.get("/Producer", ""),
-                        "creation_date": pdf_reader.metadata.get("/CreationDate", ""),
-                        "modification_date": pdf_reader.metadata.get("/ModDate", "")
-                    }
-                
-                return {
-                    "success": True,
-                    "text": text_content,
-                    "pages": pages_content,
-                    "total_pages": len(pdf_reader.pages),
-                    "metadata": metadata
-                }
-                
-        except Exception as e:
-            logger.error(f"Erro ao extrair texto do PDF {file_path}: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "text": "",
-                "pages": [],
-                "total_pages": 0,
-                "metadata": {}
-            }
-    
-    def extract_text_from_upload(self, file_content: bytes) -> Dict[str, Any]:
-        """Extrair texto de um arquivo PDF em memória"""
+    def stream_pdf(self, file_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Validar o PDF e abrir a extração em modo streaming, em uma única passada
+
+        Retorna total de páginas e metadados imediatamente; "pages" é um gerador
+        que extrai (ou lê do cache) uma página de cada vez. Na primeira extração
+        as páginas são gravadas no cache em disco, indexado pelo hash do arquivo,
+        à medida que são consumidas.
+        """
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+            if not self.validate_pdf_file(file_path):
+                return self._failed_result("Arquivo PDF inválido ou corrompido")
             
-            text_content = ""
-            pages_content = []
+            if not content_hash:
+                content_hash = self.compute_file_hash(file_path)
             
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                text_content += page_text + "\n"
-                pages_content.append({
-                    "page_number": page_num + 1,
-                    "text": page_text
-                })
+            cached = self._open_cached_extraction(content_hash)
+            if cached:
+                logger.info(f"Extração do PDF {file_path} obtida do cache ({content_hash[:12]})")
+                return cached
             
-            metadata = {}
-            if pdf_reader.metadata:
-                metadata = {
-                    "title": pdf_reader.metadata.get("/Title", ""),
-                    "author": pdf_reader.metadata.get("/Author", ""),
-                    "subject": pdf_reader.metadata.get("/Subject", ""),
-                    "creator": pdf_reader.metadata.get("/Creator", ""),
-                    "producer": pdf_reader.metadata.get("/Producer", ""),
-                    "creation_date": pdf_reader.metadata.get("/CreationDate", ""),
-                    "modification_date": pdf_reader.metadata.get("/ModDate", "")
-                }
+            file = open(file_path, 'rb')
+            try:
+                pdf_reader = PyPDF2.PdfReader(file)
+                total_pages = len(pdf_reader.pages)
+                metadata = self._read_metadata(pdf_reader)
+            except Exception:
+                file.close()
+                raise
+            
+            header = {"total_pages": total_pages, "metadata": metadata}
+            pages = self._iter_and_cache_pages(file, pdf_reader, file_path, content_hash, header)
             
             return {
                 "success": True,
-                "text": text_content,
-                "pages": pages_content,
-                "total_pages": len(pdf_reader.pages),
-                "metadata": metadata
+                "pages": pages,
+                "total_pages": total_pages,
+                "metadata": metadata,
+                "content_hash": content_hash,
+                "cached": False
             }
             
         except Exception as e:
-            logger.error(f"Erro ao extrair texto do PDF em memória: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "text": "",
-                "pages": [],
-                "total_pages": 0,
-                "metadata": {}
-            }
+            logger.error(f"Erro ao processar PDF {file_path}: {e}")
+            return self._failed_result(str(e))
     
-    def validate_pdf_file(self, file_content: bytes) -> bool:
-        """Validar se o arquivo é um PDF válido"""
+    def validate_pdf_file(self, file_path: str) -> bool:
+        """Validação barata: cabeçalho %PDF- no início e trailer %%EOF no fim do arquivo"""
         try:
-            PyPDF2.PdfReader(io.BytesIO(file_content))
-            return True
+            file_size = os.path.getsize(file_path)
+            with open(file_path, 'rb') as file:
+                head = file.read(PDF_SIGNATURE_WINDOW)
+                file.seek(max(0, file_size - PDF_SIGNATURE_WINDOW))
+                tail = file.read(PDF_SIGNATURE_WINDOW)
+            return b"%PDF-" in head and b"%%EOF" in tail
         except Exception:
             return False
     
-    def create_text_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
-        """Criar chunks de texto para processamento de embeddings"""
-        if not text or not text.strip():
-            return []
+    def compute_file_hash(self, file_path: str, block_size: int = 1024 * 1024) -> str:
+        """Calcular o SHA-256 de um arquivo lendo em blocos"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+    
+    def _read_metadata(self, pdf_reader: PyPDF2.PdfReader) -> Dict[str, str]:
+        metadata = {}
+        if pdf_reader.metadata:
+            metadata = {
+                "title": str(pdf_reader.metadata.get("/Title", "")),
+                "author": str(pdf_reader.metadata.get("/Author", "")),
+                "subject": str(pdf_reader.metadata.get("/Subject", "")),
+                "creator": str(pdf_reader.metadata.get("/Creator", "")),
+                "producer": str(pdf_reader.metadata.get("/Producer", "")),
+                "creation_date": str(pdf_reader.metadata.get("/CreationDate", "")),
+                "modification_date": str(pdf_reader.metadata.get("/ModDate", ""))
+            }
+        return metadata
+    
+    def extract_page_texts(self, pdf_reader: PyPDF2.PdfReader, file_path: str, parallel: Optional[bool] = None) -> List[str]:
+        """Extrair o texto de todas as páginas, em ordem, como lista"""
+        return list(self.iter_page_texts(pdf_reader, file_path, parallel))
+    
+    def iter_page_texts(self, pdf_reader: PyPDF2.PdfReader, file_path: str, parallel: Optional[bool] = None) -> Iterator[str]:
+        """Gerar o texto de cada página, em ordem
+
+        Com parallel=None o modo é escolhido pelo tamanho do documento:
+        abaixo de PDF_PARALLEL_MIN_PAGES (ou com um único worker) a extração é serial.
+        """
+        total_pages = len(pdf_reader.pages)
         
-        # Limpar o texto
-        text = text.strip()
+        if parallel is None:
+            parallel = self.extraction_workers > 1 and total_pages >= self.parallel_min_pages
         
-        # Se o texto é menor que o chunk_size, retornar como um único chunk
-        if len(text) <= chunk_size:
-            return [text]
+        if parallel and multiprocessing.current_process().daemon:
+            # Filhos do pool prefork do Celery são daemon e não podem criar processos:
+            # a ingestão deve rodar na fila "ingestion" (worker --pool threads)
+            logger.warning("Extração paralela indisponível em processo daemon, usando modo serial")
+            parallel = False
         
-        chunks = []
-        start = 0
+        if parallel:
+            executor = self._create_extraction_pool(file_path, total_pages)
+            yield from self._iter_page_texts_parallel(executor, file_path, total_pages)
+            return
         
-        while start < len(text):
-            # Calcular o fim do chunk
-            end = start + chunk_size
-            
-            # Se não é o último chunk, tentar quebrar em uma palavra
-            if end < len(text):
-                # Procurar por quebra de linha ou espaço para quebrar o texto
-                for i in range(end, max(start + chunk_size - 200, start), -1):
-                    if text[i] in ['\n', '.', '!', '?']:
-                        end = i + 1
-                        break
-                    elif text[i] == ' ':
-                        end = i
-                        break
-            
-            # Extrair o chunk
-            chunk = text[start:end].strip()
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
+    
+    def _create_extraction_pool(self, file_path: str, total_pages: int) -> ProcessPoolExecutor:
+        workers = min(self.extraction_workers, math.ceil(total_pages / self.pages_per_task))
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(PDF_EXTRACTION_START_METHOD),
+            initializer=_init_extraction_worker,
+            initargs=(file_path,)
+        )
+    
+    def _iter_page_texts_parallel(self, executor: ProcessPoolExecutor, file_path: str, total_pages: int) -> Iterator[str]:
+        """Dividir as páginas em faixas, extrair em um pool de processos e gerar em ordem
+
+        Apenas 2 faixas por processo ficam em andamento ao mesmo tempo, limitando
+        quantas páginas extraídas esperam em memória pelo consumidor.
+        """
+        workers = executor._max_workers
+        # Faixas menores que o total/workers equilibram páginas de custo desigual
+        pages_per_task = max(1, min(self.pages_per_task, math.ceil(total_pages / workers)))
+        ranges = iter([
+            (start, min(start + pages_per_task, total_pages))
+            for start in range(0, total_pages, pages_per_task)
+        ])
+        
+        logger.info(
+            f"Extraindo {total_pages} páginas de {file_path} em paralelo "
+            f"({workers} processos, {math.ceil(total_pages / pages_per_task)} faixas)"
+        )
+        
+        with executor:
+            in_flight = deque()
+            for start, end in ranges:
+                in_flight.append(executor.submit(_extract_page_range, start, end))
+                if len(in_flight) >= workers * 2:
+                    break
             
-            if chunk:  # Só adicionar chunks não vazios
-                chunks.append(chunk)
+            # Resultados consumidos na ordem de submissão = ordem das páginas
+            while in_flight:
+                page_texts = in_flight.popleft().result()
+                next_range = next(ranges, None)
+                if next_range:
+                    in_flight.append(executor.submit(_extract_page_range, *next_range))
+                yield from page_texts
+    
+    def _iter_and_cache_pages(
+        self,
+        file: BinaryIO,
+        pdf_reader: PyPDF2.PdfReader,
+        file_path: str,
+        content_hash: str,
+        header: Dict[str, Any]
+    ) -> Iterator[Dict[str, Any]]:
+        """Gerar as páginas extraídas gravando-as no cache; o cache só é publicado se a extração terminar"""
+        cache_path = self._cache_path(content_hash)
+        temp_path = f"{cache_path}.{os.getpid()}.{id(file)}.tmp"
+        cache_file = None
+        
+        try:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                cache_file = gzip.open(temp_path, 'wt', encoding='utf-8')
+                cache_file.write(json.dumps(header, ensure_ascii=False) + "\n")
+            except Exception as e:
+                logger.warning(f"Não foi possível gravar cache de extração {cache_path}: {e}")
+                cache_file = None
             
-            # Calcular próximo início com overlap
-            start = max(start + 1, end - overlap)
+            for page_num, page_text in enumerate(self.iter_page_texts(pdf_reader, file_path)):
+                page = {"page_number": page_num + 1, "text": page_text}
+                if cache_file:
+                    cache_file.write(json.dumps(page, ensure_ascii=False) + "\n")
+                yield page
             
-            # Evitar loop infinito
-            if start >= len(text):
-                break
+            if cache_file:
+                cache_file.close()
+                cache_file = None
+                os.replace(temp_path, cache_path)
+                
+        finally:
+            file.close()
+            if cache_file:
+                cache_file.close()
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+    
+    def _failed_result(self, error: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": error,
+            "text": "",
+            "pages": iter(()),
+            "total_pages": 0,
+            "metadata": {}
+        }
+    
+    def _cache_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}.jsonl.gz")
+    
+    def delete_cached_extraction(self, content_hash: str) -> bool:
+        """Remover a extração em cache de um conteúdo que nenhum livro usa mais"""
+        try:
+            os.unlink(self._cache_path(content_hash))
+        except FileNotFoundError:
+            return False
+        logger.info(f"Extração em cache removida para o hash {content_hash}")
+        return True
+    
+    def _open_cached_extraction(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Abrir extração do cache: 1ª linha com cabeçalho, demais linhas com uma página cada"""
+        cache_path = self._cache_path(content_hash)
+        if not os.path.exists(cache_path):
+            return None
+        
+        try:
+            with gzip.open(cache_path, 'rt', encoding='utf-8') as cache_file:
+                header = json.loads(cache_file.readline())
+        except Exception as e:
+            logger.warning(f"Cache de extração {cache_path} ilegível, extraindo novamente: {e}")
+            return None
         
-        logger.info(f"Texto dividido em {len(chunks)} chunks")
-        return chunks
\ No newline at end of file
+        return {
+            "success": True,
+            "pages": self._iter_cached_pages(cache_path),
+            "total_pages": header["total_pages"],
+            "metadata": header["metadata"],
+            "content_hash": content_hash,
+            "cached": True
+        }
+    
+    def _iter_cached_pages(self, cache_path: str) -> Iterator[Dict[str, Any]]:
+        with gzip.open(cache_path, 'rt', encoding='utf-8') as cache_file:
+            cache_file.readline()  # cabeçalho
+            for line in cache_file:
+                yield json.loads(line)
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from ..database import engine
+from .embedding_providers import get_embedding_provider
+from .rate_limit import INTERACTIVE_LANE
+from .vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+PGVECTOR_UPDATE_BATCH_SIZE = int(os.getenv("PGVECTOR_UPDATE_BATCH_SIZE", "256"))
+
+def _vector_literal(vector) -> str:
+    """Formato de entrada do tipo vector: '[0.1, 0.2, ...]'"""
+    return str(vector if isinstance(vector, list) else np.asarray(vector, dtype=np.float32).tolist())
+
+def _version_tuple(version: str) -> tuple:
+    return tuple(int(part) for part in version.split(".")[:2] if part.isdigit())
+
+class PgVectorStore(VectorStore):
+    """Vetores na coluna embedding de book_chunks, com índice HNSW (pgvector)
+
+    Busca, filtros (livro, gênero, idioma) e texto dos chunks saem de uma única
+    consulta SQL, sem a ida ao Qdrant. A coluna e o índice HNSW vêm de
+    init-scripts/05-pgvector-embeddings.sql; na inicialização só se confere a
+    dimensão. Livros com o mesmo conteúdo têm uma linha (e um vetor) cada.
+    """
+
+    def __init__(self, table: str = "book_chunks", dimensions: Optional[int] = None):
+        provider = get_embedding_provider(INTERACTIVE_LANE)
+        self.dimensions = dimensions or provider.dimensions
+        self.table = table
+        self.iterative_scan = False
+        self._ready = False
+
+    async def initialize(self):
+        await asyncio.to_thread(self._ensure_schema)
+
+    def _ensure_schema(self):
+        """Conferir a coluna embedding e a versão do pgvector (o schema é das init-scripts)"""
+        if self._ready:
+            return
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+            size = conn.execute(text(
+                "SELECT atttypmod FROM pg_attribute "
+                "WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding' AND NOT attisdropped"
+            ), {"table": self.table}).scalar()
+        if version is None or size is None:
+            raise RuntimeError(
+                f"{self.table}.embedding não existe: aplique init-scripts/05-pgvector-embeddings.sql"
+            )
+        if size != self.dimensions:
+            raise ValueError(
+                f"{self.table}.embedding tem vetores de {size} dimensões, mas o provedor de "
+                f"embeddings gera {self.dimensions} (ajuste init-scripts/05-pgvector-embeddings.sql)"
+            )
+        # hnsw.iterative_scan existe a partir do pgvector 0.8
+        self.iterative_scan = _version_tuple(version) >= (0, 8)
+        if not self.iterative_scan:
+            logger.warning(f"pgvector {version} sem iterative_scan: buscas filtradas podem trazer menos resultados")
+        self._ready = True
+
+    async def add_book_chunks(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> bool:
+        """Gravar os vetores nas linhas de book_chunks com esses qdrant_point_id
+
+        As linhas já precisam existir (gravadas antes dos vetores); todos os livros
+        que compartilham um ponto recebem o vetor.
+        """
+        if not (len(ids) == len(vectors) == len(payloads)):
+            raise ValueError("ids, vectors e payloads devem ter o mesmo tamanho")
+        try:
+            updated = await asyncio.to_thread(self._update_embeddings, ids, vectors)
+            if updated < len(ids):
+                logger.warning(f"{len(ids) - updated} vetores sem linha correspondente em {self.table}")
+            logger.info(f"{len(ids)} vetores gravados em {self.table}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao gravar {len(ids)} vetores no PostgreSQL: {e}")
+            return False
+
+    def _update_embeddings(self, ids: List[str], vectors: List[List[float]]) -> int:
+        """Quantos dos ids tinham linha em book_chunks"""
+        self._ensure_schema()
+        matched = set()
+        with engine.begin() as conn:
+            for start in range(0, len(ids), PGVECTOR_UPDATE_BATCH_SIZE):
+                result = conn.execute(text(f"""
+                    UPDATE {self.table} AS chunk
+                    SET embedding = CAST(data.embedding AS vector)
+                    FROM unnest(CAST(:ids AS uuid[]), CAST(:embeddings AS text[])) AS data(point_id, embedding)
+                    WHERE chunk.qdrant_point_id = data.point_id
+                    RETURNING chunk.qdrant_point_id
+                """), {
+                    "ids": [str(point_id) for point_id in ids[start:start + PGVECTOR_UPDATE_BATCH_SIZE]],
+                    "embeddings": [_vector_literal(vector) for vector in vectors[start:start + PGVECTOR_UPDATE_BATCH_SIZE]]
+                })
+                matched.update(str(row[0]) for row in result)
+        return len(matched)
+
+    async def search_similar_chunks(
+        self,
+        query_embedding: List[float],
+        book_ids: Optional[List[int]] = None,
+        limit: int = 5,
+        genre: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Chunks mais próximos (distância de cosseno), já com texto e título do livro"""
+        try:
+            return await asyncio.to_thread(self._search, query_embedding, book_ids, limit, genre, language)
+        except Exception as e:
+            logger.error(f"Erro ao buscar chunks similares no PostgreSQL: {e}")
+            return []
+
+    def _search(self, query_embedding, book_ids, limit, genre, language) -> List[Dict[str, Any]]:
+        self._ensure_schema()
+        params: Dict[str, Any] = {"query": _vector_literal(query_embedding), "limit": limit}
+        if book_ids:
+            params["book_ids"] = list(book_ids)
+        if genre:
+            params["genre"] = genre
+        if language:
+            params["language"] = language
+
+        def conditions(chunk: str, book: str) -> str:
+            clauses = [f"{chunk}.embedding IS NOT NULL"]
+            if book_ids:
+                clauses.append(f"{chunk}.book_id = ANY(:book_ids)")
+            if genre:
+                clauses.append(f"{book}.genre = :genre")
+            if language:
+                clauses.append(f"{book}.language = :language")
+            return " AND ".join(clauses)
+
+        # Livros com o mesmo conteúdo repetem o ponto: a busca considera só a linha
+        # de menor book_id de cada ponto (entre as que passam no filtro), então o
+        # LIMIT conta pontos distintos; os livros que o compartilham são agregados depois
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL hnsw.ef_search = {PGVECTOR_EF_SEARCH}"))
+            if self.iterative_scan:
+                # Com filtro, continuar a varredura do índice até achar `limit` linhas
+                conn.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+            rows = conn.execute(text(f"""
+                WITH hits AS (
+                    SELECT chunk.qdrant_point_id, chunk.chunk_text, chunk.chunk_index, chunk.page_number,
+                           chunk.embedding <=> CAST(:query AS vector) AS distance
+                    FROM {self.table} AS chunk
+                    JOIN books AS book ON book.id = chunk.book_id
+                    WHERE {conditions("chunk", "book")}
+                      AND NOT EXISTS (
+                          SELECT 1 FROM {self.table} AS other
+                          JOIN books AS other_book ON other_book.id = other.book_id
+                          WHERE other.qdrant_point_id = chunk.qdrant_point_id
+                            AND other.book_id < chunk.book_id
+                            AND {conditions("other", "other_book")}
+                      )
+                    ORDER BY chunk.embedding <=> CAST(:query AS vector)
+                    LIMIT :limit
+                )
+                SELECT hits.*, shared.book_ids, shared.titles
+                FROM hits
+                CROSS JOIN LATERAL (
+                    SELECT array_agg(chunk.book_id ORDER BY chunk.book_id) AS book_ids,
+                           array_agg(book.title ORDER BY chunk.book_id) AS titles
+                    FROM {self.table} AS chunk
+                    JOIN books AS book ON book.id = chunk.book_id
+                    WHERE chunk.qdrant_point_id = hits.qdrant_point_id
+                      AND {conditions("chunk", "book")}
+                ) AS shared
+                ORDER BY hits.distance
+            """), params).all()
+
+        return [
+            {
+                "id": str(row.qdrant_point_id),
+                "score": 1 - row.distance,
+                "text": row.chunk_text,
+                "book_id": row.book_ids[0],
+                "book_ids": list(row.book_ids),
+                "book_title": row.titles[0],
+                "chunk_index": row.chunk_index,
+                "page_number": row.page_number,
+            }
+            for row in rows
+        ]
+
+    async def set_content_book_ids(self, content_hash: str, book_ids: List[int]) -> bool:
+        """Copiar os vetores já gerados para as linhas dos livros que compartilham o conteúdo"""
+        try:
+            await asyncio.to_thread(self._copy_shared_embeddings, book_ids)
+            logger.info(f"Vetores do conteúdo {content_hash[:12]} copiados para os livros {book_ids}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao copiar vetores do conteúdo {content_hash[:12]}: {e}")
+            return False
+
+    def _copy_shared_embeddings(self, book_ids: List[int]):
+        self._ensure_schema()
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE {self.table} AS target
+                SET embedding = source.embedding
+                FROM {self.table} AS source
+                WHERE target.qdrant_point_id = source.qdrant_point_id
+                  AND target.book_id = ANY(:book_ids)
+                  AND target.embedding IS NULL
+                  AND source.embedding IS NOT NULL
+            """), {"book_ids": list(book_ids)})
+
+    async def delete_book_chunks(self, book_id: int) -> bool:
+        """Limpar os vetores de um livro (as linhas saem em cascata com o livro)"""
+        try:
+            await asyncio.to_thread(self._clear_embeddings, book_id)
+            logger.info(f"Vetores do livro {book_id} removidos do PostgreSQL")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao remover vetores do livro {book_id}: {e}")
+            return False
+
+    def _clear_embeddings(self, book_id: int):
+        self._ensure_schema()
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"UPDATE {self.table} SET embedding = NULL WHERE book_id = :book_id"),
+                {"book_id": book_id}
+            )
@@ -1,158 +1,669 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from qdrant_client.http.exceptions import UnexpectedResponse
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, MatchAny,
+    IsEmptyCondition, PayloadField, PayloadSchemaType, HnswConfigDiff, SearchParams,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    ProductQuantization, ProductQuantizationConfig, CompressionRatio
+)
+import asyncio
 import os
+import numpy as np
 import logging
 from typing import List, Dict, Any, Optional
 import uuid
 
+from .book_vector_index import (
+    BOOK_INDEX_MAX_BOOKS, book_vector_index, most_referenced_books, processed_book_ids, publish_invalidation
+)
+from .book_routing import (
+    QDRANT_ROUTING_TOP_BOOKS, route_contents, routing_centroids, routing_collection_name, routing_point_id
+)
+from .chunk_hydration import hydrate_chunks
+from .embedding_collections import cached_active_target
+from .embedding_providers import get_embedding_provider
+from .rate_limit import INTERACTIVE_LANE
+from .vector_store import VectorStore
+
 logger = logging.getLogger(__name__)
 
-class QdrantService:
-    def __init__(self):
-        self.client = None
-        self.collection_name = "library_books"
-        self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-        self._initialized = False
+# Configurações
+# Pontos por requisição de upsert e quantas requisições ficam em voo ao mesmo tempo
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "4"))
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+# Vetores em protobuf pela porta gRPC em vez de JSON pela REST (API e workers)
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+# Armazenamento das collections novas: "scalar" (int8, 4x menor), "product"
+# (QDRANT_PQ_COMPRESSION, ex.: x16) ou "none"; os quantizados ficam em RAM e os
+# vetores originais em disco, lidos só para reordenar os candidatos (rescore)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()
+QDRANT_PQ_COMPRESSION = os.getenv("QDRANT_PQ_COMPRESSION", "x16")
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "true").lower() == "true"
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# Busca: tamanho da lista de candidatos no HNSW e quantos candidatos a mais
+# (limit x oversampling) são reordenados com os vetores originais
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "128"))
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+QDRANT_SCROLL_BATCH_SIZE = int(os.getenv("QDRANT_SCROLL_BATCH_SIZE", "1024"))
+
+# Cliente assíncrono único do processo: todas as instâncias de QdrantService
+# compartilham o mesmo pool de conexões. Criado no startup da API e fechado no
+# shutdown; o worker Celery roda um event loop por task, então o cliente (preso
+# ao loop que o criou) é recriado quando o loop muda
+_async_client: Optional[AsyncQdrantClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_init_lock: Optional[asyncio.Lock] = None
+_ready_collections = set()
+
+# Livros sendo carregados para o índice em memória e as tasks que os carregam
+_loading_books = set()
+_load_tasks = set()
+
+def _bind_loop() -> asyncio.Lock:
+    global _async_client, _client_loop, _init_lock
+    loop = asyncio.get_running_loop()
+    if _client_loop is not loop:
+        _client_loop = loop
+        _async_client = None
+        _init_lock = asyncio.Lock()
+    return _init_lock
+
+def create_qdrant_client(url: str = QDRANT_URL, prefer_grpc: bool = QDRANT_PREFER_GRPC) -> QdrantClient:
+    """Cliente síncrono (workers Celery) no transporte configurado"""
+    return QdrantClient(url=url, prefer_grpc=prefer_grpc, grpc_port=QDRANT_GRPC_PORT, timeout=QDRANT_TIMEOUT)
+
+def create_async_qdrant_client(url: str = QDRANT_URL, prefer_grpc: bool = QDRANT_PREFER_GRPC) -> AsyncQdrantClient:
+    """Cliente assíncrono (API) no transporte configurado"""
+    return AsyncQdrantClient(url=url, prefer_grpc=prefer_grpc, grpc_port=QDRANT_GRPC_PORT, timeout=QDRANT_TIMEOUT)
+
+# Campos do payload usados em filtros; sem índice cada filtro varre a collection inteira
+PAYLOAD_INDEXES = {
+    "book_id": PayloadSchemaType.INTEGER,
+    "content_hash": PayloadSchemaType.KEYWORD,
+    "genre": PayloadSchemaType.KEYWORD,
+    "language": PayloadSchemaType.KEYWORD,
+}
+
+# O payload guarda só ids e campos de filtro; o texto vem do PostgreSQL (hydrate_chunks)
+SEARCH_PAYLOAD_FIELDS = ["book_id", "chunk_index", "page_number"]
+# Campos de payloads antigos que duplicavam dados do PostgreSQL
+LEGACY_PAYLOAD_FIELDS = ["text", "book_title", "chunk_size", "token_count"]
+
+def collection_config(
+    dimensions: int,
+    quantization: str = QDRANT_QUANTIZATION,
+    on_disk: bool = QDRANT_VECTORS_ON_DISK,
+    hnsw_m: int = QDRANT_HNSW_M,
+    hnsw_ef_construct: int = QDRANT_HNSW_EF_CONSTRUCT,
+    pq_compression: str = QDRANT_PQ_COMPRESSION
+) -> Dict[str, Any]:
+    """Parâmetros de create_collection: vetores, índice HNSW e quantização"""
+    if quantization == "scalar":
+        quantization_config = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif quantization == "product":
+        quantization_config = ProductQuantization(
+            product=ProductQuantizationConfig(compression=CompressionRatio(pq_compression), always_ram=True)
+        )
+    elif quantization == "none":
+        quantization_config = None
+    else:
+        raise ValueError(f"QDRANT_QUANTIZATION desconhecida: {quantization}")
+
+    return {
+        "vectors_config": VectorParams(size=dimensions, distance=Distance.COSINE, on_disk=on_disk),
+        "hnsw_config": HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct),
+        "quantization_config": quantization_config,
+    }
+
+def search_params(
+    hnsw_ef: int = QDRANT_SEARCH_HNSW_EF,
+    oversampling: float = QDRANT_SEARCH_OVERSAMPLING
+) -> SearchParams:
+    """Parâmetros de busca: candidatos do HNSW e rescore com os vetores originais"""
+    return SearchParams(
+        hnsw_ef=hnsw_ef,
+        quantization=QuantizationSearchParams(rescore=True, oversampling=oversampling)
+    )
+
+def book_payload_fields(book) -> Dict[str, Any]:
+    """Campos do livro copiados para o payload de cada ponto (filtros indexados)"""
+    return {"genre": book.genre, "language": book.language}
+
+def ensure_collection(client: QdrantClient, collection_name: str, dimensions: int):
+    """Criar a collection com a dimensão do provedor, ou conferir a dimensão da existente"""
+    if not client.collection_exists(collection_name):
+        client.create_collection(collection_name=collection_name, **collection_config(dimensions))
+        logger.info(f"Collection '{collection_name}' criada com sucesso ({dimensions} dimensões)")
+        indexed = {}
+    else:
+        info = client.get_collection(collection_name)
+        _check_vector_size(collection_name, info, dimensions)
+        indexed = info.payload_schema
+
+    for field_name, schema in _missing_payload_indexes(indexed):
+        client.create_payload_index(collection_name, field_name=field_name, field_schema=schema)
+        logger.info(f"Índice de payload '{field_name}' criado em '{collection_name}'")
+
+async def ensure_collection_async(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    dimensions: int,
+    config: Optional[Dict[str, Any]] = None
+):
+    """Mesmo que ensure_collection, com o cliente assíncrono (config substitui collection_config)"""
+    if not await client.collection_exists(collection_name):
+        await client.create_collection(collection_name=collection_name, **(config or collection_config(dimensions)))
+        logger.info(f"Collection '{collection_name}' criada com sucesso ({dimensions} dimensões)")
+        indexed = {}
+    else:
+        info = await client.get_collection(collection_name)
+        _check_vector_size(collection_name, info, dimensions)
+        indexed = info.payload_schema
+
+    for field_name, schema in _missing_payload_indexes(indexed):
+        await client.create_payload_index(collection_name, field_name=field_name, field_schema=schema)
+        logger.info(f"Índice de payload '{field_name}' criado em '{collection_name}'")
+
+def _missing_payload_indexes(indexed: Dict[str, Any]):
+    return [(name, schema) for name, schema in PAYLOAD_INDEXES.items() if name not in indexed]
+
+def _check_vector_size(collection_name: str, info, dimensions: int):
+    size = info.config.params.vectors.size
+    if size != dimensions:
+        raise ValueError(
+            f"Collection '{collection_name}' tem vetores de {size} dimensões, "
+            f"mas o provedor de embeddings gera {dimensions}"
+        )
+    logger.info(f"Collection '{collection_name}' já existe")
+
+class QdrantService(VectorStore):
+    """Operações na collection do provedor de embeddings, sem bloquear o event loop"""
+    
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        client: Optional[AsyncQdrantClient] = None,
+        vector_size: Optional[int] = None
+    ):
+        # Sem collection fixa, acompanha a collection ativa (trocada pelas migrações)
+        self._collection_name = collection_name
+        self._vector_size = vector_size
+        self.routing_top_books = QDRANT_ROUTING_TOP_BOOKS
+        self.qdrant_url = QDRANT_URL
+        # Cliente próprio (ex.: benchmarks com Qdrant em memória) em vez do compartilhado
+        self._own_client = client
+        self._own_client_ready = False
+    
+    @property
+    def collection_name(self) -> str:
+        return self._collection_name or cached_active_target().collection_name
+    
+    @property
+    def vector_size(self) -> int:
+        if self._vector_size:
+            return self._vector_size
+        target = cached_active_target()
+        if self._collection_name in (None, target.collection_name):
+            return target.dimensions
+        return get_embedding_provider(INTERACTIVE_LANE).dimensions
+    
+    @property
+    def routing_collection_name(self) -> str:
+        return routing_collection_name(self.collection_name)
+    
+    @property
+    def client(self) -> Optional[AsyncQdrantClient]:
+        return self._own_client or _async_client
+    
+    async def _connect(self) -> AsyncQdrantClient:
+        """Cliente compartilhado, criando-o e conferindo a collection na primeira vez"""
+        global _async_client
+        if self._own_client is not None:
+            if not self._own_client_ready:
+                await self._ensure_collections(self._own_client)
+                self._own_client_ready = True
+            return self._own_client
         
-    def _ensure_initialized(self):
-        """Garantir que o cliente está inicializado"""
-        if not self._initialized:
-            try:
-                self.client = QdrantClient(url=self.qdrant_url)
-                self._initialized = True
-                logger.info(f"Qdrant cliente inicializado: {self.qdrant_url}")
-                
-                # Verificar se a collection existe, se não, criar
-                try:
-                    collection_info = self.client.get_collection(self.collection_name)
-                    logger.info(f"Collection '{self.collection_name}' já existe")
-                except UnexpectedResponse:
-                    # Collection não existe, criar
-                    self.client.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=VectorParams(
-                            size=1536,  # Dimensão dos embeddings OpenAI text-embedding-ada-002
-                            distance=Distance.COSINE
-                        )
-                    )
-                    logger.info(f"Collection '{self.collection_name}' criada com sucesso")
-                    
-            except Exception as e:
-                logger.error(f"Erro ao inicializar Qdrant: {e}")
-                self.client = None
-                self._initialized = False
+        init_lock = _bind_loop()
+        if _async_client is not None and self.collection_name in _ready_collections:
+            return _async_client
+        
+        async with init_lock:
+            if _async_client is None:
+                _async_client = create_async_qdrant_client(self.qdrant_url)
+                transport = "gRPC" if QDRANT_PREFER_GRPC else "REST"
+                logger.info(f"Qdrant cliente inicializado: {self.qdrant_url} ({transport})")
+            
+            # Verificar se a collection existe, se não, criar
+            if self.collection_name not in _ready_collections:
+                await self._ensure_collections(_async_client)
+                _ready_collections.add(self.collection_name)
+        return _async_client
+    
+    async def _ensure_collections(self, client: AsyncQdrantClient):
+        """Collection dos chunks e, com o roteamento ligado, a dos centróides (pequena, em RAM)"""
+        await ensure_collection_async(client, self.collection_name, self.vector_size)
+        if self.routing_top_books > 0:
+            await ensure_collection_async(
+                client, self.routing_collection_name, self.vector_size,
+                config=collection_config(self.vector_size, quantization="none", on_disk=False)
+            )
+    
+    async def _get_client(self) -> Optional[AsyncQdrantClient]:
+        """Garantir que o cliente está inicializado (None se o Qdrant estiver indisponível)"""
+        try:
+            return await self._connect()
+        except Exception as e:
+            logger.error(f"Erro ao inicializar Qdrant: {e}")
+            return None
         
     async def initialize(self):
         """Inicializar conexão com Qdrant e criar collection se necessário"""
         try:
-            self.client = QdrantClient(url=self.qdrant_url)
-            
-            # Verificar se a collection existe, se não, criar
-            try:
-                collection_info = self.client.get_collection(self.collection_name)
-                logger.info(f"Collection '{self.collection_name}' já existe")
-            except UnexpectedResponse:
-                # Collection não existe, criar
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=1536,  # Dimensão dos embeddings OpenAI text-embedding-ada-002
-                        distance=Distance.COSINE
-                    )
-                )
-                logger.info(f"Collection '{self.collection_name}' criada com sucesso")
-                
+            await self._connect()
         except Exception as e:
             logger.error(f"Erro ao inicializar Qdrant: {e}")
             raise
     
-    async def add_book_chunk(self, chunk_id: str, text: str, embedding: List[float], metadata: Dict[str, Any]) -> bool:
-        """Adicionar chunk de livro ao Qdrant"""
+    async def close(self):
+        """Fechar o cliente compartilhado (shutdown da API, fim de cada task do worker)"""
+        global _async_client
+        if self._own_client is not None:
+            await self._own_client.close()
+            return
+        
+        async with _bind_loop():
+            if _async_client is not None:
+                await _async_client.close()
+                _async_client = None
+                _ready_collections.clear()
+                logger.info("Qdrant cliente encerrado")
+    
+    async def add_book_chunks(
+        self,
+        ids: List[str],
+        vectors: List[List[float]],
+        payloads: List[Dict[str, Any]],
+        batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+        parallel: int = QDRANT_UPSERT_PARALLEL
+    ) -> bool:
+        """Adicionar vários chunks ao Qdrant em lotes de batch_size pontos
+        
+        Os lotes são enviados em paralelo (até `parallel` por vez) com wait=False,
+        então o Qdrant só confirma o recebimento. O último lote vai depois de todos
+        com wait=True: as atualizações de uma collection são aplicadas em ordem,
+        e quando ele retorna todos os pontos já estão visíveis para busca.
+        """
+        if not (len(ids) == len(vectors) == len(payloads)):
+            raise ValueError("ids, vectors e payloads devem ter o mesmo tamanho")
+        if not ids:
+            return True
+        
         try:
             # Garantir que está inicializado
-            self._ensure_initialized()
+            client = await self._get_client()
             
-            if not self.client:
+            if not client:
                 logger.error("Cliente Qdrant não inicializado")
                 return False
-                
-            point = PointStruct(
-                id=chunk_id,
-                vector=embedding,
-                payload={
-                    "text": text,
-                    "book_id": metadata.get("book_id"),
-                    "book_title": metadata.get("book_title"),
-                    "chunk_index": metadata.get("chunk_index"),
-                    "page_number": metadata.get("page_number"),
-                }
-            )
             
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=[point]
-            )
+            batches = [
+                [
+                    PointStruct(id=point_id, vector=vector, payload=payload)
+                    for point_id, vector, payload in zip(
+                        ids[start:start + batch_size],
+                        vectors[start:start + batch_size],
+                        payloads[start:start + batch_size]
+                    )
+                ]
+                for start in range(0, len(ids), batch_size)
+            ]
+            slots = asyncio.Semaphore(max(1, parallel))
+            
+            async def upsert(points: List[PointStruct], wait: bool):
+                async with slots:
+                    await client.upsert(
+                        collection_name=self.collection_name,
+                        points=points,
+                        wait=wait
+                    )
             
-            logger.info(f"Chunk {chunk_id} adicionado ao Qdrant")
+            await asyncio.gather(*(upsert(points, wait=False) for points in batches[:-1]))
+            await upsert(batches[-1], wait=True)
+            
+            await publish_invalidation(self.collection_name, {
+                book_id
+                for payload in payloads
+                for book_id in (payload["book_id"] if isinstance(payload["book_id"], list) else [payload["book_id"]])
+            })
+            logger.info(f"{len(ids)} chunks adicionados ao Qdrant em {len(batches)} requisições")
             return True
             
         except Exception as e:
-            logger.error(f"Erro ao adicionar chunk ao Qdrant: {e}")
+            logger.error(f"Erro ao adicionar {len(ids)} chunks ao Qdrant: {e}")
             return False
     
-    async def search_similar_chunks(self, query_embedding: List[float], book_ids: Optional[List[int]] = None, limit: int = 5) -> List[Dict[str, Any]]:
-        """Buscar chunks similares baseado no embedding da query"""
+    async def search_similar_chunks(
+        self,
+        query_embedding: List[float],
+        book_ids: Optional[List[int]] = None,
+        limit: int = 5,
+        genre: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Buscar chunks similares baseado no embedding da query
+        
+        book_ids restringe a busca a chunks de qualquer um dos livros; genre e
+        language filtram pelos campos copiados do livro. Todos usam índices de payload.
+        Sem filtros, a busca passa antes pelos centróides dos livros e fica restrita
+        aos QDRANT_ROUTING_TOP_BOOKS livros mais próximos.
+        O Qdrant devolve só ids; texto e título vêm em uma consulta ao PostgreSQL.
+        Buscas em poucos livros já carregados no índice em memória não vão ao Qdrant;
+        os livros que faltarem são carregados em segundo plano.
+        """
         try:
+            if book_ids and not genre and not language and book_vector_index.enabled \
+                    and len(book_ids) <= BOOK_INDEX_MAX_BOOKS:
+                local = await asyncio.to_thread(self._search_book_index, query_embedding, list(book_ids), limit)
+                if local is not None:
+                    return local
+                self._schedule_book_loads(book_ids)
+            
             # Garantir que está inicializado
-            self._ensure_initialized()
+            client = await self._get_client()
             
-            if not self.client:
+            if not client:
                 logger.error("Cliente Qdrant não inicializado")
                 return []
             
-            # Criar filtro se book_ids foram especificados
-            query_filter = None
+            # Criar filtro se book_ids, genre ou language foram especificados
+            conditions = []
             if book_ids:
-                query_filter = Filter(
-                    must=[
-                        FieldCondition(
-                            key="book_id",
-                            match=MatchValue(value=book_id)
-                        ) for book_id in book_ids
-                    ]
-                )
+                conditions.append(FieldCondition(key="book_id", match=MatchAny(any=list(book_ids))))
+            if genre:
+                conditions.append(FieldCondition(key="genre", match=MatchValue(value=genre)))
+            if language:
+                conditions.append(FieldCondition(key="language", match=MatchValue(value=language)))
+            if not conditions and self.routing_top_books > 0:
+                # Primeira etapa: livros com centróides próximos; a busca de chunks fica restrita a eles
+                content_hashes = await self._route(client, query_embedding)
+                if content_hashes:
+                    # Pontos sem content_hash (livros sem hash, gravados antes do payload
+                    # tê-lo) não têm centróides: continuam sempre na busca
+                    conditions.append(Filter(should=[
+                        FieldCondition(key="content_hash", match=MatchAny(any=content_hashes)),
+                        IsEmptyCondition(is_empty=PayloadField(key="content_hash"))
+                    ]))
+            query_filter = Filter(must=conditions) if conditions else None
             
-            search_result = self.client.search(
+            search_result = await client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_embedding,
+                query=query_embedding,
                 query_filter=query_filter,
+                search_params=search_params(),
                 limit=limit,
-                with_payload=True
+                with_payload=SEARCH_PAYLOAD_FIELDS
             )
             
             results = []
-            for hit in search_result:
+            for hit in search_result.points:
+                # Pontos compartilhados por livros idênticos guardam uma lista de book_ids
+                hit_book_ids = hit.payload.get("book_id")
+                if not isinstance(hit_book_ids, list):
+                    hit_book_ids = [hit_book_ids]
+                if book_ids:
+                    hit_book_ids = [b for b in hit_book_ids if b in book_ids] or hit_book_ids
+                
                 results.append({
                     "id": hit.id,
                     "score": hit.score,
-                    "text": hit.payload.get("text"),
-                    "book_id": hit.payload.get("book_id"),
-                    "book_title": hit.payload.get("book_title"),
+                    "text": None,
+                    "book_id": hit_book_ids[0],
+                    "book_ids": hit_book_ids,
+                    "book_title": None,
                     "chunk_index": hit.payload.get("chunk_index"),
                     "page_number": hit.payload.get("page_number"),
                 })
             
-            return results
+            return await asyncio.to_thread(hydrate_chunks, results)
             
         except Exception as e:
             logger.error(f"Erro ao buscar chunks similares: {e}")
             return []
     
+    async def _route(self, client: AsyncQdrantClient, query_embedding: List[float]) -> Optional[List[str]]:
+        try:
+            return await route_contents(client, self.collection_name, query_embedding, self.routing_top_books)
+        except Exception as e:
+            logger.warning(f"Roteamento por centróides indisponível, usando busca plana: {e}")
+            return None
+    
+    async def refresh_content_routing(self, content_hash: str, book_ids: List[int]) -> bool:
+        """Recalcular os centróides de um conteúdo a partir dos seus vetores no Qdrant"""
+        if self.routing_top_books <= 0:
+            return True
+        try:
+            client = await self._get_client()
+            
+            if not client:
+                logger.error("Cliente Qdrant não inicializado")
+                return False
+            
+            content_filter = Filter(must=[FieldCondition(key="content_hash", match=MatchValue(value=content_hash))])
+            vectors, offset = [], None
+            while True:
+                points, offset = await client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=content_filter,
+                    limit=QDRANT_SCROLL_BATCH_SIZE,
+                    offset=offset,
+                    with_payload=False,
+                    with_vectors=True
+                )
+                vectors.extend(point.vector for point in points)
+                if offset is None:
+                    break
+            
+            await client.delete(
+                collection_name=self.routing_collection_name,
+                points_selector=content_filter
+            )
+            if not vectors:
+                return True
+            
+            centroids = await asyncio.to_thread(routing_centroids, np.asarray(vectors, dtype=np.float32))
+            await client.upsert(
+                collection_name=self.routing_collection_name,
+                points=[
+                    PointStruct(
+                        id=routing_point_id(content_hash, cluster),
+                        vector=centroid.tolist(),
+                        payload={"content_hash": content_hash, "book_id": book_ids}
+                    )
+                    for cluster, centroid in enumerate(centroids)
+                ],
+                wait=True
+            )
+            
+            logger.info(f"{len(centroids)} centróides do conteúdo {content_hash[:12]} ({len(vectors)} chunks)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao atualizar centróides do conteúdo {content_hash[:12]}: {e}")
+            return False
+    
+    async def needs_routing_backfill(self) -> bool:
+        """Existem chunks, mas a collection de centróides está vazia?"""
+        if self.routing_top_books <= 0:
+            return False
+        try:
+            client = await self._get_client()
+            
+            if not client:
+                return False
+            
+            chunks = await client.count(self.collection_name, exact=False)
+            centroids = await client.count(self.routing_collection_name, exact=True)
+            return chunks.count > 0 and centroids.count == 0
+            
+        except Exception as e:
+            logger.error(f"Erro ao verificar centróides: {e}")
+            return False
+    
+    def _search_book_index(self, query_embedding, book_ids: List[int], limit: int) -> Optional[List[Dict[str, Any]]]:
+        hits = book_vector_index.search(self.collection_name, query_embedding, book_ids, limit)
+        return None if hits is None else hydrate_chunks(hits)
+    
+    def _schedule_book_loads(self, book_ids: List[int]):
+        """Carregar em segundo plano os livros que não estão no índice em memória"""
+        missing = [
+            book_id for book_id in book_vector_index.missing(self.collection_name, book_ids)
+            if (self.collection_name, book_id) not in _loading_books
+        ]
+        if not missing:
+            return
+        _loading_books.update((self.collection_name, book_id) for book_id in missing)
+        task = asyncio.create_task(self._load_books(missing))
+        _load_tasks.add(task)
+        task.add_done_callback(_load_tasks.discard)
+    
+    async def _load_books(self, book_ids: List[int]):
+        try:
+            for book_id in await asyncio.to_thread(processed_book_ids, book_ids):
+                await self.load_book_vectors(book_id)
+        except Exception as e:
+            logger.warning(f"Erro ao carregar livros {book_ids} no índice em memória: {e}")
+        finally:
+            _loading_books.difference_update((self.collection_name, book_id) for book_id in book_ids)
+    
+    async def load_book_vectors(self, book_id: int) -> bool:
+        """Copiar do Qdrant os vetores de um livro processado para o índice em memória"""
+        client = await self._get_client()
+        if not client:
+            return False
+        
+        # Uma invalidação durante a leitura descarta o resultado (put confere o token)
+        token = book_vector_index.load_token(self.collection_name, book_id)
+        point_ids, vectors, chunk_indexes, page_numbers, point_book_ids, content_hashes = [], [], [], [], [], set()
+        offset = None
+        while True:
+            points, offset = await client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=book_id))]),
+                limit=QDRANT_SCROLL_BATCH_SIZE,
+                offset=offset,
+                with_payload=["book_id", "chunk_index", "page_number", "content_hash"],
+                with_vectors=True
+            )
+            for point in points:
+                hit_book_ids = point.payload.get("book_id")
+                point_ids.append(str(point.id))
+                vectors.append(point.vector)
+                chunk_indexes.append(point.payload.get("chunk_index"))
+                page_numbers.append(point.payload.get("page_number"))
+                point_book_ids.append(hit_book_ids if isinstance(hit_book_ids, list) else [hit_book_ids])
+                if point.payload.get("content_hash"):
+                    content_hashes.add(point.payload["content_hash"])
+            if offset is None:
+                break
+        
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.vector_size)
+        loaded = book_vector_index.put(
+            self.collection_name, book_id, point_ids, matrix,
+            chunk_indexes, page_numbers, point_book_ids, content_hashes, token=token
+        )
+        if loaded:
+            logger.info(f"Livro {book_id} carregado no índice em memória ({len(point_ids)} chunks)")
+        return loaded
+    
+    async def warm_book_index(self):
+        """Carregar os livros mais citados no chat (até o limite de memória do índice)"""
+        if not book_vector_index.enabled:
+            return
+        try:
+            book_ids = await asyncio.to_thread(most_referenced_books)
+            # Do menos para o mais citado: se a memória acabar, o LRU descarta os menos citados
+            for book_id in reversed(book_ids):
+                await self.load_book_vectors(book_id)
+            logger.info(f"Índice em memória aquecido: {book_vector_index.stats()}")
+        except Exception as e:
+            logger.warning(f"Não foi possível aquecer o índice em memória: {e}")
+    
+    async def set_content_book_ids(self, content_hash: str, book_ids: List[int]) -> bool:
+        """Atualizar a lista de livros dos pontos de um conteúdo (deduplicação por hash)"""
+        try:
+            client = await self._get_client()
+            
+            if not client:
+                logger.error("Cliente Qdrant não inicializado")
+                return False
+            
+            await client.set_payload(
+                collection_name=self.collection_name,
+                payload={"book_id": book_ids},
+                points=Filter(
+                    must=[
+                        FieldCondition(
+                            key="content_hash",
+                            match=MatchValue(value=content_hash)
+                        )
+                    ]
+                )
+            )
+            
+            if self.routing_top_books > 0:
+                await client.set_payload(
+                    collection_name=self.routing_collection_name,
+                    payload={"book_id": book_ids},
+                    points=Filter(must=[FieldCondition(key="content_hash", match=MatchValue(value=content_hash))])
+                )
+            
+            await publish_invalidation(self.collection_name, book_ids, content_hash=content_hash)
+            logger.info(f"Pontos do conteúdo {content_hash[:12]} associados aos livros {book_ids}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erro ao atualizar livros do conteúdo {content_hash[:12]}: {e}")
+            return False
+    
+    async def needs_payload_backfill(self) -> bool:
+        """Existem pontos sem genre/language ou ainda com o texto no payload?"""
+        try:
+            client = await self._get_client()
+            
+            if not client:
+                return False
+            
+            points, _ = await client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(should=[
+                    IsEmptyCondition(is_empty=PayloadField(key="language")),
+                    Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="text"))])
+                ]),
+                limit=1,
+                with_payload=False
+            )
+            return bool(points)
+            
+        except Exception as e:
+            logger.error(f"Erro ao verificar payloads antigos: {e}")
+            return False
+    
     async def delete_book_chunks(self, book_id: int) -> bool:
         """Deletar todos os chunks de um livro específico"""
         try:
-            self.client.delete(
+            client = await self._get_client()
+            
+            if not client:
+                logger.error("Cliente Qdrant não inicializado")
+                return False
+            
+            await client.delete(
                 collection_name=self.collection_name,
                 points_selector=Filter(
                     must=[
@@ -164,6 +675,13 @@ class QdrantService:
                 )
             )
             
+            if self.routing_top_books > 0:
+                await client.delete(
+                    collection_name=self.routing_collection_name,
+                    points_selector=Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=book_id))])
+                )
+            
+            await publish_invalidation(self.collection_name, [book_id])
             logger.info(f"Chunks do livro {book_id} deletados do Qdrant")
             return True
             
@@ -174,12 +692,19 @@ class QdrantService:
     async def get_collection_info(self) -> Dict[str, Any]:
         """Obter informações da collection"""
         try:
-            info = self.client.get_collection(self.collection_name)
+            client = await self._get_client()
+            
+            if not client:
+                logger.error("Cliente Qdrant não inicializado")
+                return {}
+            
+            info = await client.get_collection(self.collection_name)
             return {
                 "name": self.collection_name,
                 "points_count": info.points_count,
                 "status": info.status,
-                "vectors_count": info.vectors_count
+                "indexed_vectors_count": info.indexed_vectors_count,
+                "book_index": book_vector_index.stats()
             }
         except Exception as e:
             logger.error(f"Erro ao obter informações da collection: {e}")
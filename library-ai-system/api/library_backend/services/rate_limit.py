@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from .redis_client import REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# Orçamento global da conta OpenAI, compartilhado via Redis por API e workers
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", REDIS_URL)
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+CHAT_RPM_LIMIT = int(os.getenv("CHAT_RPM_LIMIT", "500"))
+CHAT_TPM_LIMIT = int(os.getenv("CHAT_TPM_LIMIT", "30000"))
+# Fração do balde que o lote (ingestão) não pode usar, reservada ao uso interativo
+RATE_LIMIT_INTERACTIVE_RESERVE = float(os.getenv("RATE_LIMIT_INTERACTIVE_RESERVE", "0.2"))
+# Espera máxima entre consultas ao balde (uma requisição interativa pode chegar no meio)
+RATE_LIMIT_MAX_POLL_SECONDS = 1.0
+# Após uma falha do Redis, segundos seguindo só com o controle local
+RATE_LIMIT_REDIS_RETRY_INTERVAL = 30
+
+# Filas de prioridade
+INTERACTIVE_LANE = "interactive"  # chat e embeddings de perguntas
+BULK_LANE = "bulk"                # ingestão e reprocessamento
+
+# Durações dos headers de rate limit da OpenAI: "20ms", "1s", "6m0s", "1h2m3.5s"
+RESET_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+RESET_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Converter um header x-ratelimit-reset-* em segundos"""
+    if not value:
+        return None
+    parts = RESET_DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * RESET_DURATION_UNITS[unit] for amount, unit in parts)
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Espera pedida por um 429 (retry-after-ms ou retry-after), se houver"""
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+class _Budget:
+    """Um limite (requisições ou tokens) como informado pelo último response"""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_seconds: Optional[float] = None
+        self.updated_at = 0.0
+
+    def update(self, limit: Optional[int], remaining: Optional[int], reset_seconds: Optional[float], now: float):
+        if remaining is None:
+            return
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_seconds = reset_seconds
+        self.updated_at = now
+
+    def delay_for(self, needed: int, now: float) -> float:
+        """Tempo até o limite repor `needed` unidades, assumindo reposição linear até o reset"""
+        if self.remaining is None or self.remaining >= needed:
+            return 0.0
+
+        elapsed = now - self.updated_at
+        if not self.reset_seconds:
+            return 0.0
+        if not self.limit or self.limit <= self.remaining:
+            return max(self.reset_seconds - elapsed, 0.0)
+
+        refill_rate = (self.limit - self.remaining) / self.reset_seconds
+        return max((needed - self.remaining) / refill_rate - elapsed, 0.0)
+
+    def consume(self, amount: int):
+        if self.remaining is not None:
+            self.remaining -= amount
+
+class RateLimitPacer:
+    """Espaça chamadas à API conforme os headers x-ratelimit-* dos responses
+
+    Em vez de pausas fixas, cada chamada espera apenas o necessário para que o
+    limite de requisições e de tokens comporte o próximo lote.
+    """
+
+    def __init__(self):
+        self.requests = _Budget()
+        self.tokens = _Budget()
+        self.blocked_until = 0.0
+
+    def update(self, headers: Mapping[str, str]):
+        """Registrar os limites informados no response"""
+        now = time.monotonic()
+        self.requests.update(
+            _header_int(headers, "x-ratelimit-limit-requests"),
+            _header_int(headers, "x-ratelimit-remaining-requests"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+            now
+        )
+        self.tokens.update(
+            _header_int(headers, "x-ratelimit-limit-tokens"),
+            _header_int(headers, "x-ratelimit-remaining-tokens"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+            now
+        )
+
+    def delay_for(self, tokens: int) -> float:
+        """Segundos a esperar antes de enviar uma requisição com `tokens` tokens"""
+        now = time.monotonic()
+        return max(
+            self.blocked_until - now,
+            self.requests.delay_for(1, now),
+            self.tokens.delay_for(tokens, now),
+            0.0
+        )
+
+    def reserve(self, tokens: int) -> float:
+        """Reservar o consumo de uma requisição e retornar quanto esperar antes de enviá-la
+
+        A reserva é imediata, então requisições concorrentes já enxergam o consumo
+        das anteriores ao calcular a própria espera.
+        """
+        delay = self.delay_for(tokens)
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        if delay > 0:
+            logger.info(f"Rate limit: aguardando {delay:.2f}s antes da próxima requisição")
+        return delay
+
+    def wait(self, tokens: int):
+        """Aguardar o limite comportar a requisição e reservar o seu consumo"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, tokens: int):
+        """Versão assíncrona de wait, para clientes com várias requisições em voo"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def backoff(self, headers: Optional[Mapping[str, str]], attempt: int) -> float:
+        """Bloquear novas requisições após um 429, respeitando retry-after quando presente"""
+        delay = None
+        if headers is not None:
+            self.update(headers)
+            delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = min(2 ** attempt, 60)
+
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+def iter_request_batches(
+    chunks: Iterable[Dict[str, Any]],
+    max_inputs: int,
+    max_tokens: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """Agrupar chunks em lotes de até max_inputs entradas e max_tokens tokens
+
+    Cada chunk precisa de "token_count"; um chunk sozinho acima de max_tokens
+    forma um lote próprio.
+    """
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+
+    for chunk in chunks:
+        if batch and (len(batch) >= max_inputs or batch_tokens + chunk["token_count"] > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(chunk)
+        batch_tokens += chunk["token_count"]
+
+    if batch:
+        yield batch
+
+# Balde de requisições e tokens reposto linearmente ao longo de um minuto. Retorna
+# 0 e consome o pedido, ou os milissegundos a esperar. Lotes não usam a reserva
+# interativa e esperam enquanto houver requisição interativa aguardando.
+# KEYS: balde, marca de espera interativa
+# ARGV: rpm, tpm, tokens, fila, fração reservada
+SHARED_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated', 'blocked_until')
+local elapsed = math.max(now - (tonumber(state[3]) or now), 0)
+local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60000)
+local tokens = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60000)
+local bulk = ARGV[4] == 'bulk'
+local floor_requests, floor_tokens = 0, 0
+if bulk then
+    floor_requests = rpm * tonumber(ARGV[5])
+    floor_tokens = tpm * tonumber(ARGV[5])
+end
+local needed = math.min(tonumber(ARGV[3]), tpm - floor_tokens)
+local wait = math.max((tonumber(state[4]) or 0) - now, 0)
+wait = math.max(wait, (1 + floor_requests - requests) * 60000 / rpm)
+wait = math.max(wait, (needed + floor_tokens - tokens) * 60000 / tpm)
+if bulk and redis.call('EXISTS', KEYS[2]) == 1 then
+    wait = math.max(wait, redis.call('PTTL', KEYS[2]))
+end
+if wait <= 0 then
+    requests = requests - 1
+    tokens = tokens - needed
+elseif not bulk then
+    redis.call('SET', KEYS[2], 1, 'PX', math.ceil(wait) + 250)
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return math.ceil(math.max(wait, 0))
+"""
+
+# Ajusta o balde ao que o provedor informou (nunca acima do estimado) e, após
+# um 429, bloqueia novas requisições por ARGV[5] ms
+# ARGV: rpm, tpm, requisições restantes, tokens restantes (-1 = desconhecido), bloqueio
+SHARED_OBSERVE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated', 'blocked_until')
+local elapsed = math.max(now - (tonumber(state[3]) or now), 0)
+local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60000)
+local tokens = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60000)
+local blocked_until = tonumber(state[4]) or 0
+if tonumber(ARGV[3]) >= 0 then requests = math.min(requests, tonumber(ARGV[3])) end
+if tonumber(ARGV[4]) >= 0 then tokens = math.min(tokens, tonumber(ARGV[4])) end
+if tonumber(ARGV[5]) > 0 then blocked_until = math.max(blocked_until, now + tonumber(ARGV[5])) end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now, 'blocked_until', blocked_until)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return 0
+"""
+
+class SharedRateLimiter:
+    """Token bucket de requisições/minuto e tokens/minuto compartilhado via Redis
+
+    Todos os processos (API e workers) que usam o mesmo `name` (o modelo)
+    consomem do mesmo balde. A fila interativa passa à frente da de lote, e o
+    balde é corrigido pelos headers x-ratelimit-* e pelos 429 do provedor. Se o
+    Redis estiver fora do ar, libera as chamadas e fica o controle local.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.bucket_key = f"rate-limit:{name}"
+        self.interactive_key = f"rate-limit:{name}:interactive-waiting"
+        self._down_until = 0.0
+
+    async def acquire(self, tokens: int, lane: str = BULK_LANE):
+        """Aguardar até o balde comportar uma requisição com `tokens` tokens"""
+        while True:
+            wait_ms = await self._run_script(
+                SHARED_ACQUIRE_SCRIPT,
+                [self.rpm, self.tpm, tokens, lane, RATE_LIMIT_INTERACTIVE_RESERVE]
+            )
+            if not wait_ms:
+                return
+            await asyncio.sleep(min(wait_ms / 1000, RATE_LIMIT_MAX_POLL_SECONDS))
+
+    async def observe(self, headers: Mapping[str, str]):
+        """Ajustar o balde ao restante informado pelo provedor"""
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is None and remaining_tokens is None:
+            return
+        await self._run_script(SHARED_OBSERVE_SCRIPT, [
+            self.rpm, self.tpm,
+            -1 if remaining_requests is None else remaining_requests,
+            -1 if remaining_tokens is None else remaining_tokens,
+            0
+        ])
+
+    async def penalize(self, delay: float):
+        """Após um 429, bloquear todos os processos pelo tempo indicado"""
+        await self._run_script(SHARED_OBSERVE_SCRIPT, [self.rpm, self.tpm, 0, 0, int(delay * 1000)])
+
+    async def _run_script(self, script: str, args: List[Any]) -> int:
+        if time.monotonic() < self._down_until:
+            return 0
+        try:
+            client = get_async_redis(RATE_LIMIT_REDIS_URL)
+            return int(await client.register_script(script)(
+                keys=[self.bucket_key, self.interactive_key], args=args
+            ))
+        except Exception as e:
+            logger.warning(f"Rate limit compartilhado indisponível, seguindo só com o controle local: {e}")
+            self._down_until = time.monotonic() + RATE_LIMIT_REDIS_RETRY_INTERVAL
+            return 0
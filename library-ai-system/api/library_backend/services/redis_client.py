@@ -0,0 +1,26 @@
+import asyncio
+import os
+import weakref
+from typing import Dict
+
+import redis.asyncio as redis
+
+# Configurações
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+
+# Conexões asyncio pertencem ao event loop que as criou; o worker Celery roda um
+# loop novo por task, então os clientes são mantidos por loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, redis.Redis]]" = weakref.WeakKeyDictionary()
+
+def get_async_redis(url: str = REDIS_URL, timeout: float = REDIS_SOCKET_TIMEOUT) -> redis.Redis:
+    """Cliente Redis assíncrono do event loop corrente, criado sob demanda"""
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(url)
+    if client is None:
+        client = clients[url] = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=timeout,
+            socket_timeout=timeout
+        )
+    return client
@@ -0,0 +1,87 @@
+import aiofiles
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from typing import Dict, Any
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MB por leitura
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(500 * 1024 * 1024)))  # 500 MB
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
+
+class UploadTooLargeError(Exception):
+    """Upload excedeu MAX_UPLOAD_SIZE"""
+    pass
+
+class StorageService:
+    def __init__(self):
+        self.upload_dir = UPLOAD_DIR
+        self.chunk_size = UPLOAD_CHUNK_SIZE
+        self.max_upload_size = MAX_UPLOAD_SIZE
+        # Limita quantos uploads são gravados/processados ao mesmo tempo
+        self.upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+    async def save_upload(self, file: UploadFile) -> Dict[str, Any]:
+        """Gravar upload em disco em blocos de tamanho fixo, calculando o SHA-256 durante a leitura
+
+        O arquivo nunca é mantido inteiro em memória: no máximo um bloco de
+        UPLOAD_CHUNK_SIZE bytes por upload. O nome final é o próprio hash do
+        conteúdo; se o mesmo PDF já existe em disco, o arquivo existente é reutilizado.
+        """
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+        file_extension = os.path.splitext(file.filename or "")[1].lower()
+        temp_path = os.path.join(self.upload_dir, f".{uuid.uuid4()}.part")
+
+        sha256 = hashlib.sha256()
+        file_size = 0
+
+        try:
+            async with aiofiles.open(temp_path, "wb") as out:
+                while True:
+                    block = await file.read(self.chunk_size)
+                    if not block:
+                        break
+
+                    file_size += len(block)
+                    if file_size > self.max_upload_size:
+                        raise UploadTooLargeError(
+                            f"Arquivo excede o limite de {self.max_upload_size} bytes"
+                        )
+
+                    sha256.update(block)
+                    await out.write(block)
+
+            content_hash = sha256.hexdigest()
+            final_path = os.path.join(self.upload_dir, f"{content_hash}{file_extension}")
+
+            already_stored = os.path.exists(final_path)
+            if already_stored:
+                os.unlink(temp_path)
+            else:
+                os.replace(temp_path, final_path)
+
+        except BaseException:
+            # Não deixar arquivos parciais no diretório de uploads
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        if already_stored:
+            logger.info(f"Upload idêntico a {final_path}, arquivo existente reutilizado")
+        else:
+            logger.info(f"Upload gravado em {final_path} ({file_size} bytes)")
+
+        return {
+            "file_path": final_path,
+            "file_size": file_size,
+            "sha256": content_hash,
+            "already_stored": already_stored
+        }
@@ -0,0 +1,168 @@
+import logging
+import os
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Configurações
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+# Limite de tokens por entrada aceito pelo modelo de embeddings
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+# Segmentos tokenizados por chamada de encode_batch e threads usadas pelo tiktoken
+TOKENIZER_BATCH_SIZE = int(os.getenv("TOKENIZER_BATCH_SIZE", "512"))
+TOKENIZER_THREADS = int(os.getenv("TOKENIZER_THREADS", str(os.cpu_count() or 1)))
+
+# Segmento = frase com a pontuação final, fragmento sem pontuação ou sequência de
+# quebras de linha. O espaço após a pontuação abre o segmento seguinte, como no
+# pré-tokenizador do tiktoken, então a soma dos tokens dos segmentos acompanha a
+# contagem do texto unido
+SEGMENT_PATTERN = re.compile(r"[^.!?\n]*[.!?]+|[^.!?\n]+|\n+")
+WORD_PATTERN = re.compile(r"\s*\S+|\s+")
+# Contagem sem tiktoken (provedor hashing): palavras e pontuação com o espaço
+# anterior, como no pré-tokenizador, e sequências de espaços
+APPROXIMATE_TOKEN_PATTERN = re.compile(r" ?\w+| ?[^\w\s]+|\s+")
+
+class ApproximateEncoding:
+    """Tokenizador por regex com a parte da interface do tiktoken usada pelo chunker
+
+    Para o provedor hashing, que não tem limite de tokens: evita baixar o
+    vocabulário do modelo da OpenAI (o tiktoken busca na rede na primeira carga).
+    """
+
+    def encode_ordinary(self, text: str) -> List[str]:
+        return APPROXIMATE_TOKEN_PATTERN.findall(text)
+
+    def encode_ordinary_batch(self, texts: List[str], num_threads: int = 1) -> List[List[str]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+class TextChunker:
+    """Chunker por tokens usado em toda a ingestão
+
+    O texto é dividido em segmentos (frases), tokenizados em lotes com
+    encode_batch em várias threads; os chunks são montados somando as contagens,
+    sem nunca tokenizar o livro inteiro de uma vez. Cada chunk respeita
+    max_tokens (e o limite de entrada do modelo) e traz o seu token_count,
+    contado no texto final do chunk (a soma dos segmentos é só uma estimativa:
+    a junção e o strip podem mudar a tokenização nas fronteiras).
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL, encoding: Optional[Any] = None):
+        self.encoding = encoding or tiktoken.encoding_for_model(model)
+        self.max_input_tokens = EMBEDDING_MAX_INPUT_TOKENS
+
+    def count_tokens(self, text: str) -> int:
+        """Contar tokens em um texto"""
+        return len(self.encoding.encode_ordinary(text))
+
+    def iter_chunks(
+        self,
+        pages: Iterable[Dict[str, Any]],
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap: int = CHUNK_OVERLAP_TOKENS
+    ) -> Iterator[Dict[str, Any]]:
+        """Criar chunks a partir de um fluxo de páginas
+
+        Cada chunk é um dict com "text", "page_number" (página onde começa) e
+        "token_count". Chunks consecutivos repetem até overlap tokens de frases
+        inteiras. Em memória ficam apenas o lote de segmentos em tokenização e
+        a janela do chunk corrente.
+        """
+        max_tokens = min(max_tokens, self.max_input_tokens)
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"overlap deve estar entre 0 e {max_tokens - 1}")
+
+        window: deque = deque()  # (texto, tokens, página) do chunk em montagem
+        window_tokens = 0
+
+        for segment in self._iter_counted_segments(pages, max_tokens):
+            segment_tokens = segment[1]
+
+            if window and window_tokens + segment_tokens > max_tokens:
+                chunk = self._build_chunk(window)
+                if chunk:
+                    yield chunk
+
+                # Manter as frases finais como overlap, abrindo espaço para o novo segmento
+                while window and (
+                    window_tokens > overlap
+                    or window_tokens + segment_tokens > max_tokens
+                    or window[0][0].isspace()
+                ):
+                    window_tokens -= window.popleft()[1]
+
+            if not window and segment[0].isspace():
+                continue  # chunks não começam com quebras de linha
+
+            window.append(segment)
+            window_tokens += segment_tokens
+
+        chunk = self._build_chunk(window)
+        if chunk:
+            yield chunk
+
+    def split_text(self, text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+        """Dividir um texto avulso em chunks por tokens"""
+        return [
+            chunk["text"]
+            for chunk in self.iter_chunks([{"page_number": 1, "text": text}], max_tokens, overlap)
+        ]
+
+    def _build_chunk(self, window: deque) -> Dict[str, Any]:
+        text = "".join(segment[0] for segment in window).strip()
+        if not text:
+            return {}
+        return {
+            "text": text,
+            "page_number": window[0][2],
+            "token_count": self.count_tokens(text)
+        }
+
+    def _iter_counted_segments(
+        self,
+        pages: Iterable[Dict[str, Any]],
+        max_tokens: int
+    ) -> Iterator[Tuple[str, int, Any]]:
+        """Segmentos (texto, tokens, página) com no máximo max_tokens tokens cada"""
+        batch: List[Tuple[str, Any]] = []
+
+        for page in pages:
+            page_text = page["text"] + "\n"
+            for match in SEGMENT_PATTERN.finditer(page_text):
+                batch.append((match.group(), page["page_number"]))
+                if len(batch) >= TOKENIZER_BATCH_SIZE:
+                    yield from self._count_batch(batch, max_tokens)
+                    batch = []
+
+        if batch:
+            yield from self._count_batch(batch, max_tokens)
+
+    def _count_batch(self, batch: List[Tuple[str, Any]], max_tokens: int) -> Iterator[Tuple[str, int, Any]]:
+        token_lists = self.encoding.encode_ordinary_batch(
+            [text for text, _ in batch], num_threads=TOKENIZER_THREADS
+        )
+        for (text, page_number), tokens in zip(batch, token_lists):
+            if len(tokens) <= max_tokens:
+                yield text, len(tokens), page_number
+            else:
+                yield from self._split_long_segment(text, page_number, max_tokens)
+
+    def _split_long_segment(self, text: str, page_number: Any, max_tokens: int) -> Iterator[Tuple[str, int, Any]]:
+        """Frase maior que max_tokens: dividir por palavras e, em último caso, por tokens"""
+        words = WORD_PATTERN.findall(text)
+        token_lists = self.encoding.encode_ordinary_batch(words, num_threads=TOKENIZER_THREADS)
+        for word, tokens in zip(words, token_lists):
+            if len(tokens) <= max_tokens:
+                yield word, len(tokens), page_number
+                continue
+            for start in range(0, len(tokens), max_tokens):
+                piece = tokens[start:start + max_tokens]
+                yield self.encoding.decode(piece), len(piece), page_number
@@ -0,0 +1,55 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+# Configurações
+# "qdrant" (collection por provedor) ou "pgvector" (coluna embedding em book_chunks)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant").lower()
+
+class VectorStore(ABC):
+    """Armazenamento e busca dos vetores dos chunks
+
+    Os pontos são identificados pelo qdrant_point_id de book_chunks e carregam
+    book_id (lista quando o conteúdo é compartilhado), content_hash, chunk_index,
+    page_number, genre e language. As linhas de book_chunks são gravadas antes
+    dos vetores. Os resultados de busca vêm com text e book_title preenchidos.
+    """
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def add_book_chunks(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]) -> bool:
+        """Gravar os vetores dos chunks (ids = qdrant_point_id)"""
+
+    @abstractmethod
+    async def search_similar_chunks(
+        self,
+        query_embedding: List[float],
+        book_ids: Optional[List[int]] = None,
+        limit: int = 5,
+        genre: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Chunks mais próximos da query, opcionalmente de qualquer um dos book_ids"""
+
+    @abstractmethod
+    async def set_content_book_ids(self, content_hash: str, book_ids: List[int]) -> bool:
+        """Associar os vetores de um conteúdo a todos os livros que o compartilham"""
+
+    @abstractmethod
+    async def delete_book_chunks(self, book_id: int) -> bool:
+        """Remover os vetores de um livro"""
+
+def get_vector_store(collection_name: Optional[str] = None, vector_size: Optional[int] = None) -> VectorStore:
+    """Armazenamento configurado em VECTOR_STORE (sem collection, a ativa no Qdrant)"""
+    if VECTOR_STORE == "qdrant":
+        from .qdrant_service import QdrantService
+        return QdrantService(collection_name, vector_size=vector_size)
+    if VECTOR_STORE == "pgvector":
+        from .pgvector_store import PgVectorStore
+        return PgVectorStore(dimensions=vector_size)
+    raise ValueError(f"VECTOR_STORE desconhecido: {VECTOR_STORE}")
@@ -0,0 +1,453 @@
+from library_backend.celery_app import celery_app
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+import logging
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue, PointIdsList
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from library_backend.services.embedding_cache import embedding_cache
+from library_backend.services.embedding_collections import (
+    EMBEDDING_COLLECTION_REFRESH, EmbeddingTarget, activate_record, active_target, configured_target, ensure_collections_table,
+    provider_model, record_target, swap_alias, versioned_collection_name
+)
+from library_backend.services.embedding_pipeline import EmbeddingPipeline
+from library_backend.services.embedding_providers import (
+    EMBEDDING_PROVIDER, EmbeddingProvider, create_embedding_provider, get_text_chunker
+)
+from library_backend.services.qdrant_service import QDRANT_SCROLL_BATCH_SIZE, QdrantService, book_payload_fields, search_params
+from library_backend.services.rate_limit import BULK_LANE
+from library_backend.services.vector_store import VECTOR_STORE
+from library_backend.database import SessionLocal
+from library_backend.models import Book, BookChunk, EmbeddingCollection
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configurações
+# Conferência antes da troca: chunks sorteados precisam achar o próprio ponto no top 5
+REEMBED_VERIFY_SAMPLES = int(os.getenv("REEMBED_VERIFY_SAMPLES", "50"))
+REEMBED_VERIFY_MIN_RECALL = float(os.getenv("REEMBED_VERIFY_MIN_RECALL", "0.9"))
+# A biblioteca inteira passa pelo provedor: limite bem acima do padrão das tasks
+REEMBED_TIME_LIMIT = int(os.getenv("REEMBED_TIME_LIMIT", str(6 * 60 * 60)))
+# Folga (s) após EMBEDDING_COLLECTION_REFRESH antes da última passada de catch-up
+REEMBED_CATCH_UP_MARGIN = float(os.getenv("REEMBED_CATCH_UP_MARGIN", "5"))
+# Reconciliação: pontos lidos (e candidatos conferidos no banco) por lote
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", str(QDRANT_SCROLL_BATCH_SIZE)))
+RECONCILE_TIME_LIMIT = int(os.getenv("RECONCILE_TIME_LIMIT", str(2 * 60 * 60)))
+
+@dataclass
+class ContentUnit:
+    """Livros com o mesmo conteúdo (content_hash) compartilham os pontos; source tem as linhas"""
+    content_hash: Optional[str]
+    book_ids: List[int]
+    source: Book
+
+    @property
+    def points_filter(self) -> Filter:
+        if self.content_hash:
+            return Filter(must=[FieldCondition(key="content_hash", match=MatchValue(value=self.content_hash))])
+        return Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=self.source.id))])
+
+@celery_app.task(bind=True, time_limit=REEMBED_TIME_LIMIT, soft_time_limit=REEMBED_TIME_LIMIT - 300)
+def reembed_collection(
+    self,
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    dimensions: Optional[int] = None,
+    activate: bool = True
+):
+    """
+    Task para gerar os vetores de todos os livros em uma collection nova
+
+    Os textos vêm de book_chunks (cada ponto mantém o seu qdrant_point_id) e passam
+    pelo cache de embeddings. A collection é registrada em embedding_collections
+    com modelo e dimensão; depois de conferida, é marcada como ativa ali e o alias
+    QDRANT_COLLECTION_ALIAS (para leitores externos) passa para ela. API e workers
+    relêem a collection ativa a cada EMBEDDING_COLLECTION_REFRESH segundos e passam
+    a usá-la, com o novo modelo, sem interromper as buscas. Livros gravados na
+    collection antiga durante a migração são completados logo após a troca e de
+    novo depois dessa janela; o processamento que termina após a troca se repete
+    na nova collection.
+    """
+    if VECTOR_STORE != "qdrant":
+        return {'status': 'skipped', 'vector_store': VECTOR_STORE}
+
+    ensure_collections_table()
+    db = SessionLocal()
+    record = None
+    try:
+        provider_name = provider or EMBEDDING_PROVIDER
+        embedding_provider = create_embedding_provider(provider_name, model, dimensions, BULK_LANE)
+        target = EmbeddingTarget(
+            versioned_collection_name(embedding_provider), provider_name,
+            provider_model(embedding_provider), embedding_provider.dimensions
+        )
+        _register_current_collection(db)
+
+        record = EmbeddingCollection(
+            name=target.collection_name, provider=target.provider, model=target.model,
+            dimensions=target.dimensions, status="building"
+        )
+        db.add(record)
+        db.commit()
+        logger.info(f"Migração de embeddings para '{target.collection_name}' ({target.model}, {target.dimensions} dimensões)")
+
+        return asyncio.run(_build_and_activate(self, db, record, embedding_provider, activate))
+
+    except Exception as e:
+        logger.error(f"Erro na migração de embeddings: {str(e)}")
+        if record is not None:
+            db.rollback()
+            record.status = "failed"
+            record.error = str(e)
+            db.commit()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task(bind=True, time_limit=REEMBED_TIME_LIMIT, soft_time_limit=REEMBED_TIME_LIMIT - 300)
+def activate_embedding_collection(self, collection_name: str):
+    """
+    Task para ativar uma collection já registrada (ex.: voltar para a anterior)
+
+    Completa os livros que faltam na collection, confere e troca o alias.
+    """
+    if VECTOR_STORE != "qdrant":
+        return {'status': 'skipped', 'vector_store': VECTOR_STORE}
+
+    ensure_collections_table()
+    db = SessionLocal()
+    try:
+        record = db.query(EmbeddingCollection).filter(EmbeddingCollection.name == collection_name).first()
+        if record is None:
+            raise ValueError(f"Collection '{collection_name}' não registrada em embedding_collections")
+        if record.status == "active":
+            return {'status': 'unchanged', 'collection': collection_name}
+
+        provider = record_target(record).create_provider(BULK_LANE)
+        return asyncio.run(_build_and_activate(self, db, record, provider, activate=True))
+
+    except Exception as e:
+        logger.error(f"Erro ao ativar a collection {collection_name}: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+def _register_current_collection(db: Session):
+    """Registrar a collection em uso antes da primeira migração (para poder voltar a ela)"""
+    if db.query(EmbeddingCollection).filter(EmbeddingCollection.status == "active").first():
+        return
+    current = configured_target()
+    if db.query(EmbeddingCollection).filter(EmbeddingCollection.name == current.collection_name).first():
+        return
+    db.add(EmbeddingCollection(
+        name=current.collection_name, provider=current.provider, model=current.model,
+        dimensions=current.dimensions, status="active", activated_at=datetime.utcnow()
+    ))
+    db.commit()
+
+async def _build_and_activate(task, db: Session, record: EmbeddingCollection, provider: EmbeddingProvider, activate: bool) -> Dict:
+    store = QdrantService(record.name, vector_size=provider.dimensions)
+
+    def progress(done: int, total: int):
+        task.update_state(
+            state='PROGRESS',
+            meta={'current': done, 'total': total, 'status': f"Gerando vetores em '{record.name}': {done}/{total} livros"}
+        )
+
+    try:
+        await store.initialize()
+        stats = await sync_collection(db, store, provider, progress)
+        record.points_count = await verify_collection(db, store, provider, stats["expected_points"])
+        record.status = "ready"
+        db.commit()
+
+        result = {
+            'status': 'ready',
+            'collection': record.name,
+            'model': record.model,
+            'dimensions': record.dimensions,
+            'points': record.points_count,
+            **stats
+        }
+        if not activate:
+            return result
+
+        await swap_alias(store.client, record.name)
+        activate_record(db, record)
+        logger.info(f"Collection '{record.name}' ativa")
+
+        # Livros processados na collection anterior enquanto esta era gerada
+        catch_up = await sync_collection(db, store, provider)
+        # API e workers só percebem a troca ao reler embedding_collections (até
+        # EMBEDDING_COLLECTION_REFRESH segundos): nova passada depois dessa janela
+        await asyncio.sleep(EMBEDDING_COLLECTION_REFRESH + REEMBED_CATCH_UP_MARGIN)
+        final = await sync_collection(db, store, provider)
+        return {
+            **result,
+            'status': 'active',
+            'caught_up_contents': catch_up["contents_embedded"] + final["contents_embedded"]
+        }
+    finally:
+        await store.close()
+        await provider.close()
+
+def _content_units(db: Session) -> List[ContentUnit]:
+    units: Dict[str, ContentUnit] = {}
+    for book in db.query(Book).filter(Book.chunks.any()).order_by(Book.id).all():
+        key = book.content_hash or f"book:{book.id}"
+        unit = units.setdefault(key, ContentUnit(book.content_hash, [], book))
+        unit.book_ids.append(book.id)
+    return list(units.values())
+
+async def sync_collection(
+    db: Session,
+    store: QdrantService,
+    provider: EmbeddingProvider,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, int]:
+    """Deixar a collection com os pontos de todos os livros de book_chunks
+
+    Conteúdos com a quantidade certa de pontos só têm a lista de livros
+    atualizada; os demais são regerados do zero. Pontos de livros que não
+    existem mais são removidos.
+    """
+    client = store.client
+    pipeline = EmbeddingPipeline(provider, store)
+    text_chunker = get_text_chunker(provider)
+    units = _content_units(db)
+    expected_points = contents_embedded = chunks_embedded = 0
+
+    for position, unit in enumerate(units, start=1):
+        expected = db.query(func.count(BookChunk.id)).filter(BookChunk.book_id == unit.source.id).scalar()
+        expected_points += expected
+        stored = (await client.count(store.collection_name, count_filter=unit.points_filter, exact=True)).count
+
+        if stored == expected:
+            if unit.content_hash:
+                await store.set_content_book_ids(unit.content_hash, unit.book_ids)
+        else:
+            if stored:
+                await client.delete(collection_name=store.collection_name, points_selector=unit.points_filter)
+            rows = db.query(BookChunk).filter(BookChunk.book_id == unit.source.id).order_by(BookChunk.chunk_index).all()
+            chunks = (
+                {
+                    "text": row.chunk_text,
+                    "chunk_index": row.chunk_index,
+                    "page_number": row.page_number,
+                    "token_count": text_chunker.count_tokens(row.chunk_text),
+                    "point_id": str(row.qdrant_point_id),
+                }
+                for row in rows
+            )
+            chunks_embedded += await pipeline.run(
+                chunks, unit.content_hash, unit.book_ids, book_payload=book_payload_fields(unit.source)
+            )
+            if unit.content_hash:
+                await store.refresh_content_routing(unit.content_hash, unit.book_ids)
+            contents_embedded += 1
+
+        if on_progress:
+            on_progress(position, len(units))
+
+    # Livros removidos durante a migração (a remoção só alcança a collection ativa)
+    content_hashes = [unit.content_hash for unit in units if unit.content_hash]
+    known = [FieldCondition(key="book_id", match=MatchAny(any=[book_id for unit in units for book_id in unit.book_ids]))]
+    if content_hashes:
+        known.append(FieldCondition(key="content_hash", match=MatchAny(any=content_hashes)))
+    if units:
+        await client.delete(collection_name=store.collection_name, points_selector=Filter(must_not=known))
+
+    return {
+        'contents': len(units),
+        'contents_embedded': contents_embedded,
+        'chunks_embedded': chunks_embedded,
+        'expected_points': expected_points
+    }
+
+async def verify_collection(db: Session, store: QdrantService, provider: EmbeddingProvider, expected_points: int) -> int:
+    """Conferir a quantidade de pontos e se chunks sorteados encontram o próprio ponto"""
+    client = store.client
+    points = (await client.count(store.collection_name, exact=True)).count
+    if points < expected_points:
+        raise RuntimeError(f"'{store.collection_name}' tem {points} pontos, esperados {expected_points}")
+
+    sample = db.query(BookChunk.chunk_text, BookChunk.qdrant_point_id).order_by(func.random()).limit(REEMBED_VERIFY_SAMPLES).all()
+    if sample:
+        vectors = await embedding_cache.get_or_create_many(provider.name, [row.chunk_text for row in sample], provider.embed)
+        found = 0
+        for row, vector in zip(sample, vectors):
+            result = await client.query_points(
+                collection_name=store.collection_name, query=vector,
+                search_params=search_params(), limit=5, with_payload=False
+            )
+            found += any(str(point.id) == str(row.qdrant_point_id) for point in result.points)
+        recall = found / len(sample)
+        if recall < REEMBED_VERIFY_MIN_RECALL:
+            raise RuntimeError(
+                f"Só {recall:.0%} dos chunks sorteados se encontraram em '{store.collection_name}' "
+                f"(mínimo {REEMBED_VERIFY_MIN_RECALL:.0%})"
+            )
+        logger.info(f"'{store.collection_name}' conferida: {points} pontos, {recall:.0%} dos chunks sorteados encontrados")
+    return points
+
+@celery_app.task(bind=True, time_limit=RECONCILE_TIME_LIMIT, soft_time_limit=RECONCILE_TIME_LIMIT - 300)
+def reconcile_vector_orphans(self, collection_name: Optional[str] = None):
+    """
+    Task periódica para remover da collection os pontos sem linha em book_chunks
+
+    Livros removidos sem a limpeza (fila indisponível, falhas) e chunks que
+    sumiram em um reprocessamento deixam pontos órfãos. Os IDs do Qdrant (scroll,
+    que devolve os pontos em ordem de ID) e os qdrant_point_id de book_chunks
+    (cursor no servidor, na mesma ordem) são comparados como duas listas
+    ordenadas, com memória limitada a um lote de cada lado. Antes de remover, os
+    candidatos são conferidos em uma consulta nova: as linhas são gravadas antes
+    dos vetores, então um ponto gravado durante a leitura já tem a sua.
+    Centróides de conteúdos sem livros também são removidos.
+    """
+    if VECTOR_STORE != "qdrant":
+        # No pgvector os vetores ficam nas próprias linhas de book_chunks
+        return {'status': 'skipped', 'vector_store': VECTOR_STORE}
+
+    db = SessionLocal()
+    try:
+        collection_name = collection_name or active_target(db).collection_name
+        result = asyncio.run(_reconcile_collection(db, QdrantService(collection_name)))
+        logger.info(
+            f"Reconciliação de '{collection_name}': {result['orphan_points_deleted']} pontos órfãos "
+            f"de {result['points_scanned']} removidos (~{result['reclaimed_mb']} MB de vetores), "
+            f"{result['orphan_centroids_deleted']} centróides, em {result['seconds']} s"
+        )
+        return {'status': 'completed', 'collection': collection_name, **result}
+
+    except Exception as e:
+        logger.error(f"Erro na reconciliação dos vetores: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+async def _reconcile_collection(db: Session, store: QdrantService) -> Dict:
+    started = time.perf_counter()
+    try:
+        await store.initialize()
+        client = store.client
+        points_before = (await client.get_collection(store.collection_name)).points_count
+        scanned, deleted = await delete_orphan_points(db, client, store.collection_name)
+        centroids = 0
+        if await client.collection_exists(store.routing_collection_name):
+            centroids = await delete_orphan_centroids(db, client, store.routing_collection_name)
+        return {
+            'points_before': points_before,
+            'points_scanned': scanned,
+            'orphan_points_deleted': deleted,
+            'orphan_centroids_deleted': centroids,
+            # Estimativa: vetores float32 originais (sem a cópia quantizada e o HNSW)
+            'reclaimed_mb': round(deleted * store.vector_size * 4 / 1024 / 1024, 2),
+            'seconds': round(time.perf_counter() - started, 1)
+        }
+    finally:
+        await store.close()
+
+def _stored_point_ids(db: Session) -> Iterator[uuid.UUID]:
+    """qdrant_point_id de book_chunks em ordem, lidos em lotes por um cursor no servidor"""
+    query = db.query(BookChunk.qdrant_point_id).order_by(BookChunk.qdrant_point_id).yield_per(RECONCILE_BATCH_SIZE)
+    for row in query:
+        yield row.qdrant_point_id
+
+async def delete_orphan_points(db: Session, client: AsyncQdrantClient, collection_name: str) -> Tuple[int, int]:
+    """Comparar os pontos da collection com book_chunks e remover os órfãos
+
+    Merge de duas sequências ordenadas por ID (UUIDs comparam como inteiros de
+    128 bits nos dois lados). Retorna (pontos lidos, pontos removidos).
+    """
+    stored = _stored_point_ids(db)
+    current = next(stored, None)
+    previous = None
+    scanned = deleted = 0
+    candidates: List[Union[int, str]] = []
+    offset = None
+
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection_name,
+            limit=RECONCILE_BATCH_SIZE,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        for point in points:
+            scanned += 1
+            if isinstance(point.id, int):
+                # IDs numéricos não vêm de book_chunks (todos são UUID)
+                candidates.append(point.id)
+                continue
+            point_id = uuid.UUID(str(point.id))
+            if previous is not None and point_id <= previous:
+                raise RuntimeError(f"Scroll de '{collection_name}' fora da ordem de ID; reconciliação interrompida")
+            previous = point_id
+            while current is not None and current < point_id:
+                current = next(stored, None)
+            if current != point_id:
+                candidates.append(point.id)
+
+        if candidates and (len(candidates) >= RECONCILE_BATCH_SIZE or offset is None):
+            deleted += await _delete_confirmed_orphans(client, collection_name, candidates)
+            candidates = []
+        if offset is None:
+            return scanned, deleted
+
+async def _delete_confirmed_orphans(client: AsyncQdrantClient, collection_name: str, candidates: List[Union[int, str]]) -> int:
+    """Conferir os candidatos em uma consulta nova e remover os que seguem sem linha"""
+    point_ids = [uuid.UUID(str(point_id)) for point_id in candidates if not isinstance(point_id, int)]
+    # Outra sessão: a conexão da primeira está presa ao cursor da leitura em ordem
+    check = SessionLocal()
+    try:
+        found = {
+            row.qdrant_point_id for row in check.query(BookChunk.qdrant_point_id).filter(
+                BookChunk.qdrant_point_id.in_(point_ids)
+            ).all()
+        } if point_ids else set()
+    finally:
+        check.close()
+
+    orphans = [
+        point_id for point_id in candidates
+        if isinstance(point_id, int) or uuid.UUID(str(point_id)) not in found
+    ]
+    if orphans:
+        await client.delete(collection_name=collection_name, points_selector=PointIdsList(points=orphans), wait=True)
+        logger.info(f"{len(orphans)} pontos órfãos removidos de '{collection_name}'")
+    return len(orphans)
+
+async def delete_orphan_centroids(db: Session, client: AsyncQdrantClient, routing_collection: str) -> int:
+    """Remover os centróides de conteúdos que nenhum livro tem mais"""
+    deleted = 0
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=routing_collection,
+            limit=RECONCILE_BATCH_SIZE,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False
+        )
+        content_hashes = {point.payload.get("content_hash") for point in points} - {None}
+        live = {
+            row.content_hash for row in db.query(Book.content_hash).filter(
+                Book.content_hash.in_(content_hashes)
+            ).distinct().all()
+        } if content_hashes else set()
+        dead = list(content_hashes - live)
+        if dead:
+            dead_filter = Filter(must=[FieldCondition(key="content_hash", match=MatchAny(any=dead))])
+            deleted += (await client.count(routing_collection, count_filter=dead_filter, exact=True)).count
+            await client.delete(collection_name=routing_collection, points_selector=dead_filter, wait=True)
+        if offset is None:
+            return deleted
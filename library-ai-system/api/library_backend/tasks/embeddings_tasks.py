@@ -1,134 +1,157 @@
 from celery import current_task
+from celery.exceptions import Retry
 from library_backend.celery_app import celery_app
-from openai import OpenAI
+import asyncio
 import os
-import time
-from typing import List, Dict
+from typing import List, Dict, Optional
 import logging
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import FieldCondition, Filter, MatchValue
 import uuid
+from library_backend.services.chunk_store import ChunkStore
+from library_backend.services.embedding_pipeline import EmbeddingPipeline
+from library_backend.services.embedding_collections import active_target, reset_active_target
+from library_backend.services.embedding_providers import EmbeddingProvider, get_text_chunker
+from library_backend.services.pdf_service import PDFService
+from library_backend.services.qdrant_service import (
+    LEGACY_PAYLOAD_FIELDS, QdrantService, book_payload_fields, create_qdrant_client
+)
+from library_backend.services.vector_store import VECTOR_STORE, VectorStore, get_vector_store
+from library_backend.services.rate_limit import BULK_LANE, INTERACTIVE_LANE
+from library_backend.database import SessionLocal
+from library_backend.models import Book, BookChunk
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configurações
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-QDRANT_HOST = os.getenv("QDRANT_HOST", "library-qdrant")
-QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+# Tentativas da limpeza de um livro removido (o reconciliador cobre o que sobrar)
+CLEANUP_MAX_RETRIES = int(os.getenv("CLEANUP_MAX_RETRIES", "5"))
+CLEANUP_RETRY_DELAY = int(os.getenv("CLEANUP_RETRY_DELAY", "60"))
+# Novas tentativas de um livro que terminou com chunks sem vetor
+EMBEDDING_TASK_MAX_RETRIES = int(os.getenv("EMBEDDING_TASK_MAX_RETRIES", "3"))
+EMBEDDING_TASK_RETRY_DELAY = int(os.getenv("EMBEDDING_TASK_RETRY_DELAY", "60"))
 
-# Inicializar cliente OpenAI
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+chunk_store = ChunkStore()
+pdf_service = PDFService()
 
-@celery_app.task(bind=True)
-def process_pdf_embeddings(self, book_id: int, text_chunks: List[str], collection_name: str = "library_books"):
+@celery_app.task(bind=True, max_retries=EMBEDDING_TASK_MAX_RETRIES, default_retry_delay=EMBEDDING_TASK_RETRY_DELAY)
+def process_pdf_embeddings(self, book_id: int, content_hash: str, collection_name: Optional[str] = None, chunks_count: Optional[int] = None):
     """
     Task para processar embeddings de um PDF de forma assíncrona
+
+    Recebe apenas a referência (content_hash) aos chunks gravados no ChunkStore,
+    mantendo a mensagem no broker com tamanho constante. Os chunks são lidos
+    do disco em lotes, sem carregar o livro inteiro em memória. Os vetores vêm
+    do provedor da collection ativa (EMBEDDING_PROVIDER até a primeira migração)
+    e vão para o VECTOR_STORE configurado (no Qdrant, na collection ativa).
     """
+    db = SessionLocal()
+    # Collection ativa e o provedor dos seus vetores (a migração pode tê-los trocado)
+    target = active_target(db)
+    provider = target.create_provider(BULK_LANE)
+    follows_active = collection_name is None
+    collection_name = collection_name or target.collection_name
+    store = get_vector_store(collection_name, vector_size=provider.dimensions)
     try:
         logger.info(f"Iniciando processamento de embeddings para livro {book_id}")
         
-        # Verificar se temos OpenAI API Key
-        if not OPENAI_API_KEY or not openai_client:
-            logger.warning("OPENAI_API_KEY não configurada, executando em modo simulação")
-            return process_pdf_embeddings_simulation(self, book_id, text_chunks, collection_name)
+        if chunks_count is None:
+            chunks_count = sum(1 for _ in chunk_store.iter_chunks(content_hash))
+        text_chunks = chunk_store.iter_chunks(content_hash)
         
         # Atualizar status da task
         self.update_state(
             state='PROGRESS',
-            meta={'current': 0, 'total': len(text_chunks), 'status': 'Conectando ao Qdrant...'}
+            meta={'current': 0, 'total': chunks_count, 'status': 'Preparando armazenamento de vetores...'}
         )
         
-        # Conectar ao Qdrant
-        client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+        # Campos do livro usados em filtros (genre, language) vão no payload dos pontos
+        book = db.query(Book).filter(Book.id == book_id).first()
+        book_payload = book_payload_fields(book) if book else None
         
-        # Verificar se a collection existe, senão criar
-        try:
-            client.get_collection(collection_name)
-            logger.info(f"Collection {collection_name} já existe")
-        except Exception:
-            logger.info(f"Criando collection {collection_name}")
-            client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
-            )
+        # Livros com o mesmo conteúdo compartilham os pontos (IDs derivados do hash)
+        book_ids = [
+            row.id for row in db.query(Book.id).filter(Book.content_hash == content_hash).all()
+        ] or [book_id]
         
-        # Processar embeddings em lotes
-        batch_size = 5
-        total_processed = 0
-        points = []
+        # Reprocessamento: os chunks do livro são regravados a partir do zero
+        db.query(BookChunk).filter(BookChunk.book_id == book_id).delete(synchronize_session=False)
+        db.commit()
         
-        for i in range(0, len(text_chunks), batch_size):
-            batch = text_chunks[i:i + batch_size]
-            
-            # Gerar embeddings para o lote
-            for chunk_idx, chunk in enumerate(batch):
-                try:
-                    response = openai_client.embeddings.create(
-                        input=chunk,
-                        model="text-embedding-ada-002"
-                    )
-                    
-                    embedding = response.data[0].embedding
-                    
-                    # Criar point para Qdrant
-                    point = PointStruct(
-                        id=str(uuid.uuid4()),
-                        vector=embedding,
-                        payload={
-                            "book_id": book_id,
-                            "chunk_index": i + chunk_idx,
-                            "text": chunk,
-                            "chunk_size": len(chunk)
-                        }
-                    )
-                    points.append(point)
-                    
-                    total_processed += 1
-                    
-                    # Atualizar progress
-                    self.update_state(
-                        state='PROGRESS',
-                        meta={
-                            'current': total_processed,
-                            'total': len(text_chunks),
-                            'status': f'Processado {total_processed}/{len(text_chunks)} chunks'
-                        }
-                    )
-                    
-                    # Pequena pausa entre requisições
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao processar chunk {i + chunk_idx}: {str(e)}")
-                    continue
-            
-            # Inserir lote no Qdrant
-            if points:
-                try:
-                    client.upsert(
-                        collection_name=collection_name,
-                        points=points
+        # Lotes de chunks limitados por quantidade e tokens, com até EMBEDDING_CONCURRENCY
+        # requisições em voo e gravações de vetores sobrepostas às próximas requisições
+        chunks_with_tokens = (_with_token_count(chunk) for chunk in text_chunks)
+        progress = {'processed': 0}
+        
+        def record_chunks(batch: List[Dict]):
+            # Registrar chunks no PostgreSQL antes dos vetores: a busca sempre
+            # encontra o texto do ponto (e o pgvector grava na própria linha).
+            # Um erro aqui faz o pipeline descartar o lote, sem gravar os vetores
+            try:
+                db.add_all([
+                    BookChunk(
+                        book_id=book_id,
+                        chunk_text=chunk["text"],
+                        chunk_index=chunk["chunk_index"],
+                        page_number=chunk["page_number"],
+                        qdrant_point_id=uuid.UUID(chunk["point_id"])
                     )
-                    logger.info(f"Inserido lote de {len(points)} pontos no Qdrant")
-                    points = []  # Limpar lote
-                except Exception as e:
-                    logger.error(f"Erro ao inserir no Qdrant: {str(e)}")
-            
-            # Pausa entre lotes
-            time.sleep(1)
+                    for chunk in batch
+                ])
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        
+        def record_progress(batch: List[Dict]):
+            progress['processed'] += len(batch)
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'current': progress['processed'],
+                    'total': chunks_count,
+                    'status': f"Processado {progress['processed']}/{chunks_count} chunks"
+                }
+            )
+        
+        total_processed = asyncio.run(_run_embedding_pipeline(
+            provider, store, chunks_with_tokens, content_hash, book_ids,
+            record_chunks, record_progress, book_payload
+        ))
+        
+        # Lotes descartados (provedor, banco ou armazenamento) não entram na contagem:
+        # o livro não é dado como concluído com chunks faltando. A nova tentativa
+        # refaz o livro; os embeddings já gerados vêm do cache
+        if total_processed != chunks_count:
+            raise self.retry(exc=RuntimeError(
+                f"{chunks_count - total_processed} de {chunks_count} chunks do livro {book_id} sem vetor gravado"
+            ))
         
         logger.info(f"Processamento concluído para livro {book_id}")
         
+        # Migração ativada durante o processamento: os vetores foram para a collection
+        # anterior. Relê a ativa (sem o cache) e processa o livro de novo na nova,
+        # com o seu provedor; gravações anteriores à ativação ficam para o catch-up
+        if follows_active and VECTOR_STORE == "qdrant":
+            reset_active_target()
+            current = active_target(db)
+            if current.collection_name != collection_name:
+                logger.info(f"Collection ativa mudou para '{current.collection_name}'; reprocessando o livro {book_id}")
+                process_pdf_embeddings.delay(book_id, content_hash, chunks_count=chunks_count)
+        
         return {
             'status': 'completed',
             'book_id': book_id,
             'chunks_processed': total_processed,
             'collection': collection_name,
-            'mode': 'real'
+            'vector_store': VECTOR_STORE,
+            'provider': provider.name
         }
         
+    except Retry:
+        logger.warning(f"Livro {book_id} com chunks sem vetor; nova tentativa agendada")
+        raise
     except Exception as e:
         logger.error(f"Erro no processamento de embeddings: {str(e)}")
         self.update_state(
@@ -136,87 +159,77 @@ def process_pdf_embeddings(self, book_id: int, text_chunks: List[str], collectio
             meta={'error': str(e), 'book_id': book_id}
         )
         raise
+    finally:
+        db.close()
 
-def process_pdf_embeddings_simulation(task_self, book_id: int, text_chunks: List[str], collection_name: str):
-    """
-    Simulação do processamento quando não temos API keys configuradas
-    """
-    logger.info(f"Executando SIMULAÇÃO de embeddings para livro {book_id}")
-    
-    total_chunks = len(text_chunks)
-    
-    for i in range(total_chunks):
-        # Simular processamento
-        time.sleep(1)  # 1 segundo por chunk
-        
-        # Atualizar progress
-        task_self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': i + 1,
-                'total': total_chunks,
-                'status': f'Simulando chunk {i + 1}/{total_chunks}',
-                'mode': 'simulation'
-            }
-        )
-        
-        logger.info(f"SIMULAÇÃO: Chunk {i + 1}/{total_chunks} processado")
-    
-    return {
-        'status': 'completed',
-        'book_id': book_id,
-        'chunks_processed': total_chunks,
-        'collection': collection_name,
-        'mode': 'simulation',
-        'message': 'Processamento simulado concluído! Configure OPENAI_API_KEY para processamento real.'
-    }
+def _with_token_count(chunk: Dict) -> Dict:
+    """Chunks gravados antes da contagem de tokens: contar aqui"""
+    if chunk.get("token_count") is None:
+        chunk["token_count"] = get_text_chunker().count_tokens(chunk["text"])
+    return chunk
+
+async def _run_embedding_pipeline(
+    provider: EmbeddingProvider,
+    store: VectorStore,
+    chunks,
+    content_hash: str,
+    book_ids: List[int],
+    before_store,
+    on_batch_stored,
+    book_payload: Optional[Dict]
+) -> int:
+    try:
+        # Collection/coluna com a dimensão do provedor (criada se não existir)
+        await store.initialize()
+        pipeline = EmbeddingPipeline(provider, store)
+        stored = await pipeline.run(chunks, content_hash, book_ids, on_batch_stored, book_payload, before_store)
+        # Centróides do conteúdo para o roteamento das buscas (só no Qdrant)
+        if isinstance(store, QdrantService):
+            await store.refresh_content_routing(content_hash, book_ids)
+        return stored
+    finally:
+        await store.close()
+        await provider.close()
+
+async def _search_similar(provider: EmbeddingProvider, store: VectorStore, query: str, limit: int) -> List[Dict]:
+    try:
+        query_embedding = (await provider.embed([query]))[0]
+        return await store.search_similar_chunks(query_embedding, limit=limit)
+    finally:
+        await store.close()
+        await provider.close()
+
+async def _cleanup_book_vectors(store: VectorStore, book_id: int, content_hash: Optional[str], remaining_ids: List[int]) -> bool:
+    try:
+        # Conteúdo ainda usado por outros livros: os pontos só deixam de listar este
+        if remaining_ids:
+            return await store.set_content_book_ids(content_hash, remaining_ids)
+        return await store.delete_book_chunks(book_id)
+    finally:
+        await store.close()
 
 @celery_app.task(bind=True)
-def search_similar_documents(self, query: str, collection_name: str = "library_books", limit: int = 5):
+def search_similar_documents(self, query: str, collection_name: Optional[str] = None, limit: int = 5):
     """
     Task para buscar documentos similares usando embeddings
     """
     try:
         logger.info(f"Buscando documentos similares para: {query}")
         
-        # Verificar se temos OpenAI configurado
-        if not OPENAI_API_KEY or not openai_client:
-            logger.warning("OPENAI_API_KEY não configurada, retornando resultados simulados")
-            return {
-                'status': 'completed',
-                'query': query,
-                'results': [],
-                'mode': 'simulation',
-                'message': 'Configure OPENAI_API_KEY para busca real'
-            }
-        
-        # Gerar embedding da query
-        response = openai_client.embeddings.create(
-            input=query,
-            model="text-embedding-ada-002"
-        )
-        
-        query_embedding = response.data[0].embedding
-        
-        # Conectar ao Qdrant
-        client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-        
-        # Fazer busca
-        search_result = client.search(
-            collection_name=collection_name,
-            query_vector=query_embedding,
-            limit=limit,
-            with_payload=True
-        )
+        # Gerar embedding da query e buscar no armazenamento configurado
+        provider = active_target().create_provider(INTERACTIVE_LANE)
+        store = get_vector_store(collection_name)
+        hits = asyncio.run(_search_similar(provider, store, query, limit))
         
         # Formatar resultados
         results = []
-        for hit in search_result:
+        for hit in hits:
             results.append({
-                'book_id': hit.payload['book_id'],
-                'text': hit.payload['text'],
-                'score': hit.score,
-                'chunk_index': hit.payload['chunk_index']
+                'id': str(hit['id']),
+                'book_id': hit['book_id'],
+                'text': hit['text'],
+                'score': hit['score'],
+                'chunk_index': hit['chunk_index']
             })
         
         return {
@@ -233,31 +246,141 @@ def search_similar_documents(self, query: str, collection_name: str = "library_b
         )
         raise
 
-@celery_app.task
-def cleanup_book_embeddings(book_id: int, collection_name: str = "library_books"):
+@celery_app.task(bind=True, max_retries=CLEANUP_MAX_RETRIES, default_retry_delay=CLEANUP_RETRY_DELAY)
+def cleanup_book_embeddings(self, book_id: int, collection_name: Optional[str] = None, content_hash: Optional[str] = None):
     """
-    Task para limpar embeddings de um livro específico
+    Task para limpar embeddings de um livro removido
+
+    Enfileirada pela remoção do livro, depois que a linha já saiu do banco. Se
+    outros livros ainda têm o mesmo conteúdo (content_hash), os pontos apenas
+    deixam de listá-lo; senão todos os pontos do livro saem com uma única
+    remoção por filtro (book_id), sem listar os IDs, junto com a extração em
+    cache e os chunks gravados do conteúdo. Falhas são repetidas, e o que sobrar é removido pelo
+    reconciliador periódico.
     """
+    db = SessionLocal()
     try:
         logger.info(f"Limpando embeddings do livro {book_id}")
         
-        # Conectar ao Qdrant
-        client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+        remaining_ids = [
+            row.id for row in db.query(Book.id).filter(
+                Book.content_hash == content_hash,
+                Book.id != book_id
+            ).all()
+        ] if content_hash else []
         
-        # Deletar pontos do livro
-        client.delete(
-            collection_name=collection_name,
-            points_selector={"filter": {"must": [{"key": "book_id", "match": {"value": book_id}}]}}
-        )
+        store = get_vector_store(collection_name)
+        if not asyncio.run(_cleanup_book_vectors(store, book_id, content_hash, remaining_ids)):
+            raise RuntimeError(f"Não foi possível remover os vetores do livro {book_id}")
+        
+        if content_hash and not remaining_ids:
+            pdf_service.delete_cached_extraction(content_hash)
+            chunk_store.delete(content_hash)
         
         logger.info(f"Embeddings do livro {book_id} removidos com sucesso")
         
         return {
             'status': 'completed',
             'book_id': book_id,
-            'action': 'deleted'
+            'action': 'unlinked' if remaining_ids else 'deleted',
+            'remaining_book_ids': remaining_ids
+        }
+        
+    except Exception as e:
+        logger.error(f"Erro ao limpar embeddings do livro {book_id}: {str(e)}")
+        raise self.retry(exc=e)
+    finally:
+        db.close()
+
+@celery_app.task
+def backfill_book_payloads(collection_name: Optional[str] = None):
+    """
+    Task para atualizar o payload dos pontos já gravados
+
+    Copia genre e language dos livros (pontos anteriores a esses campos não
+    aparecem em buscas filtradas por eles) e remove o texto e demais campos
+    que duplicavam o PostgreSQL. Uma requisição de cada por livro, filtrada
+    pelo índice de book_id.
+    """
+    if VECTOR_STORE != "qdrant":
+        return {'status': 'skipped', 'vector_store': VECTOR_STORE}
+    
+    db = SessionLocal()
+    try:
+        collection_name = collection_name or active_target(db).collection_name
+        client = create_qdrant_client()
+        
+        books = db.query(Book).filter(Book.chunks.any()).all()
+        for book in books:
+            book_filter = Filter(must=[FieldCondition(key="book_id", match=MatchValue(value=book.id))])
+            client.set_payload(
+                collection_name=collection_name,
+                payload=book_payload_fields(book),
+                points=book_filter,
+                wait=False
+            )
+            client.delete_payload(
+                collection_name=collection_name,
+                keys=LEGACY_PAYLOAD_FIELDS,
+                points=book_filter,
+                wait=False
+            )
+        
+        logger.info(f"Payload de {len(books)} livros atualizado em '{collection_name}'")
+        
+        return {
+            'status': 'completed',
+            'books_updated': len(books),
+            'collection': collection_name
         }
         
     except Exception as e:
-        logger.error(f"Erro ao limpar embeddings: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error(f"Erro ao atualizar payloads: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def build_book_routing(collection_name: Optional[str] = None):
+    """
+    Task para calcular os centróides de todos os livros já processados
+
+    Usada quando a collection de centróides está vazia (roteamento recém-ligado
+    ou collection nova); depois disso cada livro atualiza os seus ao ser processado.
+    """
+    if VECTOR_STORE != "qdrant":
+        return {'status': 'skipped', 'vector_store': VECTOR_STORE}
+    
+    db = SessionLocal()
+    try:
+        collection_name = collection_name or active_target(db).collection_name
+        contents: Dict[str, List[int]] = {}
+        for row in db.query(Book.id, Book.content_hash).filter(
+            Book.content_hash.isnot(None), Book.chunks.any()
+        ).all():
+            contents.setdefault(row.content_hash, []).append(row.id)
+        
+        refreshed = asyncio.run(_refresh_routing(QdrantService(collection_name), contents))
+        logger.info(f"Centróides de {refreshed}/{len(contents)} conteúdos calculados em '{collection_name}'")
+        
+        return {
+            'status': 'completed',
+            'contents_refreshed': refreshed,
+            'collection': collection_name
+        }
+        
+    except Exception as e:
+        logger.error(f"Erro ao calcular centróides: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+async def _refresh_routing(store: QdrantService, contents: Dict[str, List[int]]) -> int:
+    try:
+        refreshed = 0
+        for content_hash, book_ids in contents.items():
+            if await store.refresh_content_routing(content_hash, book_ids):
+                refreshed += 1
+        return refreshed
+    finally:
+        await store.close()
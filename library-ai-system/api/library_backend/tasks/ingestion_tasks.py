@@ -0,0 +1,89 @@
+from library_backend.celery_app import celery_app
+from library_backend.database import SessionLocal
+from library_backend.models import Book
+from library_backend.services.pdf_service import PDFService
+from library_backend.services.chunk_store import ChunkStore
+from library_backend.services.embedding_providers import get_text_chunker
+from library_backend.tasks.embeddings_tasks import process_pdf_embeddings
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+pdf_service = PDFService()
+chunk_store = ChunkStore()
+
+@celery_app.task(bind=True)
+def ingest_book(self, book_id: int):
+    """
+    Task de ingestão de um livro já gravado em disco: extração do texto,
+    chunking e disparo da task de embeddings
+    """
+    db = SessionLocal()
+    try:
+        book = db.query(Book).filter(Book.id == book_id).first()
+        if not book:
+            raise ValueError(f"Livro {book_id} não encontrado")
+        
+        logger.info(f"Iniciando ingestão do livro {book_id}: {book.title}")
+        
+        self.update_state(
+            state='PROGRESS',
+            meta={'current': 0, 'total': 1, 'status': 'Validando PDF...'}
+        )
+        
+        extraction_result = pdf_service.stream_pdf(book.file_path, content_hash=book.content_hash)
+        if not extraction_result["success"]:
+            raise ValueError(f"Erro ao processar PDF: {extraction_result['error']}")
+        
+        book.pages = extraction_result["total_pages"]
+        book.content_hash = extraction_result["content_hash"]
+        db.commit()
+        
+        self.update_state(
+            state='PROGRESS',
+            meta={'current': 0, 'total': 1, 'status': 'Extraindo texto e dividindo em chunks...'}
+        )
+        
+        # Páginas -> chunks por tokens -> armazenamento compartilhado, em fluxo contínuo:
+        # o texto completo do livro nunca fica em memória; a mensagem leva só a referência
+        chunks = get_text_chunker().iter_chunks(extraction_result["pages"])
+        chunks_count = chunk_store.write_chunks(book.content_hash, chunks)
+        
+        if not chunks_count:
+            logger.warning(f"Nenhum texto extraído do livro {book_id}")
+            book.processed = True
+            db.commit()
+            return {
+                'status': 'completed',
+                'book_id': book_id,
+                'chunks_count': 0,
+                'message': 'Nenhum texto extraído do PDF'
+            }
+        
+        # Fan-out: embeddings seguem em outra task; o livro passa a acompanhá-la
+        embedding_task = process_pdf_embeddings.delay(book_id, book.content_hash, chunks_count=chunks_count)
+        book.task_id = embedding_task.id
+        db.commit()
+        
+        logger.info(f"Ingestão do livro {book_id} concluída: {chunks_count} chunks, task de embeddings {embedding_task.id}")
+        
+        return {
+            'status': 'dispatched',
+            'book_id': book_id,
+            'pages': extraction_result["total_pages"],
+            'chunks_count': chunks_count,
+            'embedding_task_id': embedding_task.id
+        }
+        
+    except Exception as e:
+        logger.error(f"Erro na ingestão do livro {book_id}: {str(e)}")
+        db.rollback()
+        self.update_state(
+            state='FAILURE',
+            meta={'error': str(e), 'book_id': book_id}
+        )
+        raise
+    finally:
+        db.close()
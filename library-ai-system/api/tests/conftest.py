@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Os testes rodam sem os serviços do docker-compose: SQLite temporário no lugar do
+# PostgreSQL, Qdrant local em memória e embeddings do provedor hashing (sem OpenAI)
+os.environ.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'library_tests.db')}")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("EMBEDDING_PROVIDER", "hashing")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
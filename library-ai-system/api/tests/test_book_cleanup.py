@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from library_backend.database import SessionLocal, engine
+from library_backend.models import Base, Book
+from library_backend.tasks import embeddings_tasks
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    # Arquivos em cache num diretório temporário; os vetores não são o assunto aqui
+    monkeypatch.setattr(embeddings_tasks.pdf_service, "cache_dir", str(tmp_path / "extraction"))
+    monkeypatch.setattr(embeddings_tasks.chunk_store, "store_dir", str(tmp_path / "chunks"))
+
+    async def cleanup_vectors(store, book_id, content_hash, remaining_ids):
+        return True
+
+    monkeypatch.setattr(embeddings_tasks, "get_vector_store", lambda collection_name=None: None)
+    monkeypatch.setattr(embeddings_tasks, "_cleanup_book_vectors", cleanup_vectors)
+    Base.metadata.create_all(engine, tables=[Book.__table__])
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=[Book.__table__])
+
+def cached_files(content_hash):
+    """Criar os arquivos que a ingestão deixa em disco para um conteúdo"""
+    paths = [
+        embeddings_tasks.pdf_service._cache_path(content_hash),
+        embeddings_tasks.chunk_store._path(content_hash)
+    ]
+    for path in paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+    return paths
+
+def add_book(db, content_hash):
+    book = Book(title="livro", file_path="/tmp/livro.pdf", content_hash=content_hash, processed=True)
+    db.add(book)
+    db.commit()
+    return book.id
+
+def test_cached_content_is_kept_while_another_book_uses_it(db):
+    content_hash = "a" * 64
+    paths = cached_files(content_hash)
+    remaining = add_book(db, content_hash)
+
+    result = embeddings_tasks.cleanup_book_embeddings.run(remaining + 1, None, content_hash)
+    assert result["remaining_book_ids"] == [remaining]
+    assert all(os.path.exists(path) for path in paths)
+
+def test_cached_content_is_removed_with_the_last_book(db):
+    content_hash = "b" * 64
+    paths = cached_files(content_hash)
+
+    result = embeddings_tasks.cleanup_book_embeddings.run(1, None, content_hash)
+    assert result["action"] == "deleted"
+    assert not any(os.path.exists(path) for path in paths)
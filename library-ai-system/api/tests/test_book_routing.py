@@ -0,0 +1,54 @@
+import numpy as np
+
+from library_backend.services.book_routing import routing_centroids
+
+def topics(rng, count_per_topic, dimensions=32, spread=0.1):
+    """Vetores em torno de três direções bem separadas (assuntos de um livro)"""
+    centers = np.eye(dimensions, dtype=np.float32)[:3]
+    vectors = np.concatenate([
+        center + spread * rng.standard_normal((count_per_topic, dimensions), dtype=np.float32)
+        for center in centers
+    ])
+    return centers, vectors
+
+def test_small_book_gets_the_normalized_mean():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((20, 16), dtype=np.float32) * rng.uniform(0.5, 5, (20, 1))
+    centroids = routing_centroids(vectors, max_clusters=4, chunks_per_cluster=50)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    mean = unit.mean(axis=0)
+    assert centroids.shape == (1, 16)
+    assert np.allclose(centroids[0], mean / np.linalg.norm(mean), atol=1e-6)
+
+def test_cluster_count_follows_book_size_and_limit():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((250, 16), dtype=np.float32)
+    assert len(routing_centroids(vectors, max_clusters=8, chunks_per_cluster=100)) == 3
+    assert len(routing_centroids(vectors, max_clusters=2, chunks_per_cluster=100)) == 2
+    # Nunca mais centróides que chunks
+    assert len(routing_centroids(vectors[:3], max_clusters=8, chunks_per_cluster=1)) == 3
+
+def test_centroids_fit_the_chunks_better_than_the_mean():
+    rng = np.random.default_rng(3)
+    centers, vectors = topics(rng, 200)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    mean = routing_centroids(vectors, max_clusters=1)
+    for seed in range(10):
+        centroids = routing_centroids(vectors, max_clusters=3, chunks_per_cluster=200, seed=seed)
+        assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+        # Similaridade de cada chunk com o centróide mais próximo, em média; a
+        # inicialização aleatória pode juntar dois assuntos em um centróide, mas
+        # a rota continua mais precisa que a da média do livro
+        assert (unit @ centroids.T).max(axis=1).mean() > (unit @ mean.T).mean() + 0.1
+    # Com uma inicialização que sorteia um chunk de cada assunto, um centróide por assunto
+    centroids = routing_centroids(vectors, max_clusters=3, chunks_per_cluster=200, seed=0)
+    assert (centers @ centroids.T).max(axis=1).min() > 0.9
+
+def test_centroids_are_reproducible_for_a_seed():
+    rng = np.random.default_rng(4)
+    _, vectors = topics(rng, 100)
+    assert np.array_equal(
+        routing_centroids(vectors, max_clusters=3, chunks_per_cluster=100, seed=7),
+        routing_centroids(vectors, max_clusters=3, chunks_per_cluster=100, seed=7)
+    )
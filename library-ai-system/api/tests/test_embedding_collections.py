@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+from library_backend.services import embedding_collections
+from library_backend.services.embedding_collections import EmbeddingTarget, cached_active_target
+
+def test_stale_active_target_is_served_from_cache_and_reread_in_a_thread(monkeypatch):
+    old = EmbeddingTarget("livros", "hashing", "hashing-384", 384)
+    new = EmbeddingTarget("livros__v2", "hashing", "hashing-384", 384)
+    reads = []
+
+    def active_target(db=None):
+        reads.append(threading.current_thread())
+        embedding_collections._active_target = new
+        embedding_collections._checked_at = embedding_collections.time.monotonic()
+        return new
+
+    monkeypatch.setattr(embedding_collections, "active_target", active_target)
+    monkeypatch.setattr(embedding_collections, "_active_target", old)
+    monkeypatch.setattr(embedding_collections, "_checked_at", 0.0)  # intervalo vencido
+
+    async def run():
+        served = cached_active_target()
+        for _ in range(100):
+            if embedding_collections._active_target == new and not embedding_collections._refreshing:
+                break
+            await asyncio.sleep(0.01)
+        return served, cached_active_target()
+
+    served, after = asyncio.run(run())
+    # O event loop recebe o valor anterior na hora; o banco é lido em outra thread
+    assert (served, after) == (old, new)
+    assert len(reads) == 1 and reads[0] is not threading.main_thread()
@@ -0,0 +1,37 @@
+import asyncio
+
+from qdrant_client import AsyncQdrantClient
+
+from library_backend.services.embedding_cache import embedding_cache
+from library_backend.services.embedding_pipeline import EmbeddingPipeline
+from library_backend.services.embedding_providers import HashingEmbeddingProvider
+from library_backend.services.qdrant_service import QdrantService
+
+def chunks(count):
+    return [
+        {"chunk_index": index, "text": f"trecho {index} do livro", "page_number": 1, "token_count": 4}
+        for index in range(count)
+    ]
+
+def test_batches_that_fail_before_store_are_not_upserted_nor_counted(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "enabled", False)
+    recorded = []
+
+    def before_store(batch):
+        # Linhas de book_chunks não gravadas (ex.: erro no PostgreSQL)
+        if batch[0]["chunk_index"] == 10:
+            raise RuntimeError("banco indisponível")
+        recorded.extend(chunk["point_id"] for chunk in batch)
+
+    async def run():
+        store = QdrantService(collection_name="pipeline_tests", client=AsyncQdrantClient(":memory:"), vector_size=32)
+        await store.initialize()
+        pipeline = EmbeddingPipeline(HashingEmbeddingProvider(32), store, max_inputs=10)
+        stored = await pipeline.run(chunks(30), "a" * 64, [1], before_store=before_store)
+        points, _ = await store.client.scroll("pipeline_tests", limit=100)
+        return stored, {str(point.id) for point in points}
+
+    stored, point_ids = asyncio.run(run())
+    assert stored == 20
+    # Só há pontos com linha: nada para o reconciliador tratar como órfão
+    assert point_ids == set(recorded)
@@ -0,0 +1,44 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from library_backend.services.embedding_providers import (
+    HashingEmbeddingProvider, create_embedding_provider, get_text_chunker
+)
+from library_backend.services.text_chunker import ApproximateEncoding
+
+def test_hashing_provider_by_name():
+    provider = create_embedding_provider("hashing", dimensions=128)
+    assert isinstance(provider, HashingEmbeddingProvider)
+    assert (provider.name, provider.dimensions) == ("hashing-128", 128)
+    with pytest.raises(ValueError):
+        create_embedding_provider("desconhecido")
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    texts = ["A biblioteca abriu às nove.", "Capítulo 3: a viagem", "", "!!!"]
+    first = asyncio.run(HashingEmbeddingProvider(64).embed(texts))
+    # Outra instância (outro processo, na prática) gera os mesmos vetores
+    second = HashingEmbeddingProvider(64).embed_sync(texts)
+    assert np.allclose(first, second)
+    assert second.shape == (4, 64) and second.dtype == np.float32
+    assert np.allclose(np.linalg.norm(second, axis=1), 1.0)
+
+def test_hashing_embeddings_ignore_case_and_accents():
+    provider = HashingEmbeddingProvider(256)
+    accented, plain, unrelated = provider.embed_sync(
+        ["Ciência da Computação", "ciencia da computacao", "receitas de bolo de cenoura"]
+    )
+    assert np.allclose(accented, plain)
+    assert float(accented @ unrelated) < 0.5
+
+def test_hashing_provider_chunker_counts_without_tiktoken():
+    text_chunker = get_text_chunker(HashingEmbeddingProvider(64))
+    assert isinstance(text_chunker.encoding, ApproximateEncoding)
+    assert get_text_chunker() is text_chunker  # EMBEDDING_PROVIDER=hashing nos testes
+
+    text = "Capítulo 1. A biblioteca abriu às nove! " * 200
+    chunks = text_chunker.split_text(text, max_tokens=60, overlap=10)
+    assert len(chunks) > 1
+    assert all(text_chunker.count_tokens(chunk) <= 60 for chunk in chunks)
+    assert text_chunker.encoding.decode(text_chunker.encoding.encode_ordinary(text)) == text
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from benchmarks.bench_text_chunker import (
+    create_text_chunks, iter_text_chunks, legacy_create_text_chunks, synthetic_text
+)
+
+# Caracteres com fronteiras frequentes (espaço, pontuação, quebras de linha)
+ALPHABET = "abcdefghij     ..!?\n\n xyz"
+
+@pytest.mark.parametrize("chunk_size, overlap", [
+    (1000, 100), (100, 10), (300, 250), (200, 150), (120, 119), (50, 0)
+])
+def test_create_text_chunks_matches_legacy_on_random_text(chunk_size, overlap):
+    rng = random.Random(chunk_size * 1000 + overlap)
+    for _ in range(60):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 5000)))
+        assert create_text_chunks(text, chunk_size, overlap) == \
+            legacy_create_text_chunks(text, chunk_size, overlap)
+
+@pytest.mark.parametrize("chunk_size, overlap", [(1000, 100), (300, 250)])
+def test_create_text_chunks_matches_legacy_on_prose(chunk_size, overlap):
+    text = synthetic_text(200_000)
+    assert create_text_chunks(text, chunk_size, overlap) == \
+        legacy_create_text_chunks(text, chunk_size, overlap)
+
+def test_iter_text_chunks_over_pages_matches_joined_text():
+    rng = random.Random(3)
+    pages = [
+        {"page_number": number, "text": "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 1500)))}
+        for number in range(1, 30)
+    ]
+    chunks = list(iter_text_chunks(pages, 300, 50))
+    joined = "".join(page["text"] + "\n" for page in pages)
+    assert [chunk["text"] for chunk in chunks] == legacy_create_text_chunks(joined, 300, 50)
+
+def test_text_without_boundaries_advances_in_chunk_steps():
+    # overlap >= chunk_size sem quebras: o início anda chunk_size // 2 (não 1 caractere)
+    chunks = create_text_chunks("x" * 10_000, 100, 100)
+    assert len(chunks) == 200
+    assert all(len(chunk) == 100 for chunk in chunks[:-2])
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from library_backend.database import SessionLocal, engine
+from library_backend.models import Base, Book, BookChunk
+from library_backend.tasks import collection_tasks
+
+COLLECTION = "reconciler_tests"
+ROUTING = f"{COLLECTION}__routing"
+
+@pytest.fixture
+def db(monkeypatch):
+    # Lotes pequenos: o merge atravessa várias páginas do scroll e do cursor
+    monkeypatch.setattr(collection_tasks, "RECONCILE_BATCH_SIZE", 7)
+    tables = [Book.__table__, BookChunk.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=tables)
+
+def add_book(db, content_hash, point_ids):
+    book = Book(title=f"livro {content_hash[:4]}", file_path="/tmp/livro.pdf", content_hash=content_hash, processed=True)
+    db.add(book)
+    db.flush()
+    db.add_all(
+        BookChunk(book_id=book.id, chunk_text=f"trecho {index}", chunk_index=index, qdrant_point_id=point_id)
+        for index, point_id in enumerate(point_ids)
+    )
+    db.commit()
+    return book
+
+async def qdrant_with_points(point_ids, collection=COLLECTION, payloads=None):
+    client = AsyncQdrantClient(":memory:")
+    await client.create_collection(collection, vectors_config=VectorParams(size=4, distance=Distance.COSINE))
+    await client.upsert(collection, [
+        PointStruct(id=point_id, vector=[1.0, 0.5, 0.25, 0.125], payload=(payloads or {}).get(point_id, {}))
+        for point_id in point_ids
+    ])
+    return client
+
+async def remaining_ids(client, collection=COLLECTION):
+    points, _ = await client.scroll(collection, limit=1000, with_payload=False)
+    return {str(point.id) if not isinstance(point.id, int) else point.id for point in points}
+
+def recording_candidates(monkeypatch):
+    """Guardar os candidatos que o merge envia para a conferência"""
+    seen = []
+    confirm = collection_tasks._delete_confirmed_orphans
+
+    async def record(client, collection_name, candidates):
+        seen.extend(candidates)
+        return await confirm(client, collection_name, candidates)
+
+    monkeypatch.setattr(collection_tasks, "_delete_confirmed_orphans", record)
+    return seen
+
+def test_orphan_points_are_deleted_and_stored_points_kept(db, monkeypatch):
+    stored = [uuid.uuid4() for _ in range(40)]
+    orphans = [uuid.uuid4() for _ in range(15)]
+    add_book(db, "a" * 64, stored)
+    candidates = recording_candidates(monkeypatch)
+
+    async def run():
+        client = await qdrant_with_points([str(point_id) for point_id in stored + orphans])
+        result = await collection_tasks.delete_orphan_points(db, client, COLLECTION)
+        return result, await remaining_ids(client)
+
+    (scanned, deleted), remaining = asyncio.run(run())
+    assert (scanned, deleted) == (55, 15)
+    assert remaining == {str(point_id) for point_id in stored}
+    # Nenhum ponto com linha vira candidato: a ordem do scroll e a do banco coincidem
+    assert {str(point_id) for point_id in candidates} == {str(point_id) for point_id in orphans}
+
+def test_merge_order_matches_qdrant_across_the_uuid_range(db, monkeypatch):
+    # Variam no primeiro byte (inclusive acima de 0x7f, negativo se lido com sinal) e
+    # no fim: o scroll e o ORDER BY precisam ordenar como inteiros de 128 bits
+    # (o hex sempre tem letras: no SQLite uma coluna UUID só de dígitos vira número)
+    stored = [uuid.UUID(int=(high << 120) | low) for high in (0x00, 0x0f, 0x10, 0x7f, 0x80, 0xff) for low in (0xa, 0xffff)]
+    add_book(db, "b" * 64, stored)
+    candidates = recording_candidates(monkeypatch)
+
+    async def run():
+        client = await qdrant_with_points([str(point_id) for point_id in stored])
+        return await collection_tasks.delete_orphan_points(db, client, COLLECTION)
+
+    assert asyncio.run(run()) == (len(stored), 0)
+    assert candidates == []
+
+def test_points_shared_by_deduplicated_books_are_kept(db):
+    # Livros com o mesmo conteúdo gravam linhas com o mesmo qdrant_point_id
+    shared = sorted(uuid.uuid4() for _ in range(10))
+    add_book(db, "c" * 64, shared)
+    add_book(db, "c" * 64, shared)
+    orphan = uuid.uuid4()
+
+    async def run():
+        client = await qdrant_with_points([str(point_id) for point_id in shared + [orphan]])
+        result = await collection_tasks.delete_orphan_points(db, client, COLLECTION)
+        return result, await remaining_ids(client)
+
+    (scanned, deleted), remaining = asyncio.run(run())
+    assert (scanned, deleted) == (11, 1)
+    assert remaining == {str(point_id) for point_id in shared}
+
+def test_integer_point_ids_are_deleted(db):
+    stored = [uuid.uuid4() for _ in range(5)]
+    add_book(db, "d" * 64, stored)
+
+    async def run():
+        client = await qdrant_with_points([1, 42, 10**12] + [str(point_id) for point_id in stored])
+        result = await collection_tasks.delete_orphan_points(db, client, COLLECTION)
+        return result, await remaining_ids(client)
+
+    (scanned, deleted), remaining = asyncio.run(run())
+    assert (scanned, deleted) == (8, 3)
+    assert remaining == {str(point_id) for point_id in stored}
+
+def test_candidates_whose_rows_appear_are_not_deleted(db):
+    # Linha gravada depois da leitura em ordem (ingestão concorrente)
+    late = uuid.uuid4()
+    orphan = uuid.uuid4()
+    add_book(db, "e" * 64, [late])
+
+    async def run():
+        client = await qdrant_with_points([str(late), str(orphan)])
+        deleted = await collection_tasks._delete_confirmed_orphans(client, COLLECTION, [str(late), str(orphan)])
+        return deleted, await remaining_ids(client)
+
+    deleted, remaining = asyncio.run(run())
+    assert deleted == 1
+    assert remaining == {str(late)}
+
+def test_centroids_of_removed_contents_are_deleted(db):
+    add_book(db, "f" * 64, [uuid.uuid4()])
+    centroids = [str(uuid.uuid4()) for _ in range(6)]
+    payloads = {point_id: {"content_hash": ("f" if index < 2 else "0") * 64} for index, point_id in enumerate(centroids)}
+
+    async def run():
+        client = await qdrant_with_points(centroids, collection=ROUTING, payloads=payloads)
+        deleted = await collection_tasks.delete_orphan_centroids(db, client, ROUTING)
+        return deleted, await remaining_ids(client, ROUTING)
+
+    deleted, remaining = asyncio.run(run())
+    assert deleted == 4
+    assert remaining == set(centroids[:2])
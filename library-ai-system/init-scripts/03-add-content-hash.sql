@@ -0,0 +1,11 @@
+-- Migração para adicionar coluna content_hash na tabela books
+-- Versão: v1.2.0 - Cache de extração de PDFs por hash de conteúdo
+
+-- SHA-256 do arquivo PDF, calculado durante o upload
+ALTER TABLE books ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- Índice para localizar livros pelo hash do conteúdo
+CREATE INDEX IF NOT EXISTS idx_books_content_hash ON books(content_hash);
+
+-- Comentário para documentação
+COMMENT ON COLUMN books.content_hash IS 'SHA-256 do PDF, usado como chave do cache de extração de texto';
@@ -0,0 +1,22 @@
+-- Migração para registrar as collections de embeddings do Qdrant
+-- Versão: v1.3.0 - Reprocessamento de embeddings com troca de alias
+
+-- Uma linha por collection: modelo e dimensão dos vetores e estado na migração
+CREATE TABLE IF NOT EXISTS embedding_collections (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) UNIQUE NOT NULL,
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(255) NOT NULL,
+    dimensions INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'building', -- 'building', 'ready', 'active', 'retired', 'failed'
+    points_count INTEGER,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    activated_at TIMESTAMP
+);
+
+-- Índice para localizar a collection ativa
+CREATE INDEX IF NOT EXISTS idx_embedding_collections_status ON embedding_collections(status);
+
+-- Comentário para documentação
+COMMENT ON TABLE embedding_collections IS 'Collections de embeddings no Qdrant; a ativa (e o seu modelo) atende buscas e ingestão';
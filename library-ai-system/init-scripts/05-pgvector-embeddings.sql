@@ -0,0 +1,16 @@
+-- Migração para guardar os embeddings em book_chunks (VECTOR_STORE=pgvector)
+-- Versão: v1.4.0 - pgvector como alternativa ao Qdrant
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Vetor de cada chunk; a dimensão precisa ser a do EMBEDDING_MODEL configurado
+-- (1536 = text-embedding-ada-002, o padrão). Trocar de modelo exige uma migração:
+-- alterar a coluna para a nova dimensão, recriar o índice e gerar os embeddings de novo
+ALTER TABLE book_chunks ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+-- Índice HNSW por distância de cosseno (m e ef_construction: padrões do pgvector)
+CREATE INDEX IF NOT EXISTS idx_book_chunks_embedding_hnsw ON book_chunks
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Comentário para documentação
+COMMENT ON COLUMN book_chunks.embedding IS 'Embedding do chunk (pgvector); livros com o mesmo conteúdo repetem o vetor';